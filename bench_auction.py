@@ -0,0 +1,43 @@
+import argparse
+import random
+import time
+
+from fivepmbridge.bridge_game import Auction, PASS
+
+
+def random_auction(rng, dealer):
+    # Mostly passes so auctions end at a realistic length
+    auction = Auction(dealer)
+    while not auction.is_over:
+        if rng.random() < 0.6:
+            call = PASS
+        else:
+            call = rng.choice(auction.legal_calls())
+        auction.make_call(auction.turn, call)
+    return auction
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time random legal auctions and replaying them.")
+    parser.add_argument("--auctions", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    auctions = [random_auction(rng, i % 4) for i in range(args.auctions)]
+    elapsed = time.perf_counter() - start
+    calls = sum(len(auction.calls) for auction in auctions)
+    passed_out = sum(auction.passed_out for auction in auctions)
+    print(f"random auctions {args.auctions / elapsed:12,.0f} auctions/s"
+          f" ({calls / args.auctions:.1f} calls each, {passed_out} passed out)")
+
+    start = time.perf_counter()
+    for auction in auctions:
+        Auction.from_calls(auction.dealer, auction.calls).contract()
+    elapsed = time.perf_counter() - start
+    print(f"replay          {args.auctions / elapsed:12,.0f} auctions/s {elapsed / calls * 1e9:8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import queue
+import random
+import threading
+import time
+
+from fivepmbridge.bridge_client import UpdatePipeline, diff_state
+from fivepmbridge.bridge_game import CardSet, deal_masks
+
+
+def table_states(count, seed):
+    # (names, hands, played_cards) as a fast table would send them: a card
+    # played every update, the trick cleared every fourth, a new deal every
+    # 52 cards
+    rng = random.Random(seed)
+    names = ["south", "west", "north", "east"]
+    states = []
+    while len(states) < count:
+        hands = [CardSet(mask).codes() for mask in deal_masks(rng)]
+        played = [None] * 4
+        for card in range(52):
+            seat = card % 4
+            played[seat] = hands[seat].pop(rng.randrange(len(hands[seat])))
+            states.append((names, [list(hand) for hand in hands], list(played)))
+            if seat == 3:
+                played = [None] * 4
+    return states[:count]
+
+
+def run_per_state(states, render_seconds):
+    # The old way: every state is its own UI event and is drawn in full
+    events = queue.Queue()
+    rendered = []
+
+    def ui():
+        while True:
+            state = events.get()
+            if state is None:
+                break
+            time.sleep(render_seconds * 4)
+            rendered.append(state)
+
+    thread = threading.Thread(target=ui)
+    thread.start()
+    start = time.perf_counter()
+    for state in states:
+        events.put(state)
+    pushed = time.perf_counter() - start
+    events.put(None)
+    thread.join()
+    return pushed, time.perf_counter() - start, len(rendered), len(rendered) * 4
+
+
+def run_pipeline(states, render_seconds):
+    # The UI wakes once per batch and redraws only the seats that changed
+    wakeup = threading.Event()
+    pipeline = UpdatePipeline(wakeup.set)
+    stop = threading.Event()
+    counts = [0, 0]
+
+    def ui():
+        while not (stop.is_set() and not wakeup.is_set()):
+            if not wakeup.wait(0.01):
+                continue
+            wakeup.clear()
+            changes, _ = pipeline.take()
+            if changes:
+                drawn = len(changes.seats) + (1 if changes.played else 0)
+                time.sleep(render_seconds * drawn)
+                counts[0] += 1
+                counts[1] += drawn
+
+    thread = threading.Thread(target=ui)
+    thread.start()
+    start = time.perf_counter()
+    for state in states:
+        pipeline.push_state(*state)
+    pushed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    assert pipeline.rendered == states[-1]
+    return pushed, time.perf_counter() - start, counts[0], counts[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare drawing every state update with the coalescing pipeline.")
+    parser.add_argument("--states", type=int, default=5000)
+    parser.add_argument("--render-ms", type=float, default=0.5, help="time to redraw one hand or the trick")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    states = table_states(args.states, args.seed)
+    start = time.perf_counter()
+    for old, new in zip(states, states[1:]):
+        diff_state(old, new)
+    diff_seconds = (time.perf_counter() - start) / (len(states) - 1)
+    print(f"diff_state {diff_seconds * 1e6:.1f} us per update")
+
+    render_seconds = args.render_ms / 1000
+    for label, run in (("every state", run_per_state), ("pipeline", run_pipeline)):
+        pushed, elapsed, renders, drawn = run(states, render_seconds)
+        print(f"{label:12} {len(states) / pushed:12,.0f} updates/s received, {renders:6} renders,"
+              f" {drawn:6} panels drawn, UI caught up after {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
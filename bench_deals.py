@@ -0,0 +1,56 @@
+import argparse
+import random
+import time
+
+from fivepmbridge.bridge_game import Suit, CardSet, SUIT_ORDER, deal_cards
+from fivepmbridge.bridge_deals import (NORTH, EAST, deal_batch, generate_deals, hcp_range, balanced,
+                                       suit_length)
+
+CONSTRAINTS = [hcp_range(NORTH, 15, 17), balanced(NORTH), suit_length(EAST, Suit.SPADES, 6)]
+
+
+def python_loop(count):
+    # The per-card approach: deal Card objects and test each hand in Python
+    found = 0
+    for _ in range(count):
+        hands = [CardSet(hand) for hand in deal_cards()]
+        north, east = hands[NORTH], hands[EAST]
+        lengths = sorted((north.suit_length(suit) for suit in SUIT_ORDER), reverse=True)
+        if (15 <= north.hcp() <= 17 and lengths in ([4, 3, 3, 3], [4, 4, 3, 2], [5, 3, 3, 2])
+                and east.suit_length(Suit.SPADES) >= 6):
+            found += 1
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batch and per-card deal generation.")
+    parser.add_argument("--deals", type=int, default=1000000)
+    parser.add_argument("--loop-deals", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    start = time.perf_counter()
+    found = python_loop(args.loop_deals)
+    elapsed = time.perf_counter() - start
+    print(f"python loop   {args.loop_deals / elapsed * 60:14,.0f} deals/min ({found} matched)")
+
+    start = time.perf_counter()
+    batch = deal_batch(args.deals, seed=args.seed)
+    batch.lengths, batch.hcp
+    elapsed = time.perf_counter() - start
+    print(f"batch dealt   {args.deals / elapsed * 60:14,.0f} deals/min (with HCP and lengths)")
+
+    start = time.perf_counter()
+    matched = batch.filter(*CONSTRAINTS)
+    elapsed += time.perf_counter() - start
+    print(f"batch matched {args.deals / elapsed * 60:14,.0f} deals/min ({len(matched)} matched)")
+
+    start = time.perf_counter()
+    generate_deals(1000, *CONSTRAINTS, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"1000 constrained boards in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules the server, bots and load tests use; none of them may load the GUI
+# or analysis dependencies
+HEADLESS_MODULES = ["fivepmbridge", "fivepmbridge.bridge_server", "fivepmbridge.bridge_bot",
+                    "fivepmbridge.bridge_client", "fivepmbridge.bridge_protocol", "fivepmbridge.bridge_log",
+                    "fivepmbridge.bridge_snapshot", "fivepmbridge.bridge_game", "fivepmbridge.bridge_scoring",
+                    "fivepmbridge.bridge_supervisor"]
+HEAVY_MODULES = ["wx", "numpy"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(module):
+    # (seconds, heavy modules loaded) for importing module in a fresh interpreter
+    probe = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+    elapsed, loaded = json.loads(output)
+    return elapsed, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time importing the headless modules in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, the fastest is reported")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="fail if any module takes longer")
+    parser.add_argument("modules", nargs="*", default=HEADLESS_MODULES)
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        runs = [time_import(module) for _ in range(args.runs)]
+        elapsed = min(seconds for seconds, _ in runs)
+        loaded = sorted({name for _, names in runs for name in names})
+        print(f"{module:30} {elapsed * 1000:8.1f} ms  {'loads ' + ', '.join(loaded) if loaded else ''}")
+        if loaded:
+            failures.append(f"{module} loads {', '.join(loaded)}")
+        if elapsed * 1000 > args.budget_ms:
+            failures.append(f"{module} took {elapsed * 1000:.1f} ms, over {args.budget_ms:g} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
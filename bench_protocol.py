@@ -0,0 +1,69 @@
+import ast
+import random
+import timeit
+
+from fivepmbridge.bridge_game import CardSet, deal_cards
+from fivepmbridge.bridge_protocol import (TableState, decode_message, encode_snapshot, encode_delta,
+                                          encode_binary_snapshot, encode_binary_delta)
+
+NAMES = ["('192.168.100.21', 52344)", "('192.168.100.22', 52345)", "Alice", "Bob"]
+
+
+def make_seats(viewer=0, dummy=2):
+    hands = deal_cards()
+    seats = []
+    for seat, hand in enumerate(hands):
+        codes = [card.to_code() for card in hand]
+        visible = seat in (viewer, dummy)
+        played = codes[0] if seat < 2 else None
+        seats.append((NAMES[seat], CardSet(hand) if visible else len(codes), played))
+    return seats
+
+
+def legacy_encode(seats):
+    hands = {name: hand.codes() if isinstance(hand, CardSet) else ["b"] * hand for name, hand, _ in seats}
+    played = {name: played or "None" for name, _, played in seats}
+    return ("@" + NAMES[0] + "\n" + str(hands) + "\n" + str(played)).encode()
+
+
+def legacy_decode(data):
+    my_name, hands, played = data.decode()[1:].split("\n")
+    return my_name, ast.literal_eval(hands), ast.literal_eval(played)
+
+
+def text_decode(data):
+    return decode_message(data.decode())
+
+
+def bench(label, encode, decode, number):
+    payload = encode()
+    encode_us = timeit.timeit(encode, number=number) / number * 1e6
+    decode_us = timeit.timeit(lambda: decode(payload), number=number) / number * 1e6
+    print(f"{label:<18} {len(payload):6d} bytes {encode_us:9.2f} us encode {decode_us:9.2f} us decode")
+
+
+def main():
+    random.seed(5)
+    seats = make_seats()
+    number = 20000
+
+    print("Snapshot")
+    bench("legacy str/ast", lambda: legacy_encode(seats), legacy_decode, number)
+    bench("text", lambda: encode_snapshot(7, 0, seats).encode(), text_decode, number)
+    bench("binary", lambda: encode_binary_snapshot(7, 0, seats), decode_message, number)
+
+    # The legacy format has no deltas, so every card play resends a snapshot
+    print("Card played")
+    bench("legacy str/ast", lambda: legacy_encode(seats), legacy_decode, number)
+    bench("text delta", lambda: encode_delta(8, "play", 1, "S12").encode(), text_decode, number)
+    bench("binary delta", lambda: encode_binary_delta(8, "play", 1, "S12"), decode_message, number)
+
+    state = TableState()
+    state.apply(encode_binary_snapshot(7, 0, seats))
+    delta = encode_binary_delta(8, "play", 2, seats[2][1].codes()[0])
+    apply_us = timeit.timeit(lambda: (setattr(state, "seq", 7), state.apply(delta)), number=number) / number * 1e6
+    print(f"TableState.apply binary delta {apply_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
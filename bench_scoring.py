@@ -0,0 +1,42 @@
+import argparse
+import time
+
+import numpy as np
+
+from fivepmbridge.bridge_scoring import duplicate_result, score_boards, matchpoints, cross_imps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-board and table lookup scoring.")
+    parser.add_argument("--boards", type=int, default=1000000)
+    parser.add_argument("--loop-boards", type=int, default=100000)
+    parser.add_argument("--tables", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    columns = [rng.integers(1, 8, args.boards), rng.integers(0, 5, args.boards), rng.integers(0, 3, args.boards),
+               rng.integers(0, 2, args.boards), rng.integers(0, 14, args.boards)]
+
+    rows = list(zip(*(column[:args.loop_boards].tolist() for column in columns)))
+    start = time.perf_counter()
+    loop_scores = [duplicate_result(*row) for row in rows]
+    elapsed = time.perf_counter() - start
+    print(f"python loop  {args.loop_boards / elapsed:14,.0f} boards/s")
+
+    start = time.perf_counter()
+    scores = score_boards(*columns)
+    elapsed = time.perf_counter() - start
+    print(f"table lookup {args.boards / elapsed:14,.0f} boards/s")
+    assert scores[:args.loop_boards].tolist() == loop_scores
+
+    session = scores[:args.boards // args.tables * args.tables].reshape(-1, args.tables)
+    start = time.perf_counter()
+    matchpoints(session)
+    cross_imps(session)
+    elapsed = time.perf_counter() - start
+    print(f"matchpoints and cross-IMPs for {session.shape[0]:,} boards x {args.tables} tables in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
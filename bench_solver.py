@@ -0,0 +1,49 @@
+import argparse
+import random
+import time
+
+from fivepmbridge.bridge_game import Suit, deal_masks
+from fivepmbridge.bridge_solver import DoubleDummySolver
+
+STRAINS = [Suit.NO_TRUMP, Suit.SPADES, Suit.HEARTS]
+
+
+def seeded_deal(seed, cards):
+    # Full deals come from deal_masks; shorter endings keep the first cards
+    # of a shuffled deck so every run solves the same positions
+    rng = random.Random(seed)
+    if cards == 13:
+        return deal_masks(rng)
+    deck = list(range(52))
+    rng.shuffle(deck)
+    return [sum(1 << index for index in deck[seat * cards:(seat + 1) * cards]) for seat in range(4)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the double dummy solver on seeded deals.")
+    parser.add_argument("--deals", type=int, default=8)
+    # Full 13 card deals take several seconds each in pure Python (4 to 13 s
+    # for seed 0), well over a second, so the default is an 8 card ending
+    parser.add_argument("--cards", type=int, default=8, help="cards per hand")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    times = []
+    for deal in range(args.deals):
+        hands = seeded_deal(args.seed + deal, args.cards)
+        for trump in STRAINS:
+            solver = DoubleDummySolver(hands, trump)
+            start = time.perf_counter()
+            ns, ew = solver.solve(0)
+            elapsed = time.perf_counter() - start
+            times.append(elapsed)
+            print(f"deal {args.seed + deal:3d} {trump.name:<9} {ns:2d}-{ew:<2d}"
+                  f" {elapsed * 1000:9.1f} ms {solver.nodes:9d} nodes")
+
+    times.sort()
+    print(f"{len(times)} solves: median {times[len(times) // 2] * 1000:.1f} ms,"
+          f" worst {times[-1] * 1000:.1f} ms, total {sum(times):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
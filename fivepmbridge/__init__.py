@@ -1,2 +1,26 @@
-from fivepmbridge.bridge_server import start_bridge_server
-from fivepmbridge.bridge_gui import join_bridge_game
\ No newline at end of file
+# The package's entry points are loaded on first use, so importing the
+# package, or any headless module such as bridge_server or bridge_bot, does
+# not load wxPython or numpy.
+
+import importlib
+
+_LAZY_ATTRIBUTES = {
+    "start_bridge_server": "fivepmbridge.bridge_server",
+    "start_async_bridge_server": "fivepmbridge.bridge_server",
+    "join_bridge_game": "fivepmbridge.bridge_gui",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
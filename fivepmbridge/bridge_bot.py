@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from fivepmbridge.bridge_client import BridgeClientCore
+from fivepmbridge.bridge_game import Card, CardSet, Suit, PASS, FIRST_BID, STRAINS, STRAIN_INDEX
+
+MAX_RECONNECTS = 3
+
+class BridgeBot(BridgeClientCore):
+    # A headless player for load tests. The admin bot deals, every bot makes
+    # a simple call when it is its turn to bid, then plays a legal card when
+    # it is its turn (declarer's left hand opponent leads first, then the last
+    # trick's winner), declarer playing for dummy, and the winner of a full
+    # trick takes it. Passed out boards are dealt again. A dropped bot
+    # reconnects and resumes its seat. Records how long each action takes to
+    # come back as state.
+    def __init__(self, host, port, boards=1, seed=None, join=None, session_token=None):
+        super().__init__(host, port, session_token=session_token)
+        self.boards = boards
+        self.rng = random.Random(seed)
+        # (command, table id) to send to a lobby server before playing
+        self.join = join
+        self.is_admin = False
+        self.leader = 0
+        self.tricks_seen = 0
+        self.trick_full = False
+        self.pending = None  # (kind, card or call or None, sent at)
+        self.latencies = []
+        self.actions = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.leaving = False
+        self.done = threading.Event()
+
+    def connect(self):
+        if not super().connect():
+            self.errors += 1
+            self.done.set()
+            return False
+        if self.join is not None and not self.resuming:
+            command, table_id = self.join
+            self.send_message(f"!{command} {table_id}")
+        return True
+
+    def on_message(self, text):
+        if text == "[SERVER] You are the admin." or text == "[PRIVATE] You are now the admin!":
+            self.is_admin = True
+
+    def on_scold(self, text):
+        self.errors += 1
+
+    def disconnect(self):
+        self.leaving = True
+        super().disconnect()
+
+    def on_disconnect(self):
+        if self.done.is_set() or self.leaving:
+            return
+        if self.session_token is not None and self.reconnects < MAX_RECONNECTS:
+            self.reconnects += 1
+            # Whatever was in flight is judged again from the resumed state
+            self.pending = None
+            self.reconnect()
+            return
+        self.errors += 1
+        self.done.set()
+
+    def on_state(self, names, hands, played_cards):
+        state = self.table_state
+        if state.seq is None or self.done.is_set():
+            return
+        seat = state.my_seat
+        hand = state.hands[seat]
+        played = state.played_cards
+        count = sum(card is not None for card in played)
+        self.check_pending(played, count)
+
+        if self.trick_full and count == 0:
+            # The trick we saw complete has been taken
+            self.tricks_seen += 1
+            if self.tricks_seen >= self.boards * 13:
+                self.done.set()
+                return
+        self.trick_full = count == 4
+
+        if self.pending is not None:
+            return
+        auction = state.auction
+        if count == 0 and (auction is None or not any(state.hands) or auction.passed_out):
+            # Nothing dealt yet, the board is over or nobody bid
+            if self.is_admin and len(state.names) == 4:
+                self.act("deal", None, self.deal)
+            return
+        if not auction.is_over:
+            if auction.turn == seat:
+                call = self.choose_call(auction, hand)
+                self.act("bid", call, lambda: self.make_call(call))
+            return
+        contract = auction.contract()
+        if count == 0 and sum(len(cards) for cards in state.hands) == 52:
+            # Opening lead
+            self.leader = (contract.declarer + 1) % 4
+        elif 0 < count < 4:
+            # The leader is the only seat that played after an empty seat,
+            # which also holds after resuming in the middle of a trick
+            self.leader = next(s for s in range(4) if played[s] is not None and played[s - 1] is None)
+        if count == 4:
+            winner = self.trick_winner(played, contract.trump)
+            self.leader = winner
+            if self.controller(contract, winner) == seat:
+                self.act("trick", None, self.take_trick)
+            return
+        turn = (self.leader + count) % 4
+        if played[turn] is None and self.controller(contract, turn) == seat:
+            card = self.choose_card(state.hands[turn], played[self.leader])
+            self.act("play", (turn, card), lambda: self.play_card(card))
+
+    def check_pending(self, played, count):
+        if self.pending is None:
+            return
+        kind, arg, sent_at = self.pending
+        state = self.table_state
+        seat = state.my_seat
+        auction = state.auction
+        if (kind == "play" and played[arg[0]] == arg[1]
+                or kind == "trick" and count == 0
+                or kind == "bid" and auction is not None and auction.calls and auction.calls[-1] == arg
+                    and (auction.dealer + len(auction.calls) - 1) % 4 == seat
+                or kind == "deal" and len(state.hands[seat]) == 13 and auction is not None and not auction.calls):
+            self.latencies.append(time.perf_counter() - sent_at)
+            self.pending = None
+
+    def act(self, kind, arg, send):
+        self.pending = (kind, arg, time.perf_counter())
+        self.actions += 1
+        try:
+            send()
+        except OSError:
+            self.errors += 1
+            self.done.set()
+
+    def choose_call(self, auction, hand):
+        # Opens or overcalls its longest suit at the cheapest level with
+        # enough points, otherwise passes
+        cards = CardSet(hand)
+        hcp = cards.hcp()
+        if hcp < 12 or (auction.last_bid is not None and hcp < 15):
+            return PASS
+        strain = max(STRAINS[:4], key=cards.suit_length)
+        call = FIRST_BID + STRAIN_INDEX[strain]
+        while auction.last_bid is not None and call <= auction.last_bid:
+            call += 5
+        if call - FIRST_BID >= 15 or (auction.last_bidder is not None and auction.last_bidder % 2 == auction.turn % 2):
+            return PASS
+        return call
+
+    def controller(self, contract, seat):
+        # Declarer plays dummy's cards
+        return contract.declarer if seat == contract.dummy else seat
+
+    def choose_card(self, hand, lead):
+        # Follows suit when possible, otherwise plays anything
+        legal = hand
+        if lead is not None:
+            following = [card for card in hand if card[0] == lead[0]]
+            if following:
+                legal = following
+        return self.rng.choice(legal)
+
+    def trick_winner(self, played, trump=Suit.NO_TRUMP):
+        lead_suit = Suit(played[self.leader][0])
+        winner = self.leader
+        for seat, code in enumerate(played):
+            if seat != winner and Card.from_code(code).is_better(Card.from_code(played[winner]), lead_suit, trump):
+                winner = seat
+        return winner
@@ -0,0 +1,236 @@
+import socket
+import threading
+import ast
+from fivepmbridge.bridge_framing import FrameReader, send_frame
+from fivepmbridge.bridge_game import CALL_TEXTS
+from fivepmbridge.bridge_protocol import PROTO_BINARY, TableState, GAP, APPLIED, decode_message, is_binary
+
+class TableChanges:
+    # What a UI has to redraw: (position, name, hand) for each seat whose name
+    # or hand changed and (position, card) for each changed played card.
+    # Positions are relative to this client: south, west, north, east.
+    def __init__(self, seats, played):
+        self.seats = seats
+        self.played = played
+
+    def __bool__(self):
+        return bool(self.seats or self.played)
+
+
+def diff_state(old, new):
+    # old and new are (names, hands, played_cards) as passed to on_state;
+    # old is None when nothing has been rendered yet
+    names, hands, played_cards = new
+    if old is None:
+        return TableChanges(list(zip(range(len(names)), names, hands)), list(enumerate(played_cards)))
+    old_names, old_hands, old_played = old
+    seats = [(i, names[i], hands[i]) for i in range(len(names))
+             if i >= len(old_names) or names[i] != old_names[i] or hands[i] != old_hands[i]]
+    played = [(i, card) for i, card in enumerate(played_cards) if i >= len(old_played) or card != old_played[i]]
+    return TableChanges(seats, played)
+
+
+class UpdatePipeline:
+    # Hands state and messages from the receive thread to a UI thread. Each
+    # state is diffed on the receive thread against the last one the UI took,
+    # and anything that arrives before the UI gets to it is folded into one
+    # pending update, so the UI only ever draws the latest state and a burst
+    # of messages costs it one wakeup. schedule() must arrange for the UI
+    # thread to call take() soon; it is called once per pending update.
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.lock = threading.Lock()
+        self.rendered = None
+        self.latest = None
+        self.changes = None
+        self.messages = []
+        self.scheduled = False
+        self.states = 0
+        self.takes = 0
+
+    def push_state(self, names, hands, played_cards):
+        with self.lock:
+            self.latest = (names, hands, played_cards)
+            self.changes = diff_state(self.rendered, self.latest)
+            self.states += 1
+            self.wake()
+
+    def push_message(self, text):
+        with self.lock:
+            self.messages.append(text)
+            self.wake()
+
+    def wake(self):
+        # Called with the lock held
+        if not self.scheduled:
+            self.scheduled = True
+            self.schedule()
+
+    def take(self):
+        # On the UI thread: (TableChanges or None, messages) since the last take
+        with self.lock:
+            changes, messages = self.changes, self.messages
+            if changes is not None:
+                self.rendered = self.latest
+            self.changes = None
+            self.messages = []
+            self.scheduled = False
+            self.takes += 1
+        return changes, messages
+
+
+class BridgeClientCore:
+    # Networking and protocol handling for one seat, without any GUI. The
+    # on_* methods are hooks for subclasses; they run on the receive thread.
+    def __init__(self, host, port, proto=PROTO_BINARY, session_token=None):
+        self.host = host
+        self.port = port
+        self.proto = proto
+        # Sent by the server when we sit down; reclaims the seat on reconnect
+        self.session_token = session_token
+        self.resuming = False
+        self.running = False
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.send_lock = threading.Lock()
+        self.table_state = TableState()
+        self.awaiting_snapshot = False
+
+    def on_message(self, text):
+        # Chat, server notices and connection status lines
+        pass
+
+    def on_scold(self, text):
+        pass
+
+    def on_state(self, names, hands, played_cards):
+        # Table state with this client first: south, west, north, east
+        pass
+
+    def on_disconnect(self):
+        pass
+
+    def connect(self):
+        try:
+            self.socket.connect((self.host, self.port))
+            self.running = True
+            # Decided before the receive thread can store a new token
+            self.resuming = self.session_token is not None
+            self.on_message(f"Connected to server at {self.host}:{self.port}")
+            threading.Thread(target=self.receive_messages, daemon=True).start()
+            self.send_message(f"!proto {self.proto}")
+            if self.resuming:
+                # With the last update we applied, the server sends only
+                # what we missed
+                seq = self.table_state.seq
+                self.send_message(f"!resume {self.session_token}" + ("" if seq is None else f" {seq}"))
+            return True
+        except Exception as e:
+            self.on_message(f"Connection failed: {e}")
+            return False
+
+    def receive_messages(self):
+        reader = FrameReader(self.socket)
+        while self.running:
+            try:
+                for data in reader.read_frames():
+                    self.handle_frame(data)
+            except Exception as e:
+                if self.running:
+                    self.on_message(f"Error receiving message: {e}")
+                break
+        self.running = False
+        self.socket.close()
+        self.on_message("Disconnected from server.")
+        self.on_disconnect()
+
+    def handle_frame(self, data):
+        if is_binary(data):
+            self.parse_versioned_state(data)
+            return
+        text = data.decode()
+        if not self.parse_commands(text):
+            self.on_message(text)
+
+    def parse_commands(self, text):
+        if text[0] == "@":
+            self.parse_bridge_state(text[1:])
+            return True
+        elif text[0] == "#":
+            self.parse_versioned_state(text)
+            return True
+        elif text[0] == "^":
+            self.on_scold(text[1:])
+            return True
+        elif text.startswith("[SESSION] "):
+            self.session_token = text[len("[SESSION] "):]
+            return True
+        return False
+
+    def parse_bridge_state(self, state_text):
+        my_name, hands, played_cards = state_text.split("\n")
+        hands = ast.literal_eval(hands)
+        played_cards = ast.literal_eval(played_cards)
+        # order goes south, west, north, east
+        names = list(hands.keys())
+        my_index = names.index(my_name)
+        names_ordered = []
+        hands_ordered = []
+        played_cards_ordered = []
+        for i in range(4):
+            names_ordered.append(names[(my_index+i)%4])
+            hands_ordered.append(hands[names_ordered[-1]])
+            if played_cards[names_ordered[-1]] == "None":
+                played_cards_ordered.append(None)
+            else:
+                played_cards_ordered.append(played_cards[names_ordered[-1]])
+        self.on_state(names_ordered, hands_ordered, played_cards_ordered)
+
+    def parse_versioned_state(self, message):
+        try:
+            decoded = decode_message(message)
+            result = self.table_state.apply_decoded(decoded)
+        except (ValueError, IndexError):
+            result = GAP
+        if result == GAP:
+            # Missed or garbled a delta, ask once for a fresh snapshot
+            if not self.awaiting_snapshot:
+                self.awaiting_snapshot = True
+                self.send_message("!resync")
+            return
+        if result != APPLIED:
+            return
+        if decoded[0] == "snapshot":
+            self.awaiting_snapshot = False
+        self.on_state(*self.table_state.ordered())
+
+    def deal(self):
+        self.send_message("!deal")
+
+    def make_call(self, call):
+        # call is a bridge_game call number
+        self.send_message("@" + CALL_TEXTS[call])
+
+    def play_card(self, card):
+        self.send_message("@card_"+card)
+
+    def take_trick(self):
+        self.send_message("@trick")
+
+    def reconnect(self):
+        # After a dropped connection, takes our seat back on a new one
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.awaiting_snapshot = False
+        return self.connect()
+
+    def disconnect(self):
+        self.running = False
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except:
+            pass
+        self.socket.close()
+        self.on_message("Disconnected.")
+
+    def send_message(self, message):
+        with self.send_lock:
+            send_frame(self.socket, message)
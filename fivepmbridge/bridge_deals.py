@@ -0,0 +1,139 @@
+# Batch dealing for practice boards.
+#
+# A batch of n deals is an (n, 52) uint8 array holding the seat of every card,
+# indexed like bridge_game (suit * 13 + value - 1, suits C, D, H, S). Seats
+# are in Auction order: south, west, north, east. HCP, suit lengths and
+# shapes are computed for the whole batch at once, and constraints are
+# predicates that take a DealBatch and return a boolean array with one entry
+# per deal, e.g.
+#
+#   deals = generate_deals(100, hcp_range(NORTH, 15, 17), balanced(NORTH),
+#                          suit_length(EAST, Suit.SPADES, 6), seed=7)
+
+import numpy as np
+from fivepmbridge.bridge_game import SUIT_INDEX, Suit, CardSet
+
+SOUTH, WEST, NORTH, EAST = range(4)
+
+# Jacks to aces are card values 10 to 13, worth 1 to 4 points
+HONOR_INDICES = np.array([suit * 13 + value - 1 for suit in range(4) for value in range(10, 14)])
+HONOR_POINTS = np.array([value - 9 for _ in range(4) for value in range(10, 14)], dtype=np.uint8)
+
+BALANCED_SHAPES = [(4, 3, 3, 3), (4, 4, 3, 2), (5, 3, 3, 2)]
+
+
+def make_rng(seed=None):
+    # The same seed always deals the same boards
+    return np.random.default_rng(seed)
+
+
+def deal_owners(count, rng):
+    # Sorting random keys gives a uniform permutation; reading it as the
+    # position of each card and giving positions 0-12 to south and so on
+    # deals 13 cards to every seat
+    keys = rng.random((count, 52), dtype=np.float32)
+    return (np.argsort(keys, axis=1) // 13).astype(np.uint8)
+
+
+class DealBatch():
+    def __init__(self, owners):
+        self.owners = owners
+        self._lengths = None
+        self._hcp = None
+        self._shape = None
+
+    def __len__(self):
+        return len(self.owners)
+
+    @property
+    def lengths(self):
+        # (n, seat, suit) card counts
+        if self._lengths is None:
+            by_suit = self.owners.reshape(-1, 4, 13)
+            self._lengths = np.stack([(by_suit == seat).sum(axis=2, dtype=np.uint8) for seat in range(4)], axis=1)
+        return self._lengths
+
+    @property
+    def hcp(self):
+        # (n, seat) high card points
+        if self._hcp is None:
+            honors = self.owners[:, HONOR_INDICES]
+            self._hcp = np.stack([((honors == seat) * HONOR_POINTS).sum(axis=1, dtype=np.uint8)
+                                  for seat in range(4)], axis=1)
+        return self._hcp
+
+    @property
+    def shape(self):
+        # (n, seat, 4) suit lengths longest first, e.g. 5 3 3 2
+        if self._shape is None:
+            self._shape = -np.sort(-self.lengths.astype(np.int8), axis=2)
+        return self._shape
+
+    def select(self, keep):
+        return DealBatch(self.owners[keep])
+
+    def filter(self, *predicates):
+        keep = np.ones(len(self), dtype=bool)
+        for predicate in predicates:
+            keep &= predicate(self)
+        return self.select(keep)
+
+    def masks(self, i):
+        # The four hands of deal i as bridge_game masks, in seat order
+        owners = self.owners[i]
+        hands = [0, 0, 0, 0]
+        for index in range(52):
+            hands[owners[index]] |= 1 << index
+        return hands
+
+    def hands(self, i):
+        return [CardSet(mask) for mask in self.masks(i)]
+
+
+def deal_batch(count, rng=None, seed=None):
+    if rng is None:
+        rng = make_rng(seed)
+    return DealBatch(deal_owners(count, rng))
+
+
+def generate_deals(count, *predicates, rng=None, seed=None, batch_size=100000):
+    # Deals batches until count deals satisfy every predicate
+    if rng is None:
+        rng = make_rng(seed)
+    found = []
+    total = 0
+    while total < count:
+        batch = deal_batch(batch_size, rng).filter(*predicates)
+        found.append(batch.owners)
+        total += len(batch)
+    return DealBatch(np.concatenate(found)[:count])
+
+
+def _suit_index(suit):
+    return SUIT_INDEX[suit] if isinstance(suit, Suit) else suit
+
+
+def hcp_range(seat, low, high=40):
+    return lambda batch: (batch.hcp[:, seat] >= low) & (batch.hcp[:, seat] <= high)
+
+
+def suit_length(seat, suit, low, high=13):
+    suit = _suit_index(suit)
+    return lambda batch: (batch.lengths[:, seat, suit] >= low) & (batch.lengths[:, seat, suit] <= high)
+
+
+def shape_is(seat, *shapes):
+    # Matches any of the given patterns, longest suit first, e.g. (4, 4, 3, 2)
+    patterns = np.array(shapes, dtype=np.int8)
+    return lambda batch: (batch.shape[:, seat, None, :] == patterns).all(axis=2).any(axis=1)
+
+
+def balanced(seat):
+    return shape_is(seat, *BALANCED_SHAPES)
+
+
+def partnership_hcp(seat, low, high=40):
+    def predicate(batch):
+        points = batch.hcp[:, seat] + batch.hcp[:, (seat + 2) % 4]
+        return (points >= low) & (points <= high)
+    return predicate
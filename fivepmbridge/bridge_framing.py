@@ -0,0 +1,133 @@
+# Length-prefixed framing shared by the servers and the client. Every frame
+# is a 4-byte big endian payload length followed by the payload.
+
+MAX_FRAME_SIZE = 1 << 20
+# Most platforms accept at least this many buffers in one sendmsg
+MAX_IOVECS = 512
+
+
+class FrameTooLarge(ConnectionError):
+    pass
+
+
+def encode_frame(message):
+    # Binary protocol messages are already bytes
+    data = message if isinstance(message, bytes) else message.encode()
+    length = len(data).to_bytes(4, byteorder='big')  # 4-byte length prefix
+    return length + data
+
+
+def check_frame_length(length, max_frame_size=MAX_FRAME_SIZE):
+    if length > max_frame_size:
+        raise FrameTooLarge(f"Frame of {length} bytes is over the {max_frame_size} byte limit")
+
+
+class FrameReader:
+    # Reads a socket into one reusable buffer with recv_into and hands back
+    # every complete frame it holds after each read. Unconsumed bytes are
+    # moved to the front of the buffer before the next read, and the buffer
+    # only grows when a single frame does not fit, never past max_frame_size.
+    # Without a socket, bytes read elsewhere are given to feed() instead.
+    def __init__(self, sock, buffer_size=65536, max_frame_size=MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def read_frames(self):
+        # Blocks for at least one complete frame. Raises ConnectionError when
+        # the peer closes the socket or sends an oversized frame.
+        while True:
+            frames = self.parse_frames()
+            if frames:
+                return frames
+            self.make_room()
+            received = self.sock.recv_into(self.view[self.end:])
+            if not received:
+                raise ConnectionError("Socket closed")
+            self.end += received
+
+    def feed(self, data):
+        # Adds bytes read by someone else and returns the complete frames
+        pending = self.end - self.start
+        if self.end + len(data) > len(self.buffer):
+            size = len(self.buffer)
+            while size < pending + len(data):
+                size *= 2
+            buffer = bytearray(size) if size > len(self.buffer) else self.buffer
+            buffer[:pending] = bytes(self.view[self.start:self.end])
+            if buffer is not self.buffer:
+                self.buffer, self.view = buffer, memoryview(buffer)
+            self.start, self.end = 0, pending
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return self.parse_frames()
+
+    def unread(self):
+        # Bytes after the last complete frame, for handing the stream on
+        return bytes(self.view[self.start:self.end])
+
+    def __iter__(self):
+        while True:
+            yield from self.read_frames()
+
+    def parse_frames(self):
+        frames = []
+        buffer, view = self.buffer, self.view
+        start, end = self.start, self.end
+        while end - start >= 4:
+            length = int.from_bytes(buffer[start:start + 4], byteorder='big')
+            check_frame_length(length, self.max_frame_size)
+            if end - start - 4 < length:
+                break
+            frames.append(bytes(view[start + 4:start + 4 + length]))
+            start += 4 + length
+        if start == end:
+            start = end = 0
+        self.start, self.end = start, end
+        return frames
+
+    def make_room(self):
+        # Ensures the partial frame at start can be completed in the buffer
+        pending = self.end - self.start
+        needed = 4
+        if pending >= 4:
+            needed = 4 + int.from_bytes(self.buffer[self.start:self.start + 4], byteorder='big')
+        if needed > len(self.buffer):
+            size = len(self.buffer)
+            while size < needed:
+                size *= 2
+            buffer = bytearray(size)
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer, self.view = buffer, memoryview(buffer)
+            self.start, self.end = 0, pending
+        elif self.start and (self.end == len(self.buffer) or self.start + needed > len(self.buffer)):
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start, self.end = 0, pending
+
+
+def send_frames(sock, frames):
+    # Writes encoded frames with as few sendmsg calls as the kernel allows,
+    # resuming after partial writes. Falls back to one sendall where
+    # sendmsg is not available.
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(frames))
+        return
+    buffers = [memoryview(frame) for frame in frames]
+    first = 0
+    while first < len(buffers):
+        sent = sock.sendmsg(buffers[first:first + MAX_IOVECS])
+        while sent:
+            size = len(buffers[first])
+            if sent >= size:
+                sent -= size
+                first += 1
+            else:
+                buffers[first] = buffers[first][sent:]
+                sent = 0
+
+
+def send_frame(sock, message):
+    send_frames(sock, [encode_frame(message)])
@@ -1,6 +1,7 @@
 from enum import Enum
 import random
 from collections import defaultdict
+from types import MappingProxyType
 
 class Suit(Enum):
     CLUBS = "C"
@@ -9,11 +10,31 @@ class Suit(Enum):
     SPADES = "S"
     NO_TRUMP = "N"
 
+# Bit layout shared by Card, CardSet and the wire protocol: a card's index is
+# suit * 13 + (value - 1) with suits ordered clubs, diamonds, hearts, spades,
+# and a hand is a 52-bit mask of those indices.
+SUIT_ORDER = [Suit.CLUBS, Suit.DIAMONDS, Suit.HEARTS, Suit.SPADES]
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUIT_ORDER)}
+SUIT_MASKS = [0x1FFF << (13 * i) for i in range(4)]
+# Hands are shown spades, hearts, clubs, diamonds
+DISPLAY_SUITS = (3, 2, 0, 1)
+FULL_DECK = (1 << 52) - 1
+
+# Jacks, queens, kings and aces of every suit (values 10 to 13)
+HONOR_MASKS = [sum(1 << (13 * suit + value - 1) for suit in range(4)) for value in range(10, 14)]
+
 class Card():
-    def __init__(self, value, suit: Suit) -> None:
+    # The 52 cards are interned, so Card(value, suit) always returns the same
+    # object and equality between cards is identity.
+    __slots__ = ("value", "suit", "index", "code")
+
+    def __new__(cls, value, suit: Suit):
         assert value in range(1, 14)
-        self.value = value
-        self.suit = suit
+        return DECK[SUIT_INDEX[suit] * 13 + value - 1]
+
+    def __reduce__(self):
+        return (Card, (self.value, self.suit))
+
     def is_better(self, other_card, lead_suit:Suit, trump:Suit):
         # If only this card is trump
         if self.suit == trump and not other_card.suit == trump:
@@ -31,61 +52,214 @@ class Card():
 
         return self.value > other_card.value
     def to_code(self):
-        return f"{self.suit.value}{self.value}"
+        return self.code
 
     @classmethod
     def from_code(cls, code):
-        suit_code = code[0]
-        if suit_code == 'C':
-            suit = Suit.CLUBS
-        elif suit_code == 'D':
-            suit = Suit.DIAMONDS
-        elif suit_code == 'H':
-            suit = Suit.HEARTS
-        elif suit_code == 'S':
-            suit = Suit.SPADES
-        value = int(code[1:])
-        return Card(value, suit)
+        try:
+            return CODE_TO_CARD[code]
+        except KeyError:
+            raise ValueError(f"Not a card code: {code!r}")
+
+    @classmethod
+    def from_index(cls, index):
+        return DECK[index]
 
     def __eq__(self, other):
         if isinstance(other, str):
-            suit_code = other[0]
-            if suit_code == 'C':
-                suit = Suit.CLUBS
-            elif suit_code == 'D':
-                suit = Suit.DIAMONDS
-            elif suit_code == 'H':
-                suit = Suit.HEARTS
-            elif suit_code == 'S':
-                suit = Suit.SPADES
-            value = int(other[1:])
-            return suit == self.suit and value == self.value
+            return other == self.code
+        if isinstance(other, Card):
+            return other is self
+        return NotImplemented
+
+    def __hash__(self):
+        return self.index
+
+    def __repr__(self):
+        return self.code
+
+def _build_deck():
+    deck = []
+    for suit in SUIT_ORDER:
+        for value in range(1, 14):
+            card = object.__new__(Card)
+            card.value = value
+            card.suit = suit
+            card.index = len(deck)
+            card.code = f"{suit.value}{value}"
+            deck.append(card)
+    return deck
+
+DECK = _build_deck()
+CODE_TO_CARD = {card.code: card for card in DECK}
+
+
+class CardSet():
+    # A set of cards stored as a 52-bit mask. Iterating yields Cards in display
+    # order, so it can stand in for the sorted card lists used before.
+    __slots__ = ("mask",)
+
+    def __init__(self, cards=0):
+        if isinstance(cards, int):
+            self.mask = cards
         else:
-            return self.suit == other.suit and self.value == other.value
+            self.mask = 0
+            for card in cards:
+                self.add(card)
+
+    @staticmethod
+    def bit(card):
+        if isinstance(card, str):
+            card = Card.from_code(card)
+        return 1 << card.index
+
+    def __contains__(self, card):
+        try:
+            return bool(self.mask & self.bit(card))
+        except ValueError:
+            return False
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __iter__(self):
+        for suit in DISPLAY_SUITS:
+            base = suit * 13
+            bits = (self.mask >> base) & 0x1FFF
+            while bits:
+                top = bits.bit_length() - 1
+                yield DECK[base + top]
+                bits ^= 1 << top
+
+    def __eq__(self, other):
+        if isinstance(other, CardSet):
+            return self.mask == other.mask
+        return NotImplemented
+
+    def __repr__(self):
+        return f"CardSet({self.codes()})"
+
+    def add(self, card):
+        self.mask |= self.bit(card)
+
+    def remove(self, card):
+        bit = self.bit(card)
+        if not self.mask & bit:
+            raise ValueError(f"{card} is not in the hand")
+        self.mask ^= bit
+
+    def codes(self):
+        return [card.code for card in self]
+
+    def suit_mask(self, suit: Suit):
+        return self.mask & SUIT_MASKS[SUIT_INDEX[suit]]
+
+    def has_suit(self, suit: Suit):
+        return bool(self.suit_mask(suit))
+
+    def suit_length(self, suit: Suit):
+        return self.suit_mask(suit).bit_count()
+
+    def can_play(self, card, lead_suit=None):
+        # A card may be played if it is held and either follows the lead or
+        # the hand is void in the led suit
+        if card not in self:
+            return False
+        if isinstance(card, str):
+            card = Card.from_code(card)
+        return lead_suit is None or card.suit == lead_suit or not self.has_suit(lead_suit)
+
+    def hcp(self):
+        # Milton Work count: J=1, Q=2, K=3, A=4
+        return sum(weight * (self.mask & honors).bit_count() for weight, honors in enumerate(HONOR_MASKS, 1))
 
 class Trick():
+    # Keeps the winning card up to date as cards are played, so the winner
+    # is known in constant time once the trick is complete
     def __init__(self, trump:Suit) -> None:
         self.trump = trump
         self.cards = {}
         self.lead_suit = None
+        self.best_card = None
+        self.best_player = None
     def play_card(self, card, player):
-        if self.cards == []:
-            self.lead_suit = card.suit()
+        if not self.cards:
+            self.lead_suit = card.suit
+            self.best_card, self.best_player = card, player
+        elif card.is_better(self.best_card, self.lead_suit, self.trump):
+            self.best_card, self.best_player = card, player
         self.cards[player] = card
+    def is_complete(self):
+        return len(self.cards) == 4
     def score_trick(self):
-        best_card = None
-        best_player = None
-        for player, card in self.cards.items():
-            if not best_card:
-                best_card = card
-                best_player = player
-                continue
+        return self.best_player
+
+class CardPlay():
+    # The play of one board once the contract is known. Seats are numbered
+    # as in the Auction, hands is a list of CardSets by seat and is updated
+    # in place. Declarer plays for dummy. Has no I/O, so simulations can
+    # drive it directly.
+    def __init__(self, hands, contract) -> None:
+        self.hands = hands
+        self.contract = contract
+        self.trick = Trick(contract.trump)
+        self.last_trick = None
+        self.leader = (contract.declarer + 1) % 4
+        # Tricks won by seats 0 and 2, and by seats 1 and 3
+        self.tricks = [0, 0]
+
+    @property
+    def turn(self):
+        # None while a complete trick waits to be taken
+        if self.trick.is_complete():
+            return None
+        return (self.leader + len(self.trick.cards)) % 4
 
-            if card.is_better(best_card, self.lead_suit, self.tump):
-                best_card = card
-                best_player = player
+    @property
+    def is_over(self):
+        return self.tricks[0] + self.tricks[1] == 13
 
-        return best_player
+    @property
+    def declarer_tricks(self):
+        return self.tricks[self.contract.declarer % 2]
+
+    def controller(self, seat):
+        # The seat whose player acts for seat
+        return self.contract.declarer if seat == self.contract.dummy else seat
+
+    def can_play(self, seat, card):
+        return seat == self.turn and self.hands[seat].can_play(card, self.trick.lead_suit)
+
+    def play_card(self, seat, card):
+        if isinstance(card, str):
+            try:
+                card = Card.from_code(card)
+            except ValueError:
+                return False
+        if not self.can_play(seat, card):
+            return False
+        self.hands[seat].remove(card)
+        self.trick.play_card(card, seat)
+        return True
+
+    def winner(self):
+        if not self.trick.is_complete():
+            return None
+        return self.trick.score_trick()
+
+    def take_trick(self):
+        # Scores a complete trick and returns its winner, who leads next
+        winner = self.winner()
+        if winner is None:
+            return None
+        self.tricks[winner % 2] += 1
+        self.leader = winner
+        self.last_trick = self.trick
+        self.trick = Trick(self.contract.trump)
+        return winner
 
 class Hand():
     def __init__(self) -> None:
@@ -127,60 +301,222 @@ class Partnership():
         self.score += above + below
         self.current_below_score += below
 
+# Calls are small integers: PASS, DOUBLE and REDOUBLE, then the 35 bids in
+# rank order, FIRST_BID + (level - 1) * 5 + strain with strains ordered C, D,
+# H, S, NT. A higher bid always has a higher call number.
+PASS = 0
+DOUBLE = 1
+REDOUBLE = 2
+FIRST_BID = 3
+STRAINS = [Suit.CLUBS, Suit.DIAMONDS, Suit.HEARTS, Suit.SPADES, Suit.NO_TRUMP]
+STRAIN_INDEX = {strain: i for i, strain in enumerate(STRAINS)}
+CALL_COUNT = FIRST_BID + 7 * len(STRAINS)
+
+# "p", "x", "xx", "1c", "1d", ... "7n", as sent by clients after the "@"
+CALL_TEXTS = ["p", "x", "xx"] + [f"{level}{strain.value.lower()}" for level in range(1, 8) for strain in STRAINS]
+TEXT_TO_CALL = {text: call for call, text in enumerate(CALL_TEXTS)}
+TEXT_TO_CALL.update({"pass": PASS, "double": DOUBLE, "redouble": REDOUBLE})
+
 class Bid():
-    def __init__(self, value=0, suit=0, is_pass=False, is_dobule=False) -> None:
-        self.value = value
-        self.suit = suit
-        self.is_pass = is_pass
-        self.is_double = is_dobule
+    # One call in an auction, kept as its call number
+    __slots__ = ("call",)
+
+    def __init__(self, value=0, suit=Suit.NO_TRUMP, is_pass=False, is_double=False, is_redouble=False) -> None:
+        if is_pass:
+            self.call = PASS
+        elif is_double:
+            self.call = DOUBLE
+        elif is_redouble:
+            self.call = REDOUBLE
+        else:
+            assert value in range(1, 8)
+            self.call = FIRST_BID + (value - 1) * 5 + STRAIN_INDEX[suit]
+
+    @classmethod
+    def from_call(cls, call):
+        if not 0 <= call < CALL_COUNT:
+            raise ValueError(f"Not a call: {call!r}")
+        bid = object.__new__(cls)
+        bid.call = call
+        return bid
+
+    @classmethod
+    def from_text(cls, text):
+        try:
+            return cls.from_call(TEXT_TO_CALL[text.lower()])
+        except KeyError:
+            raise ValueError(f"Not a call: {text!r}")
+
+    @property
+    def is_pass(self):
+        return self.call == PASS
+
+    @property
+    def is_double(self):
+        return self.call == DOUBLE
+
+    @property
+    def is_redouble(self):
+        return self.call == REDOUBLE
+
+    @property
+    def value(self):
+        return 0 if self.call < FIRST_BID else (self.call - FIRST_BID) // 5 + 1
+
+    @property
+    def suit(self):
+        return None if self.call < FIRST_BID else STRAINS[(self.call - FIRST_BID) % 5]
+
     def is_greater(self, other):
         if not other:
             return True
-        if self.value > other.value:
-            return True
-        if self.value == other.value:
-            if self.suit > other.suit:
-                return True
-        return False
+        return self.call > other.call
+
+    def to_text(self):
+        return CALL_TEXTS[self.call]
+
+    def __eq__(self, other):
+        if isinstance(other, Bid):
+            return other.call == self.call
+        return NotImplemented
+
+    def __hash__(self):
+        return self.call
+
+    def __repr__(self):
+        return self.to_text()
+
+class Contract():
+    def __init__(self, level, strain: Suit, doubled, declarer) -> None:
+        self.level = level
+        self.strain = strain
+        # PASS when undoubled, else DOUBLE or REDOUBLE
+        self.doubled = doubled
+        self.declarer = declarer
+
+    @property
+    def dummy(self):
+        return (self.declarer + 2) % 4
+
+    @property
+    def trump(self):
+        return self.strain
+
+    def to_text(self):
+        return f"{self.level}{self.strain.value}" + ["", "X", "XX"][self.doubled]
+
+    def __repr__(self):
+        return f"Contract({self.to_text()} by seat {self.declarer})"
 
 class Auction():
-    def __init__(self, south, west, north, east) -> None:
-        self.players = [south,west,north,east]
-        self.declares = [[],[],[],[]]
-        self.doubled = False
-        self.num_passes = 0
-        self.bid_turn = 0
-        self.current_bid = None
-    def make_bid(self, player, bid:Bid):
-        player_index = self.bid_turn%len(self.players)
-        partner_index = (self.bid_turn+2)%len(self.players)
-        assert player is self.players[player_index]
-        if bid.is_pass:
-            self.bid_turn += 1
-            self.num_passes += 1
-            return True
-        elif bid.is_double and not self.doubled:
-            self.bid_turn += 1
-            self.num_passes += 1
-            self.is_doubled = True
+    # Seats are numbered 0-3 in playing order starting anywhere; the dealer
+    # calls first. Everything needed to validate the next call is kept up to
+    # date as calls are made, so is_legal and make_call are O(1).
+    def __init__(self, dealer=0) -> None:
+        self.dealer = dealer
+        self.calls = bytearray()
+        self.last_bid = None        # highest bid so far
+        self.last_bidder = None
+        self.doubled = PASS         # PASS, DOUBLE or REDOUBLE on last_bid
+        self.passes = 0             # consecutive passes
+        # (side, strain index) -> first seat of that side to bid the strain
+        self.first_to_bid = {}
+
+    @property
+    def turn(self):
+        return (self.dealer + len(self.calls)) % 4
+
+    @property
+    def is_over(self):
+        return self.passes == 4 or (self.passes == 3 and self.last_bid is not None)
+
+    @property
+    def passed_out(self):
+        return self.passes == 4 and self.last_bid is None
+
+    def is_legal(self, call, seat=None):
+        if self.is_over or (seat is not None and seat != self.turn):
+            return False
+        if call == PASS:
             return True
-        elif bid.is_greater(self.current_bid):
-            self.current_bid = bid
-            if bid.suit not in self.declares[player_index] + self.declares[partner_index]:
-                self.declares[player_index].append(bid.suit)
-            self.bid_turn += 1
-            self.is_doubled = False
+        if call == DOUBLE:
+            # Only an opponent's undoubled bid can be doubled
+            return self.last_bid is not None and self.doubled == PASS and (self.last_bidder - self.turn) % 2 == 1
+        if call == REDOUBLE:
+            return self.doubled == DOUBLE and (self.last_bidder - self.turn) % 2 == 0
+        return FIRST_BID <= call < CALL_COUNT and (self.last_bid is None or call > self.last_bid)
+
+    def legal_calls(self):
+        if self.is_over:
+            return []
+        calls = [call for call in (PASS, DOUBLE, REDOUBLE) if self.is_legal(call)]
+        first = FIRST_BID if self.last_bid is None else self.last_bid + 1
+        calls.extend(range(first, CALL_COUNT))
+        return calls
+
+    def make_call(self, seat, call):
+        if not self.is_legal(call, seat):
+            return False
+        self.calls.append(call)
+        if call == PASS:
+            self.passes += 1
             return True
-        print(f"You can't bid {bid}")
-        return False
+        self.passes = 0
+        if call == DOUBLE or call == REDOUBLE:
+            self.doubled = call
+        else:
+            self.last_bid = call
+            self.last_bidder = seat
+            self.doubled = PASS
+            self.first_to_bid.setdefault((seat % 2, (call - FIRST_BID) % 5), seat)
+        return True
+
+    def make_bid(self, seat, bid: Bid):
+        return self.make_call(seat, bid.call)
+
+    def contract(self):
+        # None until the auction is over, and for a passed out board
+        if not self.is_over or self.last_bid is None:
+            return None
+        strain_index = (self.last_bid - FIRST_BID) % 5
+        declarer = self.first_to_bid[(self.last_bidder % 2, strain_index)]
+        level = (self.last_bid - FIRST_BID) // 5 + 1
+        return Contract(level, STRAINS[strain_index], self.doubled, declarer)
+
+    @classmethod
+    def from_calls(cls, dealer, calls):
+        # Replays a call sequence, raising ValueError on the first illegal call
+        auction = cls(dealer)
+        for call in calls:
+            if not auction.make_call(auction.turn, call):
+                raise ValueError(f"Illegal call {CALL_TEXTS[call] if 0 <= call < CALL_COUNT else call!r}")
+        return auction
 
 
 class Rubber():
+    # Scores are recorded with bridge_scoring.score_rubber_deal
     def __init__(self, partnership1, partnership2) -> None:
         self.partnership1 = partnership1
         self.partnership2 = partnership2
+        # By side: seats 0 and 2, then seats 1 and 3
+        self.partnerships = [partnership1, partnership2]
         self.is_over = False
 
+    def record_deal(self, side, above, below):
+        # above is negative when the other side scores the undertricks
+        declarers, defenders = self.partnerships[side], self.partnerships[1 - side]
+        if above < 0:
+            defenders.award(-above, 0)
+        else:
+            declarers.award(above, below)
+        if declarers.current_below_score >= 100:
+            # Game; partscores below the line no longer count towards the next
+            declarers.games += 1
+            for partnership in self.partnerships:
+                partnership.current_below_score = 0
+            if self.check_for_rubber():
+                self.score_rubber()
+
     def check_for_rubber(self):
         if self.partnership1.games == 2:
             return True
@@ -202,52 +538,242 @@ class Rubber():
     def start(self):
         pass
 
+NO_PLAYERS = MappingProxyType({})
+
+
+class BoardState():
+    # One version of a ContractBridge board. A version is never changed once
+    # made: every deal, call, card and trick makes a new one that shares all
+    # it didn't touch with the one before, so whoever holds a version sees
+    # the whole board as it was, however many moves have been made since.
+    # dealt is the hand masks by seat as dealt; hands maps players to their
+    # card masks now and played to their card in the current trick; trick is
+    # (seat, card index) in play order and winner its winner once complete.
+    __slots__ = ("boards_dealt", "dealt", "dealer", "calls", "auction_over", "contract", "hands", "played",
+                 "leader", "trick", "winner", "tricks", "plays")
+
+    def __init__(self, boards_dealt=0, dealt=None, dealer=None, calls=(), auction_over=False, contract=None,
+                 hands=NO_PLAYERS, played=NO_PLAYERS, leader=None, trick=(), winner=None, tricks=(0, 0),
+                 plays=b""):
+        values = (boards_dealt, dealt, dealer, calls, auction_over, contract, hands, played, leader, trick, winner,
+                  tricks, plays)
+        for name, value in zip(BoardState.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A BoardState can't be changed; make a new one with replace()")
+
+    def replace(self, **changes):
+        return BoardState(**{name: changes[name] if name in changes else getattr(self, name)
+                             for name in BoardState.__slots__})
+
+    @property
+    def bidding(self):
+        return self.dealer is not None and not self.auction_over
+
+    @property
+    def auction_turn(self):
+        return (self.dealer + len(self.calls)) % 4 if self.bidding else None
+
+    @property
+    def turn(self):
+        # The seat to play, None while a complete trick waits to be taken
+        if self.contract is None or len(self.trick) == 4:
+            return None
+        return (self.leader + len(self.trick)) % 4
+
+    @property
+    def is_over(self):
+        return self.contract is not None and self.tricks[0] + self.tricks[1] == 13
+
+    @property
+    def declarer_tricks(self):
+        return self.tricks[self.contract.declarer % 2]
+
+    def controller(self, seat):
+        return self.contract.declarer if seat == self.contract.dummy else seat
+
+    def hand(self, player):
+        return CardSet(self.hands.get(player, 0))
+
+
 class ContractBridge():
+    # Moves are made on the mutable Auction, CardPlay and hands below, by
+    # one thread at a time, and each one publishes a new BoardState as state.
+    # Everything that only reads the board should read state instead.
     def __init__(self, players) -> None:
         self.players = players
         self.hands = {}
         self.players_to_played_cards = defaultdict(None)
-        self.players_to_cards = defaultdict(list)
+        self.players_to_cards = defaultdict(CardSet)
+        self.boards_dealt = 0
+        self.auction = None
+        self.card_play = None
+        # The hands as dealt, by seat, and the indices of the cards played
+        # since, so a board can be rebuilt from a snapshot
+        self.dealt = None
+        self.plays = bytearray()
+        self.state = BoardState()
+
+    def publish(self, **changes):
+        self.state = self.state.replace(**changes)
+        return self.state
+
+    def hand_masks(self):
+        return MappingProxyType({player: cards.mask for player, cards in self.players_to_cards.items()})
+
+    def played_cards(self):
+        return MappingProxyType(dict(self.players_to_played_cards))
+
+    def play_changes(self):
+        # What the card play decides in a BoardState
+        card_play = self.card_play
+        return {"leader": card_play.leader,
+                "trick": tuple((seat, card.index) for seat, card in card_play.trick.cards.items()),
+                "winner": card_play.winner(), "tricks": tuple(card_play.tricks)}
 
     def get_hands(self):
         return self.players_to_cards
     def get_played_cards(self):
         return self.players_to_played_cards
     def deal(self):
-        cards_exist = False
-        for  cards in self.players_to_cards.values():
-            if len(cards) > 0:
-                cards_exist = True
-        if cards_exist and len(self.players_to_cards.keys()) != 4:
+        # Deals a new board to the four players. False, and nothing is dealt,
+        # unless all four seats are filled.
+        if len(self.players) != 4:
             return False
-        else:
-            hands = deal_cards()
-            for i, player in enumerate(self.players_to_cards):
-                self.players_to_cards[player] = hands[i]
-                self.players_to_played_cards[player] = None
+        hands = deal_masks()
+        # Only the seated players hold cards now, whoever held them before
+        self.players_to_cards.clear()
+        self.players_to_played_cards.clear()
+        for i, player in enumerate(self.players):
+            self.players_to_cards[player] = CardSet(hands[i])
+            self.players_to_played_cards[player] = None
+        # The deal passes clockwise, so the first caller rotates
+        self.auction = Auction(self.boards_dealt % 4)
+        self.card_play = None
+        self.dealt = list(hands)
+        self.plays = bytearray()
+        self.boards_dealt += 1
+        self.state = BoardState(self.boards_dealt, tuple(self.dealt), self.auction.dealer,
+                                hands=self.hand_masks(), played=self.played_cards())
+        return True
+
+    def bidding(self):
+        return self.auction is not None and not self.auction.is_over
+
+    def make_call(self, player, call):
+        if self.auction is None or not self.auction.make_call(self.players.index(player), call):
+            return False
+        contract = self.auction.contract()
+        if contract is None:
+            self.publish(calls=tuple(self.auction.calls), auction_over=self.auction.is_over)
             return True
+        self.card_play = CardPlay([self.players_to_cards[p] for p in self.players], contract)
+        self.publish(calls=tuple(self.auction.calls), auction_over=True, contract=contract, **self.play_changes())
+        return True
+
+    def contract(self):
+        if self.auction is None:
+            return None
+        return self.auction.contract()
+
+    def seat_to_play(self, player):
+        # The seat player would play for next, or None if it isn't their turn
+        if self.card_play is None:
+            return None
+        turn = self.card_play.turn
+        if turn is None or self.card_play.controller(turn) != self.players.index(player):
+            return None
+        return turn
 
     def play_card(self, player, card_code):
+        # Returns the seat the card was played from, or None
+        seat = self.seat_to_play(player)
+        if seat is None or not self.card_play.play_card(seat, card_code):
+            return None
         card = Card.from_code(card_code)
-        if self.players_to_played_cards[player]:
-            return False
-        if card in self.players_to_cards[player]:
-            self.players_to_played_cards[player] = card
-            self.players_to_cards[player].remove(card)
-            return True
-        else:
-            return False
+        self.players_to_played_cards[self.players[seat]] = card
+        self.plays.append(card.index)
+        self.publish(hands=self.hand_masks(), played=self.played_cards(), plays=bytes(self.plays),
+                     **self.play_changes())
+        return seat
 
     def take_trick(self, player):
-        four_cards = True
-        for value in self.players_to_played_cards.values():
-            if value is None:
-                four_cards = False
-        if four_cards:
-            for i, player in enumerate(self.players_to_cards):
-                self.players_to_played_cards[player] = None
-            return True
-        return False
+        # Only the player in control of the winning seat takes the trick.
+        # Returns the winning seat, or None.
+        if self.card_play is None:
+            return None
+        winner = self.card_play.winner()
+        if winner is None or self.card_play.controller(winner) != self.players.index(player):
+            return None
+        self.card_play.take_trick()
+        for p in self.players:
+            self.players_to_played_cards[p] = None
+        self.publish(played=self.played_cards(), **self.play_changes())
+        return winner
+
+    def rebind(self, old_player, new_player):
+        # Hands the cards held for old_player to new_player, who has already
+        # taken their place in players
+        if old_player in self.players_to_cards:
+            self.players_to_cards[new_player] = self.players_to_cards.pop(old_player)
+        if old_player in self.players_to_played_cards:
+            self.players_to_played_cards[new_player] = self.players_to_played_cards.pop(old_player)
+        self.publish(hands=self.hand_masks(), played=self.played_cards())
+
+    def forget(self, player):
+        # Drops the cards held for a player who has given up their seat
+        self.players_to_cards.pop(player, None)
+        self.players_to_played_cards.pop(player, None)
+        self.publish(hands=self.hand_masks(), played=self.played_cards())
+
+    def get_state(self):
+        # Plain values describing the board by seat, for snapshots. Read
+        # from state, so it can be taken while moves are being made.
+        state = self.state
+        if state.dealt is None:
+            return {"boards_dealt": state.boards_dealt}
+        return {
+            "boards_dealt": state.boards_dealt,
+            "dealt": list(state.dealt),
+            "dealer": state.dealer,
+            "calls": list(state.calls),
+            "plays": list(state.plays),
+            "tricks_taken": sum(state.tricks),
+        }
+
+    def set_state(self, state):
+        # Rebuilds the board from get_state by replaying it. players must
+        # already hold one entry per seat.
+        self.boards_dealt = state["boards_dealt"]
+        self.state = BoardState(self.boards_dealt)
+        if state.get("dealt") is None:
+            return
+        self.dealt = list(state["dealt"])
+        for player, mask in zip(self.players, self.dealt):
+            self.players_to_cards[player] = CardSet(mask)
+            self.players_to_played_cards[player] = None
+        self.auction = Auction.from_calls(state["dealer"], state["calls"])
+        self.card_play = None
+        self.plays = bytearray()
+        contract = self.auction.contract()
+        self.state = BoardState(self.boards_dealt, tuple(self.dealt), self.auction.dealer, tuple(self.auction.calls),
+                                self.auction.is_over, contract, self.hand_masks(), self.played_cards())
+        if contract is None:
+            return
+        self.card_play = CardPlay([self.players_to_cards[p] for p in self.players], contract)
+        for index in state["plays"]:
+            if self.card_play.turn is None:
+                self.card_play.take_trick()
+            if not self.card_play.play_card(self.card_play.turn, DECK[index]):
+                raise ValueError(f"Illegal play {DECK[index]} in snapshot")
+            self.plays.append(index)
+        if self.card_play.turn is None and sum(self.card_play.tricks) < state["tricks_taken"]:
+            self.card_play.take_trick()
+        for seat, card in self.card_play.trick.cards.items():
+            self.players_to_played_cards[self.players[seat]] = card
+        self.publish(hands=self.hand_masks(), played=self.played_cards(), plays=bytes(self.plays),
+                     **self.play_changes())
 
     # def draw_for_partners(self):
     #     self.has_drawn_for_partners = True
@@ -264,27 +790,16 @@ class ContractBridge():
     #     assert self.has_played_rubber1 and self.has_played_rubber2 and not self.has_played_rubber3
 
 
-def deal_cards():
-    # Create a standard deck (no NO_TRUMP)
-    deck = [Card(value, suit) for suit in list(Suit)[:4] for value in range(1, 14)]
-
-    # Shuffle the deck
-    random.shuffle(deck)
-
-    # Deal cards to four players
-    hands = [[], [], [], []]
-    for i, card in enumerate(deck):
-        hands[i % 4].append(card)
+def deal_masks(rng=random):
+    # Shuffles the 52 card indices and deals them round robin into four masks
+    indices = list(range(52))
+    rng.shuffle(indices)
+    hands = [0, 0, 0, 0]
+    for i, index in enumerate(indices):
+        hands[i % 4] |= 1 << index
+    return hands
 
-    # Define custom sort key: suit priority first, then value (descending)
-    suit_priority = {
-        Suit.SPADES: 0,
-        Suit.HEARTS: 1,
-        Suit.CLUBS: 2,
-        Suit.DIAMONDS: 3
-    }
-
-    for hand in hands:
-        hand.sort(key=lambda card: (suit_priority[card.suit], -card.value))
-
-    return hands
\ No newline at end of file
+def deal_cards():
+    # Deal cards to four players, each hand sorted by suit (spades, hearts,
+    # clubs, diamonds) and then value, highest first
+    return [list(CardSet(mask)) for mask in deal_masks()]
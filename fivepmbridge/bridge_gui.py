@@ -1,5 +1,6 @@
 import wx
 import os
+import json
 from enum import Enum
 import random
 
@@ -7,31 +8,47 @@ from fivepmbridge.bridge_player import BridgeClient
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 CARD_DIR = os.path.join(THIS_DIR, 'cards')
+ATLAS_INDEX = os.path.join(CARD_DIR, 'atlas.json')
 
 
-def get_image_name(card_code, covered=False):
-    value = card_code[1:]
-    suit_code = card_code[0]
-    if suit_code == 'C':
-        suit_code = "clubs"
-    elif suit_code == 'D':
-        suit_code = "diamonds"
-    elif suit_code == 'H':
-        suit_code = "hearts"
-    elif suit_code == 'S':
-        suit_code = "spades"
-    if covered:
-        return f"{value}_of_{suit_code}_covered.png"
-    return f"{value}_of_{suit_code}.png"
+class CardAtlas():
+    # Every card sprite cut out of the atlas written by gen_cards.py, as
+    # ready to draw bitmaps. Sprites are keyed "<code>[_covered]:<rotation>"
+    # with "back" for the card back and rotations 0, 90, 180 and 270 clockwise.
+    def __init__(self, index_path=ATLAS_INDEX):
+        with open(index_path) as f:
+            index = json.load(f)
+        sheet = wx.Bitmap(os.path.join(os.path.dirname(index_path), index["image"]), wx.BITMAP_TYPE_PNG)
+        self.bitmaps = {key: sheet.GetSubBitmap(wx.Rect(*rect)) for key, rect in index["sprites"].items()}
+
+    def card(self, card_code, covered=False, rotation=0):
+        if covered:
+            return self.bitmaps[f"{card_code}_covered:{rotation}"]
+        return self.bitmaps[f"{card_code}:{rotation}"]
+
+    def back(self, covered=False, rotation=0):
+        return self.card("back", covered, rotation)
+
+_atlas = None
+
+def get_atlas():
+    # Loaded once, after the wx.App exists, and shared by every panel
+    global _atlas
+    if _atlas is None:
+        _atlas = CardAtlas()
+    return _atlas
 
 class BridgeClientGUI(wx.Frame):
     def __init__(self, host='127.0.0.1', port=5000):
         super().__init__(None, title="Bridge Client", size=(800, 800))
+        self.atlas = get_atlas()
         self.client = BridgeClient(self, host, port)
         self.main_panel = wx.Panel(self)
 
         self.selected_hand_panel = None
         self.selected_card = None
+        # A scold dialog is open; further scolds go to the log
+        self.scolding = False
 
         main_sizer = wx.BoxSizer(wx.VERTICAL)
 
@@ -57,16 +74,28 @@ class BridgeClientGUI(wx.Frame):
 
         self.client.connect()
 
-    def append_message(self, message):
-        wx.CallAfter(self.log.AppendText, message + '\n')
+    def apply_updates(self):
+        # Runs on the GUI thread, woken by the client's UpdatePipeline
+        if not self:
+            return
+        changes, messages = self.client.updates.take()
+        if messages:
+            self.log.AppendText("\n".join(messages) + "\n")
+        if changes:
+            self.apply_changes(changes)
 
     def scold(self, text):
+        if self.scolding:
+            self.log.AppendText(f"Scolded: {text}\n")
+            return
+        self.scolding = True
         dlg = wx.MessageDialog(self,
                                message=text,
                                caption="You can't bid that!",
                                style=wx.OK | wx.ICON_WARNING)
         dlg.ShowModal()
         dlg.Destroy()
+        self.scolding = False
 
     def on_send(self, event):
         message = self.input.GetValue()
@@ -157,19 +186,16 @@ class BridgeClientGUI(wx.Frame):
         panel.SetSizer(vbox)
         return panel
 
-    def update_state(self, names, hands, played_cards):
-
-        if len(hands[0]) > 0:
-            self.bottom_hand_panel.set_hand(names[0], hands[0], (hands[0][0]!='b'))
-        if len(hands[1]) > 0:
-            self.left_hand_panel.set_hand(names[1], hands[1], (hands[1][0]!='b'))
-        if len(hands[2]) > 0:
-            self.top_hand_panel.set_hand(names[2], hands[2], (hands[2][0]!='b'))
-        if len(hands[3]) > 0:
-            self.right_hand_panel.set_hand(names[3], hands[3], (hands[3][0]!='b'))
-
-        # Show played cards
-        self.played_cards_panel.set_played_cards(played_cards)
+    def apply_changes(self, changes):
+        # Only the seats and played cards that changed are redrawn
+        panels = (self.bottom_hand_panel, self.left_hand_panel, self.top_hand_panel, self.right_hand_panel)
+        for position, name, hand in changes.seats:
+            panel = panels[position]
+            # An empty hand keeps showing the way it was dealt
+            face_up = hand[0] != 'b' if hand else panel.face_up
+            panel.set_hand(name, hand, face_up)
+        for position, card in changes.played:
+            self.played_cards_panel.set_played_card(position, card)
 
     def on_play_card(self, event):
         print("play card")
@@ -206,48 +232,59 @@ class BridgeClientGUI(wx.Frame):
         panel.selected_card = self.selected_card if self.selected_hand_panel == panel else None
         panel.populate_cards()
 
+# Card sprite sizes before rotation, and how far a selected card moves
+CARD_LENGTH = 90
+CARD_WIDTH = 60
+COVERED_WIDTH = 30
+SELECT_OFFSET = 10
+NAME_GAP = 5
+MAX_HAND = 13
+
 class PlayedCardsPanel(wx.Panel):
+    # Draws the current trick in a 3x3 grid of card slots. Only slots whose
+    # card changed are repainted.
     def __init__(self, parent):
         super().__init__(parent)
-        self.card_cache = {}
-        self.grid = wx.GridSizer(rows=3, cols=3, hgap=10, vgap=10)
-        self.SetSizer(self.grid)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.atlas = get_atlas()
+        self.gap = 10
+        self.cards = [None, None, None, None]
+        # Player positions → grid index: South, West, North, East
+        self.slot_rects = [self.slot_rect(index) for index in (7, 3, 1, 5)]
+        self.SetMinSize((3 * CARD_WIDTH + 2 * self.gap, 3 * CARD_LENGTH + 2 * self.gap))
+        self.Bind(wx.EVT_PAINT, self.on_paint)
 
-        # Pre-fill with blank cells
-        self.slots = [wx.Panel(self, size=(60, 90)) for _ in range(9)]
-        for slot in self.slots:
-            self.grid.Add(slot, 0, wx.ALIGN_CENTER)
+    def slot_rect(self, index):
+        row, col = divmod(index, 3)
+        return wx.Rect(col * (CARD_WIDTH + self.gap), row * (CARD_LENGTH + self.gap), CARD_WIDTH, CARD_LENGTH)
 
     def set_played_cards(self, cards):
-        # Clear previous content from all 9 grid cells
-        for slot in self.slots:
-            slot.DestroyChildren()
-
-        # Player positions → grid index: South, West, North, East
-        slot_indices = [7, 3, 1, 5]
-
-        for i, card in enumerate(cards):
-            if card:
-                slot = self.slots[slot_indices[i]]
-                bmp = self.get_card_bitmap(card).ConvertToBitmap()
-                bmp_ctrl = wx.StaticBitmap(slot, bitmap=bmp)
-                sizer = wx.BoxSizer(wx.VERTICAL)
-                sizer.Add(bmp_ctrl, 0, wx.ALIGN_CENTER)
-                slot.SetSizer(sizer)
-
-        self.Layout()
-
-    def get_card_bitmap(self, card):
-        filename = get_image_name(card)
-        if filename not in self.card_cache:
-            img = wx.Image(os.path.join(CARD_DIR, filename), wx.BITMAP_TYPE_PNG).Scale(60, 90)
-            self.card_cache[filename] = img
-        return self.card_cache[filename]
+        for i, card in enumerate(cards[:4]):
+            self.set_played_card(i, card)
+
+    def set_played_card(self, position, card):
+        if card != self.cards[position]:
+            self.cards[position] = card
+            self.RefreshRect(self.slot_rects[position])
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        region = self.GetUpdateRegion()
+        for card, rect in zip(self.cards, self.slot_rects):
+            if card and region.Contains(rect) != wx.OutRegion:
+                dc.DrawBitmap(self.atlas.card(card), rect.x, rect.y, True)
 
 # --- GUI Hand Panel ---
 class HandPanel(wx.Panel):
+    # Draws a hand as a strip of overlapping card bitmaps plus the player's
+    # name. The layout is recomputed on every change, but only card slots
+    # whose contents moved are repainted, and clicks are hit-tested against
+    # the card rectangles.
     def __init__(self, parent, hand, face_up, gui, vertical=False, horizantal=False):
         super().__init__(parent)
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
         self.name = "Empty"
         self.gui = gui
 
@@ -259,140 +296,163 @@ class HandPanel(wx.Panel):
             self.name = "\n".join(self.name)
 
         self.selected_card = None  # Track selected card
-        self.card_controls = {}  # Maps StaticBitmap to Card
+        # (card, bitmap, rect) for every card drawn, in paint order
+        self.card_layout = []
+        self.name_rect = wx.Rect()
+        self.drawn_name = None
 
-        self.card_cache = {}
-        self.card_back_img = wx.Image(os.path.join(CARD_DIR, "card_back.png"), wx.BITMAP_TYPE_PNG).Scale(60, 90)
-        self.card_back_img_covered = wx.Image(os.path.join(CARD_DIR, "card_back_covered.png"), wx.BITMAP_TYPE_PNG).Scale(30, 90)
+        self.atlas = get_atlas()
         if self.vertical and not self.horizantal:
-            self.card_back_img = self.card_back_img.Rotate90()
-            self.card_back_img_covered = self.card_back_img_covered.Rotate90()
+            self.rotation = 90
         elif not self.vertical and self.horizantal:
-            self.card_back_img = self.card_back_img.Rotate180()
-            self.card_back_img_covered = self.card_back_img_covered.Rotate180()
+            self.rotation = 180
         elif self.vertical and self.horizantal:
-            self.card_back_img = self.card_back_img.Rotate90(False)
-            self.card_back_img_covered = self.card_back_img_covered.Rotate90(False)
-
-        if vertical:
-            self.sizer = wx.BoxSizer(wx.VERTICAL)
-        else:
-            self.sizer = wx.BoxSizer(wx.HORIZONTAL)
-
-        # Determine main orientation
-        self.name_label = wx.StaticText(self, label=self.name)
-
-        # Determine where to place the name based on orientation
-        if self.vertical and self.horizantal:
-            # Both: Name on the right
-            main_sizer = wx.BoxSizer(wx.HORIZONTAL)
-            self.sizer = wx.BoxSizer(wx.VERTICAL)
-            main_sizer.Add(self.sizer, 0, wx.ALIGN_CENTER_VERTICAL)
-            main_sizer.AddSpacer(5)
-            main_sizer.Add(self.name_label, 0, wx.ALIGN_CENTER_VERTICAL)
-
-        elif self.vertical:
-            # Vertical only: Name on the left
-            main_sizer = wx.BoxSizer(wx.HORIZONTAL)
-            self.sizer = wx.BoxSizer(wx.VERTICAL)
-            main_sizer.Add(self.name_label, 0, wx.ALIGN_CENTER_VERTICAL)
-            main_sizer.AddSpacer(5)
-            main_sizer.Add(self.sizer, 0, wx.ALIGN_CENTER_VERTICAL)
-
-        elif self.horizantal:
-            # Horizontal only: Name above
-            main_sizer = wx.BoxSizer(wx.VERTICAL)
-            self.sizer = wx.BoxSizer(wx.HORIZONTAL)
-            main_sizer.Add(self.name_label, 0, wx.ALIGN_CENTER_HORIZONTAL)
-            main_sizer.AddSpacer(5)
-            main_sizer.Add(self.sizer, 0, wx.ALIGN_CENTER_HORIZONTAL)
-
+            self.rotation = 270
         else:
-            # Neither: Name below
-            main_sizer = wx.BoxSizer(wx.VERTICAL)
-            self.sizer = wx.BoxSizer(wx.HORIZONTAL)
-            main_sizer.Add(self.sizer, 0, wx.ALIGN_CENTER_HORIZONTAL)
-            main_sizer.AddSpacer(5)
-            main_sizer.Add(self.name_label, 0, wx.ALIGN_CENTER_HORIZONTAL)
+            self.rotation = 0
 
-        self.SetSizer(main_sizer)
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_LEFT_DOWN, self.on_card_click)
 
+        self.update_size()
         self.populate_cards()
 
     def set_hand(self, name, hand, face_up):
-        self.name = name
+        if self.vertical:
+            name = "\n".join(name)
         self.hand = hand
         self.face_up = face_up
         self.selected_card = None
+        if name != self.name:
+            self.name = name
+            self.update_size()
         self.populate_cards()
+
+    def update_size(self):
+        # The panel is sized for a full hand so the parent never has to lay
+        # out again when a card is played; only a new name can resize it
+        name_width, name_height = wx.ClientDC(self).GetMultiLineTextExtent(self.name)[:2]
+        strip_length = (MAX_HAND - 1) * COVERED_WIDTH + CARD_WIDTH
+        strip_depth = CARD_LENGTH + SELECT_OFFSET
+        self.name_size = wx.Size(name_width, name_height)
         if self.vertical:
-            self.name = "\n".join(self.name)
-        self.name_label.SetLabel(self.name)
-        self.Update()
+            size = wx.Size(strip_depth + NAME_GAP + name_width, max(strip_length, name_height))
+        else:
+            size = wx.Size(max(strip_length, name_width), strip_depth + NAME_GAP + name_height)
+        if size != self.GetMinSize():
+            self.SetMinSize(size)
+            self.SetSize(size)
+            self.GetParent().Layout()
+            self.Refresh()
 
     def get_card_bitmap(self, card, covered=False):
-        filename = get_image_name(card, covered)
-        width = 60
-        if covered:
-            width = 30
-        if filename not in self.card_cache:
-            img = wx.Image(os.path.join(CARD_DIR, filename), wx.BITMAP_TYPE_PNG).Scale(width, 90)
-            if self.vertical and not self.horizantal:
-                img = img.Rotate90()
-            elif not self.vertical and self.horizantal:
-                img = img.Rotate180()
-            elif self.vertical and self.horizantal:
-                img = img.Rotate90(False)
-            self.card_cache[filename] = img
-        return self.card_cache[filename]
+        if self.face_up:
+            return self.atlas.card(card, covered, self.rotation)
+        return self.atlas.back(covered, self.rotation)
+
+    def compute_layout(self):
+        width, height = self.GetMinSize()
+        name_width, name_height = self.name_size
+        strip_length = (len(self.hand) - 1) * COVERED_WIDTH + CARD_WIDTH if self.hand else 0
+        strip_depth = CARD_LENGTH + SELECT_OFFSET
+
+        # Where the strip and the name sit: name below the bottom hand, above
+        # the top hand, left of the left hand and right of the right hand
+        if self.rotation == 0:
+            strip_top, name_pos = 0, ((width - name_width) // 2, strip_depth + NAME_GAP)
+        elif self.rotation == 180:
+            strip_top, name_pos = name_height + NAME_GAP, ((width - name_width) // 2, 0)
+        elif self.rotation == 90:
+            strip_top, name_pos = name_width + NAME_GAP, (0, (height - name_height) // 2)
+        else:
+            strip_top, name_pos = 0, (strip_depth + NAME_GAP, (height - name_height) // 2)
+        name_rect = wx.Rect(wx.Point(*name_pos), self.name_size)
 
-    def populate_cards(self):
-        self.sizer.Clear(True)
-        temp_list = self.hand
-        if self.horizantal:
-            temp_list = reversed(temp_list)
-        for i, card in enumerate(temp_list):
-            is_last = (i == len(self.hand) - 1)
-            covered = not is_last
-            if self.face_up:
-                img = self.get_card_bitmap(card, covered)
+        cards = list(reversed(self.hand)) if self.horizantal else list(self.hand)
+        along = ((height if self.vertical else width) - strip_length) // 2
+        layout = []
+        for i, card in enumerate(cards):
+            covered = i != len(cards) - 1
+            bitmap = self.get_card_bitmap(card, covered)
+            selected = card == self.selected_card
+            # The bottom and right hands start pushed away from the centre and
+            # the selected card moves towards it; the others do the opposite
+            if self.rotation in (0, 270):
+                across = strip_top + (0 if selected else SELECT_OFFSET)
             else:
-                if covered:
-                    img = self.card_back_img_covered
-                else:
-                    img = self.card_back_img
-
-            bmp = img.ConvertToBitmap()
-            bmp_ctrl = wx.StaticBitmap(self, bitmap=bmp)
-            self.card_controls[card] = bmp_ctrl
-            bmp_ctrl.Bind(wx.EVT_LEFT_DOWN, self.on_card_click)
-
-
-            if self.vertical and not self.horizantal:
-                border = 10 if card == self.selected_card else 0
-                self.sizer.Add(bmp_ctrl, 0, wx.LEFT, border)
-            elif not self.vertical and self.horizantal:
-                border = 10 if card == self.selected_card else 0
-                self.sizer.Add(bmp_ctrl, 0, wx.TOP, border)
-            elif self.vertical and self.horizantal:
-                border = 0 if card == self.selected_card else 10
-                self.sizer.Add(bmp_ctrl, 0, wx.LEFT, border)
+                across = strip_top + (SELECT_OFFSET if selected else 0)
+            if self.vertical:
+                rect = wx.Rect(across, along, bitmap.GetWidth(), bitmap.GetHeight())
+                along += rect.height
             else:
-                border = 0 if card == self.selected_card else 10
-                self.sizer.Add(bmp_ctrl, 0, wx.TOP, border)
-        self.Fit()
-        self.Layout()
-
-    def on_card_click(self, event):
-
+                rect = wx.Rect(along, across, bitmap.GetWidth(), bitmap.GetHeight())
+                along += rect.width
+            layout.append((card, bitmap, rect))
+        return layout, name_rect
 
-        clicked_ctrl = event.GetEventObject()
-        clicked_card = next((c for c, ctrl in self.card_controls.items() if ctrl == clicked_ctrl), None)
+    def populate_cards(self):
+        # Repaints only the slots whose card, bitmap or position changed
+        layout, name_rect = self.compute_layout()
+        old_layout = self.card_layout
+        for i in range(max(len(layout), len(old_layout))):
+            old = old_layout[i] if i < len(old_layout) else None
+            new = layout[i] if i < len(layout) else None
+            if old is not None and new is not None and old[1] is new[1] and old[2] == new[2]:
+                continue
+            for entry in (old, new):
+                if entry is not None:
+                    self.RefreshRect(self.slot_rect(entry[2]))
+        if name_rect != self.name_rect or self.name != self.drawn_name:
+            self.RefreshRect(self.name_rect)
+            self.RefreshRect(name_rect)
+        self.card_layout = layout
+        self.name_rect = name_rect
+        self.drawn_name = self.name
+
+    def slot_rect(self, rect):
+        # A card's rectangle widened to cover both its raised and lowered place
+        if self.vertical:
+            return wx.Rect(rect.x - SELECT_OFFSET, rect.y, rect.width + 2 * SELECT_OFFSET, rect.height)
+        return wx.Rect(rect.x, rect.y - SELECT_OFFSET, rect.width, rect.height + 2 * SELECT_OFFSET)
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        region = self.GetUpdateRegion()
+        for card, bitmap, rect in self.card_layout:
+            if region.Contains(rect) != wx.OutRegion:
+                dc.DrawBitmap(bitmap, rect.x, rect.y, True)
+        if region.Contains(self.name_rect) != wx.OutRegion:
+            dc.SetFont(self.GetFont())
+            dc.SetTextForeground(self.GetForegroundColour())
+            dc.DrawText(self.name, self.name_rect.x, self.name_rect.y)
+
+    def card_at(self, point):
+        # Topmost card under the point, if any
+        for card, bitmap, rect in reversed(self.card_layout):
+            if rect.Contains(point):
+                return card
+        return None
 
-        if self.gui:
+    def on_card_click(self, event):
+        clicked_card = self.card_at(event.GetPosition())
+        if clicked_card is not None and self.gui:
             self.gui.card_clicked(self, clicked_card)
 
 def join_bridge_game(host, port):
     app = wx.App(False)
     BridgeClientGUI(host, port)  # Replace with actual server IP
-    app.MainLoop()
\ No newline at end of file
+    app.MainLoop()
+
+def main(argv=None):
+    # The fivepmbridge-client command
+    import argparse
+    parser = argparse.ArgumentParser(description="Join a bridge game.")
+    parser.add_argument("host", nargs="?", default='127.0.0.1')
+    parser.add_argument("port", nargs="?", type=int, default=2410)
+    args = parser.parse_args(argv)
+    join_bridge_game(args.host, args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+# Append-only game logs. Every table event is appended to one log file per
+# session, and a small index file next to it records where each board and
+# each trick starts, so a reader can replay any board or jump to any trick
+# without reading the rest of the file.
+#
+# Log file (integers are big endian):
+#
+#   header   magic (8 bytes) | session start time f64
+#   record   payload length u16 | event u8 | milliseconds since start u32 | payload
+#            deal:  board u32 | dealer u8 | hand u64 * 4 (card masks by seat)
+#            bid:   seat u8 | call u8
+#            play:  seat u8 | card u8
+#            trick: winner u8
+#            name:  seat u8 | length u8 | UTF-8 bytes
+#
+# Index file: entries of board u32 | trick u8 | offset u64. Trick 0 is the
+# board's deal record, trick n the first card played to trick n.
+#
+# Records are encoded on the caller's thread and handed to a LogWriter, whose
+# background thread does all the disk writes, so the game never waits on
+# disk. After a crash the last records may be missing or cut short; the
+# reader stops at the last complete record and indexes anything the index
+# file missed.
+
+import os
+import re
+import struct
+import threading
+import time
+from fivepmbridge.bridge_game import CODE_TO_CARD, DECK, CardSet, Auction, CardPlay
+
+MAGIC = b"FPBLOG1\n"
+FILE_HEADER = struct.Struct(">8sd")
+RECORD_HEADER = struct.Struct(">HBI")
+INDEX_ENTRY = struct.Struct(">IBQ")
+DEAL = struct.Struct(">IB4Q")
+SEAT_ARG = struct.Struct(">BB")
+
+EVENTS = ("deal", "bid", "play", "trick", "name")
+EVENT_IDS = {event: i for i, event in enumerate(EVENTS)}
+
+INDEX_SUFFIX = ".idx"
+
+
+def session_path(log_dir, name):
+    # A new log file name for a session, e.g. logs/table-lobby-20240101-120000.fpblog
+    os.makedirs(log_dir, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9_-]", "_", name)
+    base = os.path.join(log_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    path, count = base + ".fpblog", 1
+    while os.path.exists(path):
+        count += 1
+        path = f"{base}-{count}.fpblog"
+    return path
+
+
+class LogWriter:
+    # One background thread that writes for any number of GameLogs, batching
+    # whatever records arrived since its last write into one write per file
+    def __init__(self, sync=False):
+        self.sync = sync
+        self.pending = []  # (log, data, index data), data None to close the log
+        self.submitted = 0
+        self.written = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def open(self, path):
+        return GameLog(path, self)
+
+    def submit(self, log, data, index_data=b""):
+        with self.condition:
+            if self.closed:
+                raise ValueError("Log writer is closed")
+            self.pending.append((log, data, index_data))
+            self.submitted += 1
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                batch, self.pending = self.pending, []
+                if not batch and self.closed:
+                    return
+            by_log = {}
+            for log, data, index_data in batch:
+                parts = by_log.setdefault(log, ([], [], [False]))
+                if data is None:
+                    parts[2][0] = True
+                else:
+                    parts[0].append(data)
+                    parts[1].append(index_data)
+            for log, (data, index_data, close) in by_log.items():
+                try:
+                    log.write(b"".join(data), b"".join(index_data), self.sync)
+                    if close[0]:
+                        log.close_files()
+                except OSError as e:
+                    print(f"[LOG ERROR] {log.path}: {e}")
+            with self.condition:
+                self.written += len(batch)
+                self.condition.notify_all()
+
+    def flush(self):
+        # Blocks until everything submitted so far is on disk
+        with self.condition:
+            target = self.submitted
+            while self.written < target:
+                self.condition.wait()
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+class GameLog:
+    # Appends one table's events. Reopening an existing log continues it.
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer
+        self.lock = threading.Lock()
+        self.data_file = open(path, "ab")
+        self.index_file = open(path + INDEX_SUFFIX, "ab")
+        self.size = self.data_file.tell()
+        if self.size == 0:
+            self.start_time = time.time()
+            header = FILE_HEADER.pack(MAGIC, self.start_time)
+            self.data_file.write(header)
+            self.data_file.flush()
+            self.size = len(header)
+        else:
+            with open(path, "rb") as f:
+                self.start_time = read_file_header(f)
+        self.board = None
+        self.tricks = 0
+        self.cards_in_trick = 0
+        self.closed = False
+
+    def append(self, event, payload):
+        milliseconds = int((time.time() - self.start_time) * 1000) & 0xFFFFFFFF
+        record = RECORD_HEADER.pack(len(payload), EVENT_IDS[event], milliseconds) + payload
+        with self.lock:
+            if self.closed:
+                return
+            index_data = b""
+            if event == "deal":
+                self.board = DEAL.unpack_from(payload)[0]
+                self.tricks = 0
+                self.cards_in_trick = 0
+                index_data = INDEX_ENTRY.pack(self.board, 0, self.size)
+            elif event == "play" and self.board is not None:
+                if self.cards_in_trick == 0:
+                    index_data = INDEX_ENTRY.pack(self.board, self.tricks + 1, self.size)
+                self.cards_in_trick += 1
+            elif event == "trick":
+                self.tricks += 1
+                self.cards_in_trick = 0
+            self.size += len(record)
+            self.writer.submit(self, record, index_data)
+
+    def deal(self, board, dealer, hands):
+        # hands are card masks (or CardSets) by seat
+        masks = [hand.mask if isinstance(hand, CardSet) else hand for hand in hands]
+        self.append("deal", DEAL.pack(board, dealer, *masks))
+
+    def bid(self, seat, call):
+        self.append("bid", SEAT_ARG.pack(seat, call))
+
+    def play(self, seat, card):
+        # card is a Card or a card code
+        if isinstance(card, str):
+            card = CODE_TO_CARD[card]
+        self.append("play", SEAT_ARG.pack(seat, card.index))
+
+    def trick(self, winner):
+        self.append("trick", bytes([winner]))
+
+    def name(self, seat, name):
+        data = name.encode()[:255]
+        self.append("name", bytes([seat, len(data)]) + data)
+
+    def write(self, data, index_data, sync=False):
+        # Called on the writer thread. The log is written before its index so
+        # the index never points past the data.
+        if data:
+            self.data_file.write(data)
+            self.data_file.flush()
+            if sync:
+                os.fsync(self.data_file.fileno())
+        if index_data:
+            self.index_file.write(index_data)
+            self.index_file.flush()
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        # Does not wait for the writer; call flush for that
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.writer.submit(self, None)
+
+    def close_files(self):
+        self.data_file.close()
+        self.index_file.close()
+
+
+class NullGameLog:
+    def deal(self, board, dealer, hands):
+        pass
+
+    def bid(self, seat, call):
+        pass
+
+    def play(self, seat, card):
+        pass
+
+    def trick(self, winner):
+        pass
+
+    def name(self, seat, name):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_LOG = NullGameLog()
+
+
+def read_file_header(f):
+    data = f.read(FILE_HEADER.size)
+    if len(data) < FILE_HEADER.size:
+        raise ValueError("Truncated log header")
+    magic, start_time = FILE_HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("Not a game log")
+    return start_time
+
+
+def decode_record(event_id, milliseconds, payload):
+    # Events are (event, milliseconds, *args):
+    #   ("deal", ms, board, dealer, [mask, mask, mask, mask])
+    #   ("bid", ms, seat, call), ("play", ms, seat, card code),
+    #   ("trick", ms, winner), ("name", ms, seat, name)
+    event = EVENTS[event_id]
+    if event == "deal":
+        board, dealer, *masks = DEAL.unpack(payload)
+        return (event, milliseconds, board, dealer, masks)
+    if event == "bid":
+        return (event, milliseconds, *SEAT_ARG.unpack(payload))
+    if event == "play":
+        seat, card = SEAT_ARG.unpack(payload)
+        return (event, milliseconds, seat, DECK[card].code)
+    if event == "trick":
+        return (event, milliseconds, payload[0])
+    seat, length = SEAT_ARG.unpack_from(payload)
+    return (event, milliseconds, seat, payload[2:2 + length].decode())
+
+
+class BoardReplay:
+    # A board rebuilt from its log records
+    def __init__(self, board, dealer, masks):
+        self.board = board
+        self.hands = [CardSet(mask) for mask in masks]
+        self.auction = Auction(dealer)
+        self.card_play = None
+        self.names = {}
+
+    def apply(self, event):
+        kind = event[0]
+        if kind == "bid":
+            _, _, seat, call = event
+            if not self.auction.make_call(seat, call):
+                raise ValueError(f"Illegal call {call} by seat {seat} in board {self.board}")
+            contract = self.auction.contract()
+            if contract is not None:
+                self.card_play = CardPlay(self.hands, contract)
+        elif kind == "play":
+            _, _, seat, card = event
+            if self.card_play is None or not self.card_play.play_card(seat, card):
+                raise ValueError(f"Illegal play {card} by seat {seat} in board {self.board}")
+        elif kind == "trick":
+            if self.card_play is None or self.card_play.take_trick() is None:
+                raise ValueError(f"Trick taken early in board {self.board}")
+        elif kind == "name":
+            _, _, seat, name = event
+            self.names[seat] = name
+
+
+class GameLogReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.start_time = read_file_header(self.file)
+        self.end = self.file.seek(0, os.SEEK_END)
+        # board -> {trick: offset}, boards in log order
+        self.index = {}
+        self.boards = []
+        self.load_index()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_entry(self, board, trick, offset):
+        if board not in self.index:
+            self.index[board] = {}
+            self.boards.append(board)
+        self.index[board].setdefault(trick, offset)
+
+    def load_index(self):
+        try:
+            with open(self.path + INDEX_SUFFIX, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        for board, trick, offset in INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]):
+            if offset >= self.end:
+                break
+            self.add_entry(board, trick, offset)
+        # Index whatever was written after the last indexed record
+        board, tricks, cards, start = None, 0, 0, FILE_HEADER.size
+        if self.boards:
+            board = self.boards[-1]
+            last_trick = max(self.index[board])
+            start = self.index[board][last_trick]
+            tricks = max(last_trick - 1, 0)
+        for offset, event in self.scan(start, self.end):
+            if event[0] == "deal":
+                board, tricks, cards = event[2], 0, 0
+                self.add_entry(board, 0, offset)
+            elif event[0] == "play" and board is not None:
+                if cards == 0:
+                    self.add_entry(board, tricks + 1, offset)
+                cards += 1
+            elif event[0] == "trick":
+                tricks, cards = tricks + 1, 0
+
+    def scan(self, start, end, chunk_size=1 << 20):
+        # Yields (offset, event) for every complete record in [start, end),
+        # reading a chunk at a time
+        data = b""
+        base = start
+        read_to = start
+        while True:
+            position = 0
+            while position + RECORD_HEADER.size <= len(data):
+                length, event_id, milliseconds = RECORD_HEADER.unpack_from(data, position)
+                payload_start = position + RECORD_HEADER.size
+                if payload_start + length > len(data):
+                    break
+                if event_id >= len(EVENTS):
+                    return
+                payload = data[payload_start:payload_start + length]
+                yield base + position, decode_record(event_id, milliseconds, payload)
+                position = payload_start + length
+            data, base = data[position:], base + position
+            if read_to >= end:
+                return
+            self.file.seek(read_to)
+            chunk = self.file.read(min(chunk_size, end - read_to))
+            if not chunk:
+                return
+            read_to += len(chunk)
+            data += chunk
+
+    def board_end(self, board):
+        position = self.boards.index(board)
+        if position + 1 < len(self.boards):
+            return self.index[self.boards[position + 1]][0]
+        return self.end
+
+    def board_events(self, board):
+        return [event for _, event in self.scan(self.index[board][0], self.board_end(board))]
+
+    def trick_events(self, board, trick):
+        # The plays and the trick record of trick n (1-13) of a board
+        tricks = self.index[board]
+        if trick not in tricks:
+            return []
+        end = tricks.get(trick + 1, self.board_end(board))
+        return [event for _, event in self.scan(tricks[trick], end)]
+
+    def replay(self, board, before_trick=None):
+        # Rebuilds a board, either to its end or to the start of a trick
+        tricks = self.index[board]
+        end = self.board_end(board)
+        if before_trick is not None and before_trick in tricks:
+            end = tricks[before_trick]
+        events = self.scan(tricks[0], end)
+        _, (_, _, number, dealer, masks) = next(events)
+        replay = BoardReplay(number, dealer, masks)
+        for _, event in events:
+            replay.apply(event)
+        return replay
+
+    def events(self):
+        for _, event in self.scan(FILE_HEADER.size, self.end):
+            yield event
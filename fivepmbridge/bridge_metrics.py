@@ -0,0 +1,248 @@
+# Server instrumentation: counters, gauges and histograms rendered in the
+# Prometheus text format, either for the !metrics admin command or over HTTP.
+#
+# Servers hold NULL_METRICS unless they are given a Metrics registry. It has
+# the same interface and does nothing, and hands locks back unwrapped, so an
+# uninstrumented server pays for at most an empty method call per event.
+
+import bisect
+import threading
+import time
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+SECONDS_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+# name: (type, help, buckets)
+SERVER_METRICS = {
+    "bridge_commands_total": (COUNTER, "Commands handled, by command.", None),
+    "bridge_command_seconds": (HISTOGRAM, "Time spent handling a command, by command.", SECONDS_BUCKETS),
+    "bridge_lock_wait_seconds": (HISTOGRAM, "Time spent waiting to acquire a server lock, by lock.", SECONDS_BUCKETS),
+    "bridge_frames_received_total": (COUNTER, "Frames read from client sockets.", None),
+    "bridge_bytes_received_total": (COUNTER, "Payload bytes read from client sockets.", None),
+    "bridge_frames_sent_total": (COUNTER, "Frames written to client sockets.", None),
+    "bridge_bytes_sent_total": (COUNTER, "Bytes written to client sockets, including length prefixes.", None),
+    "bridge_socket_write_seconds": (HISTOGRAM, "Time spent in one batched socket write.", SECONDS_BUCKETS),
+    "bridge_state_update_bytes": (HISTOGRAM, "Bytes queued by one send_updates across all seats.", BYTES_BUCKETS),
+    "bridge_connections_total": (COUNTER, "Connections accepted.", None),
+    "bridge_slow_client_drops_total": (COUNTER, "Clients disconnected because their outbound queue was full.", None),
+    "bridge_clients": (GAUGE, "Connected clients.", None),
+    "bridge_outbound_queued_frames": (GAUGE, "Frames waiting in all outbound queues.", None),
+    "bridge_outbound_queue_max_frames": (GAUGE, "Frames waiting in the fullest outbound queue.", None),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount, labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self, kind=COUNTER):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {kind}"]
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    # Either set directly or read from a callback when rendered
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.callbacks = []
+
+    def set(self, value, labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def render(self, kind=GAUGE):
+        for callback in self.callbacks:
+            for labels, value in callback():
+                self.set(value, labels)
+        return super().render(kind)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # label key: [count per bucket (last is +Inf), sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {HISTOGRAM}"]
+        with self.lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class TimedLock:
+    # Wraps a lock and records how long every acquisition waited
+    def __init__(self, lock, histogram, labels):
+        self.lock = lock
+        self.histogram = histogram
+        self.labels = labels
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        self.histogram.observe(time.perf_counter() - start, self.labels)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, definitions=SERVER_METRICS):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        for name, (kind, help_text, buckets) in definitions.items():
+            self.describe(name, kind, help_text, buckets)
+
+    def describe(self, name, kind, help_text, buckets=None):
+        with self.lock:
+            if name not in self.metrics:
+                if kind == HISTOGRAM:
+                    self.metrics[name] = Histogram(name, help_text, buckets or SECONDS_BUCKETS)
+                elif kind == GAUGE:
+                    self.metrics[name] = Gauge(name, help_text)
+                else:
+                    self.metrics[name] = Counter(name, help_text)
+            return self.metrics[name]
+
+    def inc(self, name, amount=1, **labels):
+        self.metrics[name].inc(amount, labels)
+
+    def set(self, name, value, **labels):
+        self.metrics[name].set(value, labels)
+
+    def observe(self, name, value, **labels):
+        self.metrics[name].observe(value, labels)
+
+    def gauge_callback(self, name, callback):
+        # callback returns a list of (labels dict, value), read on every render
+        self.metrics[name].callbacks.append(callback)
+
+    def record_command(self, command, seconds):
+        self.inc("bridge_commands_total", command=command)
+        self.observe("bridge_command_seconds", seconds, command=command)
+
+    def timed_lock(self, lock, name):
+        return TimedLock(lock, self.metrics["bridge_lock_wait_seconds"], {"lock": name})
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def serve_http(self, host='127.0.0.1', port=9410):
+        # Serves GET /metrics from a daemon thread and returns the HTTP server.
+        # http.server is only imported here, it is slow to load.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[METRICS] Serving http://{host}:{port}/metrics")
+        return server
+
+
+class NullMetrics:
+    enabled = False
+
+    def describe(self, name, kind, help_text, buckets=None):
+        pass
+
+    def inc(self, name, amount=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def gauge_callback(self, name, callback):
+        pass
+
+    def record_command(self, command, seconds):
+        pass
+
+    def timed_lock(self, lock, name):
+        return lock
+
+    def render(self):
+        return ""
+
+
+NULL_METRICS = NullMetrics()
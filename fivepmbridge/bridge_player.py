@@ -1,96 +1,21 @@
 import wx
-import socket
-import threading
-import ast
+from fivepmbridge.bridge_client import BridgeClientCore, UpdatePipeline
 
-class BridgeClient:
+class BridgeClient(BridgeClientCore):
+    # BridgeClientCore wired to the wx GUI. Receive-thread callbacks never
+    # touch wx themselves: state and messages go through an UpdatePipeline
+    # that wakes the GUI thread once per batch, and scolds are handed over
+    # with wx.CallAfter.
     def __init__(self, gui, host, port):
+        super().__init__(host, port)
         self.gui = gui
-        self.host = host
-        self.port = port
-        self.running = False
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.updates = UpdatePipeline(lambda: wx.CallAfter(self.gui.apply_updates))
 
-    def connect(self):
-        try:
-            self.socket.connect((self.host, self.port))
-            self.running = True
-            self.gui.append_message(f"Connected to server at {self.host}:{self.port}")
-            threading.Thread(target=self.receive_messages, daemon=True).start()
-        except Exception as e:
-            self.gui.append_message(f"Connection failed: {e}")
+    def on_message(self, text):
+        self.updates.push_message(text)
 
-    def receive_messages(self):
-        while self.running:
-            try:
-                length_bytes = self.socket.recv(4)
-                if not length_bytes:
-                    raise RuntimeError("Did not receive length_bytes")
-                length = int.from_bytes(length_bytes, byteorder='big')
-                data = b""
-                while len(data) < length:
-                    more = self.socket.recv(length - len(data))
-                    if not more:
-                        raise EOFError("Socket closed")
-                    data += more
-
-                text = data.decode()
-                if self.parse_commands(text):
-                    pass
-                else:
-                    self.gui.append_message(text)
-            except Exception as e:
-                self.gui.append_message(f"Error receiving message: {e}")
-                break
-        self.running = False
-        self.socket.close()
-        self.gui.append_message("Disconnected from server.")
-    def parse_commands(self, text):
-        if text[0] == "@":
-            self.parse_bridge_state(text[1:])
-            return True
-        elif text[0] == "^":
-            self.gui.scold(text[1:])
-            return True
-        return False
-    def parse_bridge_state(self, state_text):
-
-        my_name, hands, played_cards = state_text.split("\n")
-        hands = ast.literal_eval(hands)
-        played_cards = ast.literal_eval(played_cards)
-        # order goes south, west, north, east
-        names = list(hands.keys())
-        my_index = names.index(my_name)
-        names_ordered = []
-        hands_ordered = []
-        played_cards_ordered = []
-        for i in range(4):
-            names_ordered.append(names[(my_index+i)%4])
-            hands_ordered.append(hands[names_ordered[-1]])
-            if played_cards[names_ordered[-1]] == "None":
-                played_cards_ordered.append(None)
-            else:
-                played_cards_ordered.append(played_cards[names_ordered[-1]])
-        wx.CallAfter(self.gui.update_state, names_ordered, hands_ordered, played_cards_ordered)
-        # self.gui.update_state(names_ordered, hands_ordered, played_cards_ordered)
-
-    def play_card(self, card):
-        self.send_message("@card_"+card)
-
-    def take_trick(self):
-        self.send_message("@trick")
-
-    def disconnect(self):
-        self.running = False
-        try:
-            self.socket.shutdown(socket.SHUT_RDWR)
-        except:
-            pass
-        self.socket.close()
-        self.gui.append_message("Disconnected.")
-
-    def send_message(self, message):
-        data = message.encode()
-        length = len(data).to_bytes(4, byteorder='big')  # 4-byte length prefix
-        self.socket.sendall(length + data)
+    def on_scold(self, text):
+        wx.CallAfter(self.gui.scold, text)
 
+    def on_state(self, names, hands, played_cards):
+        self.updates.push_state(names, hands, played_cards)
@@ -0,0 +1,353 @@
+# Versioned table-state protocol shared by bridge_server and bridge_player.
+#
+# Clients opt in with "!proto <version>". Legacy clients keep receiving the
+# "@name\n{hands}\n{played}" snapshot on every change. Delta and binary
+# clients receive one full snapshot on join or "!resync", then small
+# numbered deltas.
+#
+# Text form (PROTO_DELTA):
+#
+#   #S <seq> <my_seat> <auction>\n<name>\t<hand>\t<played>   (one line per seat)
+#   #D <seq> play <seat> <card>
+#   #D <seq> trick <seat>
+#   #D <seq> dummy <seat> <card,card,...>
+#   #D <seq> name <seat> <name>
+#   #D <seq> bid <seat> <call>
+#
+# Spectators are sent snapshots only, with my_seat set to SPECTATOR (255).
+#
+# A hidden hand is sent as its card count, a visible one as comma separated
+# card codes. A played slot is a card code or "-". The auction is "-" before
+# the first deal, else "<dealer>:<call>,<call>,..." with calls written as in
+# bridge_game.CALL_TEXTS ("p", "x", "xx", "1c" ... "7n").
+#
+# Binary form (PROTO_BINARY). Integers are big endian. Every frame starts
+# with 0xFF, which can never begin a UTF-8 text frame, so both forms share
+# one connection:
+#
+#   header   magic u8 (0xFF) | version u8 | type u8 | seq u32
+#   snapshot header | my_seat u8 | seat count u8 | seat * count | auction
+#   seat     flags u8 (1 = visible) | name | hand | played u8
+#            hand is a u64 card mask when visible, else a u8 card count
+#   delta    header | event u8 | seat u8 | payload
+#            play: card u8, trick: nothing, dummy: u64 mask, name: name,
+#            bid: call u8
+#   name     length u8 | UTF-8 bytes
+#   auction  dealer u8 (0xFF before the first deal) | call count u16 | call u8 * count
+#            (an auction can run to 319 calls)
+#
+# A card byte is suit * 13 + (value - 1) with suits ordered C, D, H, S and
+# 0xFF meaning no card. The same index is a bit position in a hand mask. A
+# call byte is a bridge_game call number.
+
+import struct
+from fivepmbridge.bridge_game import DECK, CODE_TO_CARD, DISPLAY_SUITS, CALL_TEXTS, TEXT_TO_CALL, CardSet, Auction
+
+PROTO_LEGACY = 1
+PROTO_DELTA = 2
+PROTO_BINARY = 3
+SUPPORTED_PROTOCOLS = (PROTO_LEGACY, PROTO_DELTA, PROTO_BINARY)
+
+SNAPSHOT = "#S"
+DELTA = "#D"
+
+# Results of TableState.apply
+APPLIED = 0
+STALE = 1
+GAP = 2
+
+BINARY_MAGIC = 0xFF
+BINARY_VERSION = 3
+NO_CARD = 0xFF
+NO_DEALER = 0xFF
+SPECTATOR = 0xFF
+VISIBLE = 1
+
+BINARY_SNAPSHOT = 1
+BINARY_DELTA = 2
+
+EVENTS = ("play", "trick", "dummy", "name", "bid")
+EVENT_IDS = {event: i for i, event in enumerate(EVENTS)}
+
+HEADER = struct.Struct(">BBBI")
+SNAPSHOT_HEADER = struct.Struct(">BB")
+DELTA_HEADER = struct.Struct(">BB")
+MASK = struct.Struct(">Q")
+AUCTION_HEADER = struct.Struct(">BH")
+
+CARD_CODES = [card.code for card in DECK]
+CARD_INDICES = {code: card.index for code, card in CODE_TO_CARD.items()}
+
+
+def codes_to_mask(codes):
+    # codes is a list of card codes or a CardSet
+    if isinstance(codes, CardSet):
+        return codes.mask
+    mask = 0
+    for code in codes:
+        mask |= 1 << CARD_INDICES[code]
+    return mask
+
+
+def hand_codes(hand):
+    if isinstance(hand, CardSet):
+        return hand.codes()
+    return hand
+
+
+def mask_to_codes(mask):
+    # Walks the set bits of each suit from the top, in display order
+    codes = []
+    for suit in DISPLAY_SUITS:
+        base = suit * 13
+        bits = (mask >> base) & 0x1FFF
+        while bits:
+            top = bits.bit_length() - 1
+            codes.append(CARD_CODES[base + top])
+            bits ^= 1 << top
+    return codes
+
+
+def encode_auction(auction):
+    # auction is None or (dealer, calls)
+    if auction is None:
+        return "-"
+    dealer, calls = auction
+    return f"{dealer}:" + ",".join(CALL_TEXTS[call] for call in calls)
+
+
+def encode_snapshot(seq, my_seat, seats, auction=None):
+    # seats is a list of (name, hand, played) where hand is a CardSet or list
+    # of card codes or, when hidden, the number of cards held. auction is
+    # None or (dealer, calls) with calls as call numbers.
+    lines = [f"{SNAPSHOT} {seq} {my_seat} {encode_auction(auction)}"]
+    for name, hand, played in seats:
+        if isinstance(hand, int):
+            hand_text = str(hand)
+        else:
+            hand_text = ",".join(hand_codes(hand))
+        lines.append(f"{name}\t{hand_text}\t{played or '-'}")
+    return "\n".join(lines)
+
+
+def encode_delta(seq, event, seat, arg=None):
+    # arg is a card code for play, a CardSet or list of card codes for dummy,
+    # the new name for name and a call number for bid
+    if event == "dummy":
+        arg = ",".join(hand_codes(arg))
+    elif event == "bid":
+        arg = CALL_TEXTS[arg]
+    parts = [DELTA, str(seq), event, str(seat)]
+    if arg is not None:
+        parts.append(str(arg))
+    return " ".join(parts)
+
+
+def encode_name(name):
+    # At most 255 bytes, cut on a character boundary so it still decodes
+    data = name.encode()[:255].decode('utf-8', 'ignore').encode()
+    return bytes([len(data)]) + data
+
+
+def encode_binary_snapshot(seq, my_seat, seats, auction=None):
+    parts = [HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_SNAPSHOT, seq),
+             SNAPSHOT_HEADER.pack(my_seat, len(seats))]
+    for name, hand, played in seats:
+        if isinstance(hand, int):
+            parts.append(b"\x00" + encode_name(name) + bytes([hand]))
+        else:
+            parts.append(bytes([VISIBLE]) + encode_name(name) + MASK.pack(codes_to_mask(hand)))
+        parts.append(bytes([CARD_INDICES[played] if played else NO_CARD]))
+    if auction is None:
+        parts.append(AUCTION_HEADER.pack(NO_DEALER, 0))
+    else:
+        dealer, calls = auction
+        parts.append(AUCTION_HEADER.pack(dealer, len(calls)) + bytes(calls))
+    return b"".join(parts)
+
+
+def encode_binary_delta(seq, event, seat, arg=None):
+    data = HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_DELTA, seq) + DELTA_HEADER.pack(EVENT_IDS[event], seat)
+    if event == "play":
+        return data + bytes([CARD_INDICES[arg]])
+    elif event == "dummy":
+        return data + MASK.pack(codes_to_mask(arg))
+    elif event == "name":
+        return data + encode_name(arg)
+    elif event == "bid":
+        return data + bytes([arg])
+    return data
+
+
+def is_binary(data):
+    return len(data) > 0 and data[0] == BINARY_MAGIC
+
+
+def decode_hand(hand_text):
+    if hand_text.isdigit():
+        return ["b"] * int(hand_text)
+    if hand_text == "":
+        return []
+    return hand_text.split(",")
+
+
+def decode_name(data, offset):
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("Truncated name")
+    return data[offset + 1:end].decode(), end
+
+
+def decode_auction(auction_text):
+    if auction_text == "-":
+        return None
+    dealer, calls_text = auction_text.split(":")
+    calls = bytes(TEXT_TO_CALL[text] for text in calls_text.split(",")) if calls_text else b""
+    return (int(dealer), calls)
+
+
+# Decoded messages are ("snapshot", seq, my_seat, seats, auction) with seats
+# as a list of (name, hand, played) and auction None or (dealer, calls), or
+# ("delta", seq, event, seat, arg).
+
+def decode_message(message):
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return decode_binary(bytes(message))
+    return decode_text(message)
+
+
+def decode_text(text):
+    if text.startswith(SNAPSHOT):
+        header, *lines = text.split("\n")
+        _, seq, my_seat, auction_text = header.split(" ")
+        seats = []
+        for line in lines:
+            name, hand_text, played = line.split("\t")
+            seats.append((name, decode_hand(hand_text), None if played == "-" else played))
+        return ("snapshot", int(seq), int(my_seat), seats, decode_auction(auction_text))
+    _, seq, event, seat, *args = text.split(" ", 4)
+    arg = args[0] if args else None
+    if event == "dummy":
+        arg = decode_hand(arg or "")
+    elif event == "bid":
+        try:
+            arg = TEXT_TO_CALL[arg]
+        except KeyError:
+            raise ValueError(f"Not a call: {arg!r}")
+    return ("delta", int(seq), event, int(seat), arg)
+
+
+def decode_binary(data):
+    try:
+        magic, version, message_type, seq = HEADER.unpack_from(data, 0)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary version {version}")
+        offset = HEADER.size
+        if message_type == BINARY_SNAPSHOT:
+            my_seat, count = SNAPSHOT_HEADER.unpack_from(data, offset)
+            offset += SNAPSHOT_HEADER.size
+            seats = []
+            for _ in range(count):
+                flags = data[offset]
+                name, offset = decode_name(data, offset + 1)
+                if flags & VISIBLE:
+                    hand = mask_to_codes(MASK.unpack_from(data, offset)[0])
+                    offset += MASK.size
+                else:
+                    hand = ["b"] * data[offset]
+                    offset += 1
+                played = data[offset]
+                offset += 1
+                seats.append((name, hand, None if played == NO_CARD else CARD_CODES[played]))
+            dealer, call_count = AUCTION_HEADER.unpack_from(data, offset)
+            offset += AUCTION_HEADER.size
+            calls = data[offset:offset + call_count]
+            if len(calls) != call_count:
+                raise ValueError("Truncated auction")
+            auction = None if dealer == NO_DEALER else (dealer, calls)
+            return ("snapshot", seq, my_seat, seats, auction)
+        elif message_type == BINARY_DELTA:
+            event_id, seat = DELTA_HEADER.unpack_from(data, offset)
+            offset += DELTA_HEADER.size
+            event = EVENTS[event_id]
+            arg = None
+            if event == "play":
+                arg = CARD_CODES[data[offset]]
+            elif event == "dummy":
+                arg = mask_to_codes(MASK.unpack_from(data, offset)[0])
+            elif event == "name":
+                arg, offset = decode_name(data, offset)
+            elif event == "bid":
+                arg = data[offset]
+            return ("delta", seq, event, seat, arg)
+        raise ValueError(f"Unknown binary message type {message_type}")
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Malformed binary message: {e}")
+
+
+class TableState:
+    # Client-side copy of the table, kept current by applying snapshots and
+    # deltas in sequence order. Seats are in server order.
+    def __init__(self):
+        self.seq = None
+        self.my_seat = None
+        self.names = []
+        self.hands = []
+        self.played_cards = []
+        self.auction = None
+
+    def apply(self, message):
+        # message is a text or binary frame. Raises ValueError when malformed.
+        return self.apply_decoded(decode_message(message))
+
+    def apply_decoded(self, decoded):
+        if decoded[0] == "snapshot":
+            return self.apply_snapshot(*decoded[1:])
+        _, seq, event, seat, arg = decoded
+        if self.seq is None or seq > self.seq + 1:
+            return GAP
+        if seq <= self.seq:
+            return STALE
+        self.apply_delta(event, seat, arg)
+        self.seq = seq
+        return APPLIED
+
+    def apply_snapshot(self, seq, my_seat, seats, auction=None):
+        if self.seq is not None and seq < self.seq:
+            return STALE
+        self.seq = seq
+        self.my_seat = my_seat
+        self.names = [name for name, _, _ in seats]
+        self.hands = [hand for _, hand, _ in seats]
+        self.played_cards = [played for _, _, played in seats]
+        self.auction = None if auction is None else Auction.from_calls(*auction)
+        return APPLIED
+
+    def apply_delta(self, event, seat, arg):
+        if event == "play":
+            hand = self.hands[seat]
+            if arg in hand:
+                hand.remove(arg)
+            elif "b" in hand:
+                hand.remove("b")
+            self.played_cards[seat] = arg
+        elif event == "trick":
+            self.played_cards = [None] * len(self.played_cards)
+        elif event == "dummy":
+            self.hands[seat] = arg
+        elif event == "name":
+            self.names[seat] = arg
+        elif event == "bid":
+            if self.auction is None or not self.auction.make_call(seat, arg):
+                raise ValueError(f"Unexpected call {arg!r} from seat {seat}")
+
+    def ordered(self):
+        # Rotates the seats so this client comes first: south, west, north,
+        # east. Spectators see the seats in server order.
+        count = len(self.names)
+        first = 0 if self.my_seat == SPECTATOR else self.my_seat
+        order = [(first + i) % count for i in range(count)]
+        return ([self.names[i] for i in order],
+                [list(self.hands[i]) for i in order],
+                [self.played_cards[i] for i in order])
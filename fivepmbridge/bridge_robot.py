@@ -0,0 +1,390 @@
+# Computer players for empty seats.
+#
+# A table asks a seat's RobotPlayer for a call or a card whenever it is that
+# seat's turn, giving it a SeatView: the seat's own hand, dummy once the
+# auction is over, the auction and the cards played, never the other hidden
+# hands. Players are asked on a RobotPool thread, never on a thread that
+# serves connections.
+#
+# MonteCarloPlayer deals the unseen cards at random, keeping to every hand's
+# size and to the suits players have shown out of, and scores each legal card
+# on every layout in the pool's worker processes: double dummy once the hands
+# are small enough to solve quickly, greedy playouts before that. Workers stop
+# dealing layouts at the move's deadline and whatever has been scored by then
+# picks the card, so a move never takes much longer than move_time; with
+# nothing scored the simple player's card is played. One pool serves every
+# table on the host, and its workers run at a lower priority so that the
+# server's own threads keep their CPU however many robots are thinking.
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from fivepmbridge.bridge_game import (DECK, FULL_DECK, SUIT_MASKS, SUIT_INDEX, STRAINS, STRAIN_INDEX,
+                                      PASS, FIRST_BID, CALL_COUNT, Auction, CardSet, Suit, Trick)
+from fivepmbridge.bridge_solver import STRENGTH, NO_TRUMP_INDEX, DoubleDummySolver
+
+# Positions with at most this many cards in every hand are solved exactly
+SOLVE_CARDS = 5
+# Layouts dealt per move, and per job sent to a worker
+SAMPLES = 32
+SAMPLES_PER_JOB = 4
+# Workers stop at this share of the move's time, leaving the rest for their
+# results to come back
+WORKER_SHARE = 0.8
+# Added to the workers' nice value
+WORKER_NICENESS = 10
+# Attempts at dealing one layout before giving up on it
+DEAL_ATTEMPTS = 20
+
+
+def trump_index(trump):
+    return NO_TRUMP_INDEX if trump == Suit.NO_TRUMP else SUIT_INDEX[trump]
+
+
+def shown_voids(plays, contract):
+    # Suits each seat has failed to follow, as a 4-bit mask per seat
+    voids = [0, 0, 0, 0]
+    leader = (contract.declarer + 1) % 4
+    trick = Trick(contract.trump)
+    for index in plays:
+        card = DECK[index]
+        seat = (leader + len(trick.cards)) % 4
+        if trick.cards and card.suit != trick.lead_suit:
+            voids[seat] |= 1 << SUIT_INDEX[trick.lead_suit]
+        trick.play_card(card, seat)
+        if trick.is_complete():
+            leader = trick.score_trick()
+            trick = Trick(contract.trump)
+    return voids
+
+
+def candidate_cards(legal, played):
+    # The lowest card of every run of legal cards with no card still in play
+    # between them; the others in a run would do exactly the same
+    candidates = []
+    for suit in range(4):
+        base = suit * 13
+        mine = legal >> base & 0x1FFF
+        if not mine:
+            continue
+        alive = ~(played >> base) & 0x1FFF
+        run = None
+        for rank in range(12, -1, -1):
+            if not alive >> rank & 1:
+                continue
+            if mine >> rank & 1:
+                run = base + rank
+            elif run is not None:
+                candidates.append(run)
+                run = None
+        if run is not None:
+            candidates.append(run)
+    return candidates
+
+
+def legal_mask(hand, trick):
+    if trick:
+        following = hand & SUIT_MASKS[trick[0][1] // 13]
+        if following:
+            return following
+    return hand
+
+
+def greedy_card(hand, seat, trick, strength, outstanding):
+    # A quick card for seat: cash a winner or lead from the longest suit;
+    # otherwise win as cheaply as possible unless partner is already winning,
+    # and play the lowest card when not winning
+    if not trick:
+        longest = None
+        for suit in range(4):
+            mine = hand & SUIT_MASKS[suit]
+            if not mine:
+                continue
+            top = (outstanding & SUIT_MASKS[suit]).bit_length() - 1
+            if mine >> top & 1:
+                return top
+            if longest is None or mine.bit_count() > (hand & SUIT_MASKS[longest]).bit_count():
+                longest = suit
+        mine = hand & SUIT_MASKS[longest]
+        return (mine & -mine).bit_length() - 1
+    ranks = strength[trick[0][1] // 13]
+    winner, best = trick[0][0], ranks[trick[0][1]]
+    for played_seat, index in trick[1:]:
+        if ranks[index] > best:
+            winner, best = played_seat, ranks[index]
+    legal = legal_mask(hand, trick)
+    cards = [index for index in range(52) if legal >> index & 1]
+    if winner % 2 != seat % 2:
+        winning = [index for index in cards if ranks[index] > best]
+        if winning:
+            return min(winning, key=ranks.__getitem__)
+    return min(cards, key=ranks.__getitem__)
+
+
+def play_out(hands, trump, leader, trick):
+    # Plays the rest of the board greedily for every seat and returns the
+    # tricks seats 0 and 2 take, counting the trick in progress
+    hands = list(hands)
+    trick = list(trick)
+    strength = STRENGTH[trump]
+    tricks = 0
+    seat = (trick[-1][0] + 1) % 4 if trick else leader
+    while True:
+        if len(trick) == 4:
+            ranks = strength[trick[0][1] // 13]
+            seat = max(trick, key=lambda played: ranks[played[1]])[0]
+            tricks += 1 if seat % 2 == 0 else 0
+            trick = []
+            if not hands[seat]:
+                return tricks
+        outstanding = hands[0] | hands[1] | hands[2] | hands[3]
+        index = greedy_card(hands[seat], seat, trick, strength, outstanding)
+        hands[seat] ^= 1 << index
+        trick.append((seat, index))
+        seat = (seat + 1) % 4
+
+
+def deal_layout(rng, known, unknown, sizes, voids):
+    # Deals the unknown cards to the seats not in known, each getting its
+    # number of cards and nothing in a suit it has shown out of. Cards
+    # fewest seats can hold go first. None if every attempt got stuck.
+    hidden = [seat for seat in range(4) if seat not in known]
+    eligible = [[seat for seat in hidden if not voids[seat] >> suit & 1] for suit in range(4)]
+    cards = [index for index in range(52) if unknown >> index & 1]
+    for _ in range(DEAL_ATTEMPTS):
+        rng.shuffle(cards)
+        cards.sort(key=lambda index: len(eligible[index // 13]))
+        room = list(sizes)
+        hands = [known.get(seat, 0) for seat in range(4)]
+        for index in cards:
+            seats = [seat for seat in eligible[index // 13] if room[seat]]
+            if not seats:
+                break
+            seat = rng.choices(seats, weights=[room[seat] for seat in seats])[0]
+            hands[seat] |= 1 << index
+            room[seat] -= 1
+        else:
+            return hands
+    return None
+
+
+def score_layouts(problem, seed, count, deadline):
+    # A worker's job: deals up to count layouts, stopping at deadline (a
+    # time.time()), and scores every candidate on each for the side to play.
+    # Returns (tricks per candidate summed over the layouts, layouts scored).
+    known, unknown, sizes, voids, trump, leader, trick, seat, candidates, solve_cards = problem
+    rng = random.Random(seed)
+    totals = [0] * len(candidates)
+    scored = 0
+    solver = None
+    remaining = sizes[seat]
+    for _ in range(count):
+        if time.time() >= deadline:
+            break
+        hands = deal_layout(rng, known, unknown, sizes, voids)
+        if hands is None:
+            continue
+        exact = max(hand.bit_count() for hand in hands) <= solve_cards
+        if exact and solver is None:
+            solver = DoubleDummySolver(hands, trump)
+        for i, index in enumerate(candidates):
+            hands[seat] ^= 1 << index
+            played = trick + [(seat, index)]
+            if exact:
+                side = solver.solve_position(hands, leader, played)
+            else:
+                side = play_out(hands, trump_index(trump), leader, played)
+            totals[i] += side if seat % 2 == 0 else remaining - side
+            hands[seat] ^= 1 << index
+        scored += 1
+    return totals, scored
+
+
+def lower_priority():
+    # Worker process initializer
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError:
+            pass
+
+
+def warm_up():
+    return os.getpid()
+
+
+class SeatView:
+    # What the player of seat can see when it is seat's turn, from a
+    # bridge_game BoardState and the players by seat. seat is dummy when
+    # declarer plays from it, player_seat is the robot's own seat.
+    def __init__(self, state, players, seat, player_seat):
+        self.seat = seat
+        self.player_seat = player_seat
+        self.auction = Auction.from_calls(state.dealer, state.calls)
+        masks = [state.hands.get(player, 0) for player in players]
+        self.hand = CardSet(masks[seat])
+        self.sizes = [mask.bit_count() for mask in masks]
+        self.played = FULL_DECK & ~(masks[0] | masks[1] | masks[2] | masks[3])
+        self.contract = state.contract
+        self.known = {player_seat: masks[player_seat]}
+        if self.contract is None:
+            self.leader, self.trick, self.voids = None, [], [0, 0, 0, 0]
+            return
+        self.known[seat] = masks[seat]
+        self.known[self.contract.dummy] = masks[self.contract.dummy]
+        self.leader = state.leader
+        self.trick = list(state.trick)
+        self.voids = shown_voids(state.plays, self.contract)
+
+    @property
+    def bidding(self):
+        return self.contract is None
+
+    def candidates(self):
+        return candidate_cards(legal_mask(self.hand.mask, self.trick), self.played)
+
+    def problem(self, candidates, solve_cards=SOLVE_CARDS):
+        # Everything a worker needs, as plain values
+        unknown = FULL_DECK & ~self.played
+        for mask in self.known.values():
+            unknown &= ~mask
+        return (dict(self.known), unknown, list(self.sizes), list(self.voids), self.contract.trump, self.leader,
+                list(self.trick), self.seat, candidates, solve_cards)
+
+
+class RobotPlayer:
+    # The interface robot seats play through. choose_call returns a call as
+    # in bridge_game (PASS, DOUBLE, REDOUBLE or a bid) and choose_card a Card
+    # from view.hand; both may take up to the table's move time.
+    name = "Robot"
+
+    def choose_call(self, view):
+        raise NotImplementedError
+
+    def choose_card(self, view):
+        raise NotImplementedError
+
+    def decide(self, view):
+        if view.bidding:
+            return self.choose_call(view)
+        return self.choose_card(view)
+
+
+class SimplePlayer(RobotPlayer):
+    # Bids its longest suit with opening values and plays greedy_card
+    def choose_call(self, view):
+        auction = view.auction
+        hcp = view.hand.hcp()
+        if hcp < 12 or (auction.last_bid is not None and hcp < 15):
+            return PASS
+        if auction.last_bidder is not None and auction.last_bidder % 2 == auction.turn % 2:
+            # Partner has bid, leave it there
+            return PASS
+        strain = max(STRAINS[:4], key=view.hand.suit_length)
+        call = FIRST_BID + STRAIN_INDEX[strain]
+        while auction.last_bid is not None and call <= auction.last_bid:
+            call += 5
+        if call >= FIRST_BID + 15 or call >= CALL_COUNT or not auction.is_legal(call):
+            return PASS
+        return call
+
+    def choose_card(self, view):
+        strength = STRENGTH[trump_index(view.contract.trump)]
+        index = greedy_card(view.hand.mask, view.seat, view.trick, strength, FULL_DECK & ~view.played)
+        return DECK[index]
+
+
+class MonteCarloPlayer(SimplePlayer):
+    # Bids like SimplePlayer and plays the card that takes the most tricks
+    # on average over random layouts of the unseen cards
+    def __init__(self, pool, move_time=1.0, samples=SAMPLES, solve_cards=SOLVE_CARDS, seed=None):
+        self.pool = pool
+        self.move_time = move_time
+        self.samples = samples
+        self.solve_cards = solve_cards
+        self.rng = random.Random(seed)
+
+    def choose_card(self, view):
+        candidates = view.candidates()
+        if len(candidates) == 1:
+            return DECK[candidates[0]]
+        start = time.time()
+        problem = view.problem(candidates, self.solve_cards)
+        deadline = start + self.move_time * WORKER_SHARE
+        seed = self.rng.getrandbits(32)
+        workers = self.pool.process_pool()
+        futures = [workers.submit(score_layouts, problem, seed + first, SAMPLES_PER_JOB, deadline)
+                   for first in range(0, self.samples, SAMPLES_PER_JOB)]
+        done, pending = wait(futures, timeout=max(0.0, start + self.move_time - time.time()))
+        for future in pending:
+            # Jobs still queued behind other tables' are dropped
+            future.cancel()
+        totals = [0] * len(candidates)
+        scored = 0
+        for future in done:
+            if future.exception() is not None:
+                print(f"[ROBOT] Scoring failed: {future.exception()!r}")
+                continue
+            job_totals, job_scored = future.result()
+            totals = [total + job_total for total, job_total in zip(totals, job_totals)]
+            scored += job_scored
+        if not scored:
+            return super().choose_card(view)
+        best = max(range(len(candidates)), key=totals.__getitem__)
+        return DECK[candidates[best]]
+
+
+FALLBACK_PLAYER = SimplePlayer()
+
+
+def decide(player, view):
+    # Runs on a robot thread. A player that fails is covered for by
+    # SimplePlayer, so the table isn't left waiting.
+    try:
+        return player.decide(view)
+    except Exception as e:
+        print(f"[ROBOT] {type(player).__name__} failed: {e!r}")
+        return FALLBACK_PLAYER.decide(view)
+
+
+class RobotPool:
+    # Threads that wait for robots' moves and worker processes that score
+    # layouts, shared by every robot on the host. Workers are started when
+    # first needed, in fresh interpreters rather than forked from a server
+    # full of threads.
+    def __init__(self, workers=None, threads=32):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.threads = ThreadPoolExecutor(threads, thread_name_prefix="robot")
+        self.processes = None
+        self.lock = threading.Lock()
+
+    def process_pool(self):
+        with self.lock:
+            if self.processes is None:
+                # Only hosts with robots pay for importing multiprocessing
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                self.processes = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"),
+                                                     initializer=lower_priority)
+            return self.processes
+
+    def warm_up(self):
+        # Starts the workers before the first move needs them
+        workers = self.process_pool()
+        for _ in range(self.workers):
+            workers.submit(warm_up)
+
+    def submit(self, player, view, done):
+        # Calls done(move) from a robot thread once player has decided
+        future = self.threads.submit(decide, player, view)
+        future.add_done_callback(lambda future: None if future.cancelled() else done(future.result()))
+        return future
+
+    def shutdown(self):
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            if self.processes is not None:
+                self.processes.shutdown(wait=False, cancel_futures=True)
+                self.processes = None
@@ -0,0 +1,206 @@
+# Contract bridge scoring: duplicate and rubber scores, IMPs and matchpoints.
+#
+# Every contract result is looked up in tables built on first use and
+# indexed by [level, strain, doubled, vulnerable, tricks]:
+#
+#   level       0-7, 0 meaning passed out (always scores 0)
+#   strain      0-4 in bridge_game.STRAINS order: C, D, H, S, NT
+#   doubled     bridge_game PASS, DOUBLE or REDOUBLE (0, 1, 2)
+#   vulnerable  0 or 1, for the declaring side
+#   tricks      0-13, tricks won by the declaring side
+#
+# Scores are from the declaring side's point of view, negative when the
+# contract goes down, so a session of boards is scored with one fancy-indexed
+# lookup, e.g.
+#
+#   scores = DUPLICATE_SCORES[levels, strains, doubled, vulnerable, tricks]
+#
+# numpy is only imported for the tables and the array functions, so scoring
+# a single board, as the server does, needs nothing beyond the standard
+# library.
+
+from fivepmbridge.bridge_game import STRAIN_INDEX, PASS, DOUBLE, Suit, SUIT_INDEX
+
+TABLE_SHAPE = (8, 5, 3, 2, 14)
+NO_TRUMP = 4
+
+# Minimum point difference for each IMP, 1 to 24
+IMP_THRESHOLDS = (20, 50, 90, 130, 170, 220, 270, 320, 370, 430, 500, 600, 750, 900, 1100, 1300,
+                  1500, 1750, 2000, 2250, 2500, 3000, 3500, 4000)
+
+# Vulnerability of (seats 0 and 2, seats 1 and 3) for boards 1-16, repeating
+VULNERABILITY = [(False, False), (True, False), (False, True), (True, True),
+                 (True, False), (False, True), (True, True), (False, False),
+                 (False, True), (True, True), (False, False), (True, False),
+                 (True, True), (False, False), (True, False), (False, True)]
+
+
+def trick_score(level, strain, doubled):
+    # Score for the contracted tricks, below the line in rubber bridge
+    per_trick = 20 if strain < 2 else 30
+    score = per_trick * level + (10 if strain == NO_TRUMP else 0)
+    return score << doubled
+
+
+def overtrick_value(strain, doubled, vulnerable):
+    if doubled == PASS:
+        return 20 if strain < 2 else 30
+    return (200 if vulnerable else 100) << (doubled - DOUBLE)
+
+
+def undertrick_penalty(down, doubled, vulnerable):
+    if doubled == PASS:
+        return down * (100 if vulnerable else 50)
+    if vulnerable:
+        penalty = 200 + 300 * (down - 1)
+    else:
+        # 100, then 200 each for the second and third, then 300 each
+        penalty = 100 + 200 * min(down - 1, 2) + 300 * max(down - 3, 0)
+    return penalty << (doubled - DOUBLE)
+
+
+def slam_bonus(level, vulnerable):
+    if level == 7:
+        return 1500 if vulnerable else 1000
+    if level == 6:
+        return 750 if vulnerable else 500
+    return 0
+
+
+def rubber_result(level, strain, doubled, vulnerable, tricks):
+    # (above, below) for the declaring side, above negative when the
+    # defenders score the undertricks
+    if level == 0:
+        return 0, 0
+    needed = level + 6
+    if tricks < needed:
+        return -undertrick_penalty(needed - tricks, doubled, vulnerable), 0
+    above = (tricks - needed) * overtrick_value(strain, doubled, vulnerable)
+    above += slam_bonus(level, vulnerable)
+    if doubled != PASS:
+        # The insult
+        above += 50 << (doubled - DOUBLE)
+    return above, trick_score(level, strain, doubled)
+
+
+def duplicate_result(level, strain, doubled, vulnerable, tricks):
+    above, below = rubber_result(level, strain, doubled, vulnerable, tricks)
+    if below >= 100:
+        above += 500 if vulnerable else 300
+    elif below:
+        above += 50
+    return above + below
+
+
+def build_tables():
+    import numpy as np
+    duplicate = np.zeros(TABLE_SHAPE, dtype=np.int32)
+    above = np.zeros(TABLE_SHAPE, dtype=np.int32)
+    below = np.zeros(TABLE_SHAPE, dtype=np.int32)
+    for index in np.ndindex(*TABLE_SHAPE):
+        duplicate[index] = duplicate_result(*index)
+        above[index], below[index] = rubber_result(*index)
+    for table in (duplicate, above, below):
+        table.flags.writeable = False
+    return duplicate, above, below
+
+
+TABLE_NAMES = ("DUPLICATE_SCORES", "RUBBER_ABOVE", "RUBBER_BELOW")
+_tables = None
+
+
+def scoring_tables():
+    # (DUPLICATE_SCORES, RUBBER_ABOVE, RUBBER_BELOW)
+    global _tables
+    if _tables is None:
+        _tables = build_tables()
+    return _tables
+
+
+def __getattr__(name):
+    # The tables are module attributes, built when first looked up
+    if name in TABLE_NAMES:
+        return scoring_tables()[TABLE_NAMES.index(name)]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def contract_index(contract, tricks, vulnerable):
+    # contract is a bridge_game Contract, or None for a passed out board
+    if contract is None:
+        return (0, 0, 0, 0, 0)
+    return (contract.level, STRAIN_INDEX[contract.strain], contract.doubled, int(vulnerable), tricks)
+
+
+def score_contract(contract, tricks, vulnerable):
+    # Duplicate score for the declaring side; one board is quicker to work
+    # out than to look up
+    return duplicate_result(*contract_index(contract, tricks, vulnerable))
+
+
+def score_boards(levels, strains, doubled, vulnerable, tricks):
+    # Duplicate scores for many boards at once; takes arrays indexed as the
+    # tables are and returns an int32 array
+    import numpy as np
+    return scoring_tables()[0][np.asarray(levels), np.asarray(strains), np.asarray(doubled),
+                            np.asarray(vulnerable, dtype=np.intp), np.asarray(tricks)]
+
+
+def board_vulnerability(board):
+    # board numbers start at 1
+    return VULNERABILITY[(board - 1) % 16]
+
+
+def honors_bonus(hand, strain):
+    # Rubber bridge honors for one hand, a CardSet: 150 for all four aces at
+    # no trump or all five trump honors, 100 for four of the five
+    if strain == Suit.NO_TRUMP:
+        aces = sum(1 for suit in range(4) if hand.mask >> (suit * 13 + 12) & 1)
+        return 150 if aces == 4 else 0
+    honors = (hand.mask >> (SUIT_INDEX[strain] * 13 + 8) & 0x1F).bit_count()
+    return {5: 150, 4: 100}.get(honors, 0)
+
+
+def score_rubber_deal(rubber, side, contract, tricks, honors=None):
+    # Records one deal in a bridge_game Rubber. side is the declaring side,
+    # 0 or 1; honors is None or (side, bonus).
+    if contract is not None:
+        vulnerable = rubber.partnerships[side].vulnerable
+        above, below = rubber_result(*contract_index(contract, tricks, vulnerable))
+        rubber.record_deal(side, above, below)
+    if honors is not None and honors[1]:
+        rubber.partnerships[honors[0]].award(honors[1], 0)
+
+
+def imps(difference):
+    # Converts point differences, a number or an array, to signed IMPs
+    import numpy as np
+    difference = np.asarray(difference)
+    result = np.searchsorted(IMP_THRESHOLDS, np.abs(difference), side='right') * np.sign(difference)
+    return int(result) if result.ndim == 0 else result
+
+
+def cross_imps(scores):
+    # scores is (boards, tables) from one direction's point of view. Each
+    # table is compared with every other table on the board and its IMPs
+    # averaged, giving a (boards, tables) float array.
+    import numpy as np
+    scores = np.asarray(scores)
+    tables = scores.shape[-1]
+    if tables < 2:
+        return np.zeros(scores.shape)
+    differences = scores[..., :, None] - scores[..., None, :]
+    return imps(differences).sum(axis=-1) / (tables - 1)
+
+
+def matchpoints(scores):
+    # scores is (boards, tables). Every table gets 2 points for each table it
+    # beat and 1 for each tie on the same board, returned with the
+    # percentage of the top available.
+    import numpy as np
+    scores = np.asarray(scores)
+    tables = scores.shape[-1]
+    left, right = scores[..., :, None], scores[..., None, :]
+    points = 2 * (left > right).sum(axis=-1) + (left == right).sum(axis=-1) - 1
+    top = 2 * (tables - 1)
+    percentages = points / top * 100 if top else np.full(points.shape, 50.0)
+    return points, percentages
@@ -1,41 +1,430 @@
+import asyncio
+import os
+import secrets
 import socket
 import threading
-from fivepmbridge.bridge_game import ContractBridge, Card, Suit
-from collections import defaultdict
+import time
+from fivepmbridge.bridge_game import ContractBridge, Card, CardSet, Suit, TEXT_TO_CALL, CALL_TEXTS
+from fivepmbridge.bridge_scoring import score_contract, board_vulnerability
+from fivepmbridge.bridge_log import NULL_LOG, LogWriter, session_path
+from fivepmbridge.bridge_snapshot import (SnapshotWriter, load_snapshot, list_snapshots, snapshot_path,
+                                          table_snapshot_name)
+from fivepmbridge.bridge_metrics import NULL_METRICS, Metrics
+from fivepmbridge.bridge_robot import RobotPool, MonteCarloPlayer, SeatView
+from fivepmbridge.bridge_framing import FrameReader, FrameTooLarge, encode_frame, send_frames, check_frame_length
+from fivepmbridge.bridge_protocol import (PROTO_LEGACY, PROTO_DELTA, PROTO_BINARY, SUPPORTED_PROTOCOLS, SPECTATOR,
+                                          encode_snapshot, encode_delta, encode_binary_snapshot, encode_binary_delta)
+from collections import defaultdict, deque
 SERVER = 0
 
+# Outbound frame kinds. A newer STATE frame supersedes a queued one, and
+# any STATE frame supersedes the DELTA frames before it.
+MESSAGE = 0
+STATE = 1
+DELTA = 2
+
+# What to do when a client's outbound queue is full
+COALESCE = "coalesce"
+DROP = "drop"
+
+# How long a dropped player's seat is held for them, in seconds
+SEAT_TIMEOUT = 120.0
+# Deltas kept so a returning player is sent only what they missed
+RESUME_HISTORY = 512
+
+# Longest a robot thinks about a card, in seconds
+ROBOT_MOVE_TIME = 1.0
+# How long a robot leaves a trick it won on the table before taking it
+ROBOT_PAUSE = 1.0
+
+
+# Commands reported under their own name in metrics; anything else starting
+# with "!" is counted as "!other" so label values stay bounded
+KNOWN_COMMANDS = ("!shutdown", "!deal", "!scold", "!metrics", "!proto", "!resync", "!resume", "!watch",
+                  "!sit", "!name", "!me", "!tables", "!create", "!join", "!leave")
+
+
+def command_label(text):
+    if text.startswith("!"):
+        command = text.split(" ", 1)[0]
+        return command if command in KNOWN_COMMANDS else "!other"
+    if text.startswith("@card"):
+        return "@card"
+    if text == "@trick":
+        return text
+    if text.startswith("@"):
+        return "@bid"
+    return "chat"
+
+
+class OutboundQueue:
+    # Bounded queue of encoded frames for one connection, drained by a writer
+    # thread so a slow socket never blocks the table. A queued state frame is
+    # always replaced by a newer one. When the queue is full the COALESCE
+    # policy discards the queued deltas and sets resync, so the table sends a
+    # snapshot in their place. Chat is never discarded: a client whose queue
+    # is full of it is disconnected, as DROP does as soon as the queue fills.
+    def __init__(self, max_frames=256, policy=COALESCE):
+        if max_frames < 2:
+            # Room for a snapshot and one more frame
+            raise ValueError("An outbound queue needs room for at least 2 frames")
+        self.max_frames = max_frames
+        self.policy = policy
+        self.frames = deque()
+        self.pending_state = None
+        self.resync = False
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, data, kind=MESSAGE):
+        with self.condition:
+            if self.closed:
+                return False
+            if kind == STATE and self.pending_state is not None:
+                self.pending_state[1] = data
+                return True
+            if len(self.frames) >= self.max_frames:
+                if self.policy == DROP:
+                    self.discard()
+                    return False
+                dropped = self.drop_deltas()
+                if kind == DELTA:
+                    # Goes with the rest, the snapshot covers it too
+                    self.resync = True
+                    return True
+                if dropped and kind != STATE:
+                    self.resync = True
+                if len(self.frames) >= self.max_frames:
+                    self.discard()
+                    return False
+            entry = [kind, data]
+            if kind == STATE:
+                self.pending_state = entry
+            self.frames.append(entry)
+            self.condition.notify()
+            return True
+
+    def drop_deltas(self):
+        # True when there were any
+        kept = deque(entry for entry in self.frames if entry[0] != DELTA)
+        dropped = len(kept) != len(self.frames)
+        self.frames = kept
+        return dropped
+
+    def take_resync(self):
+        # True once after deltas were dropped
+        with self.condition:
+            resync = self.resync
+            self.resync = False
+            return resync
+
+    def take_all(self):
+        frames = [data for _, data in self.frames]
+        self.frames.clear()
+        self.pending_state = None
+        return frames
+
+    def get_all(self):
+        # Blocks until frames are queued. Returns None once closed and empty.
+        with self.condition:
+            while not self.frames and not self.closed:
+                self.condition.wait()
+            if not self.frames:
+                return None
+            return self.take_all()
+
+    def close(self):
+        # Writers flush whatever is still queued before exiting
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def discard(self):
+        with self.condition:
+            self.closed = True
+            self.frames.clear()
+            self.pending_state = None
+            self.condition.notify()
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class AsyncOutboundQueue(OutboundQueue):
+    # Same policy as OutboundQueue, drained by an asyncio writer task
+    def __init__(self, max_frames=256, policy=COALESCE):
+        super().__init__(max_frames, policy)
+        self.ready = asyncio.Event()
+
+    def put(self, data, kind=MESSAGE):
+        queued = super().put(data, kind)
+        self.ready.set()
+        return queued
+
+    async def get_all(self):
+        while not self.frames and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+        if not self.frames:
+            return None
+        return self.take_all()
+
+    def close(self):
+        super().close()
+        self.ready.set()
+
+    def discard(self):
+        super().discard()
+        self.ready.set()
+
+
+class SpectatorFeed:
+    # Sends a table's state to its spectators from a thread of its own, so
+    # the players never wait on however many are watching. Each update is a
+    # dict of framed snapshots by protocol, encoded once by the table and
+    # queued as the same bytes for every spectator. Updates are held back
+    # for delay seconds and sent at most once per interval; as each one is a
+    # full snapshot only the newest due is sent. send(conn, frame) queues a
+    # STATE frame.
+    def __init__(self, send, delay=0.0, interval=0.05):
+        self.send = send
+        self.delay = delay
+        self.interval = interval
+        self.spectators = {}
+        self.updates = deque()
+        self.released = None
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = None
+
+    def __contains__(self, conn):
+        return conn in self.spectators
+
+    def __len__(self):
+        return len(self.spectators)
+
+    def add(self, conn, proto):
+        # With a delay, a new spectator starts from the last released update
+        with self.condition:
+            self.spectators[conn] = proto
+            frames = self.released
+        if self.delay > 0 and frames is not None and proto in frames:
+            self.send_to(conn, frames[proto])
+
+    def remove(self, conn):
+        with self.condition:
+            return self.spectators.pop(conn, None) is not None
+
+    def protos(self):
+        with self.condition:
+            return set(self.spectators.values())
+
+    def publish(self, frames):
+        with self.condition:
+            if self.closed:
+                return
+            self.updates.append((time.monotonic() + self.delay, frames))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.updates or self.updates[0][0] > time.monotonic()):
+                    timeout = self.updates[0][0] - time.monotonic() if self.updates else None
+                    self.condition.wait(timeout)
+                if self.closed:
+                    return
+                while self.updates and self.updates[0][0] <= time.monotonic():
+                    frames = self.updates.popleft()[1]
+            self.fan_out(frames)
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed, self.interval)
+
+    def fan_out(self, frames):
+        with self.condition:
+            self.released = frames
+            spectators = list(self.spectators.items())
+        for conn, proto in spectators:
+            if proto in frames:
+                self.send_to(conn, frames[proto])
+
+    def send_to(self, conn, frame):
+        try:
+            self.send(conn, frame)
+        except ConnectionError:
+            self.remove(conn)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.spectators.clear()
+            self.condition.notify()
+
+
+class AsyncSpectatorFeed(SpectatorFeed):
+    # The same feed run as event loop callbacks, so fanning out happens
+    # between the players' turns rather than inside them
+    def __init__(self, send, delay=0.0, interval=0.05):
+        super().__init__(send, delay, interval)
+        self.latest = None
+        self.next_fan_out = 0.0
+
+    def publish(self, frames):
+        if self.closed:
+            return
+        if self.delay > 0:
+            asyncio.get_running_loop().call_later(self.delay, self.offer, frames)
+        else:
+            self.offer(frames)
+
+    def offer(self, frames):
+        scheduled = self.latest is not None
+        self.latest = frames
+        if not scheduled:
+            loop = asyncio.get_running_loop()
+            loop.call_later(max(0.0, self.next_fan_out - loop.time()), self.flush)
+
+    def flush(self):
+        frames, self.latest = self.latest, None
+        self.next_fan_out = asyncio.get_running_loop().time() + self.interval
+        if not self.closed:
+            self.fan_out(frames)
+
+
+class ReservedSeat:
+    # Holds a player's seat, hand and name while they are away, until they
+    # come back with their session token. Messages to it are dropped.
+    def __init__(self, token):
+        self.token = token
+
+    def close(self):
+        pass
+
+
+class RobotSeat:
+    # A computer player in a seat. Stands in for a connection like
+    # ReservedSeat; the table asks its player for a move when it is the
+    # seat's turn, and thinking is set while one is being worked out.
+    def __init__(self, player):
+        self.player = player
+        self.thinking = False
+
+    def close(self):
+        pass
+
+
+# Seats without a connection; messages to them are dropped
+SEAT_STANDINS = (ReservedSeat, RobotSeat)
+
+
+def new_session_token():
+    return secrets.token_urlsafe(12)
+
+
+def spectator_proto(proto):
+    # Spectators are only sent snapshots, in the text form unless they asked
+    # for binary
+    return PROTO_BINARY if proto == PROTO_BINARY else PROTO_DELTA
+
+
+def parse_resume(text):
+    # "!resume <token> [last seq]". Raises IndexError or ValueError.
+    parts = text.split()
+    return parts[1], int(parts[2]) if len(parts) > 2 else None
+
+
+def robot_command(move):
+    # The command a player would send for a robot's call or card
+    if isinstance(move, Card):
+        return f"@card_{move.code}"
+    return "@" + CALL_TEXTS[move]
+
+
 class BridgeTable:
-    def __init__(self, host='0.0.0.0', port=2410, max_clients=4):
+    def __init__(self, host='0.0.0.0', port=2410, max_clients=4, max_queued_frames=256, slow_client_policy=COALESCE,
+                 metrics=NULL_METRICS, game_log=NULL_LOG, snapshot_dir=None, seat_timeout=SEAT_TIMEOUT,
+                 max_spectators=500, spectator_delay=0.0, spectator_interval=0.05, spectators_see_hands=False,
+                 robot_pool=None, robot_player=MonteCarloPlayer, robot_move_time=ROBOT_MOVE_TIME,
+                 robot_pause=ROBOT_PAUSE):
         self.host = host
         self.port = port
         self.max_clients = max_clients
+        self.max_queued_frames = max_queued_frames
+        self.slow_client_policy = slow_client_policy
         self.admin_conn = None
         self.clients = []
-        self.client_lock = threading.Lock()
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_to_queue = {}
+        self.client_to_writer = {}
+        self.metrics = metrics
+        self.client_lock = metrics.timed_lock(threading.Lock(), "client")
+        # Held only while a move is made on the game, which then publishes a
+        # new BoardState and numbers the update for it with publish_update.
+        # Updates are encoded from those, so moves never wait for a broadcast
+        # and never take client_lock.
+        self.game_lock = metrics.timed_lock(threading.Lock(), "game")
+        self.server_socket = None
         self.client_to_name = {SERVER: "server"}
+        self.client_to_proto = {}
+        # Given to each player when they sit down, to reclaim the seat later
+        self.client_to_token = {}
+        self.state_seq = 0
+        # (seq, delta) for recent state updates, delta None for snapshots
+        self.recent_deltas = deque(maxlen=RESUME_HISTORY)
+        # (seq, delta, BoardState) published but not sent yet
+        self.unsent_updates = deque()
+        self.seat_timeout = seat_timeout
+        self.seat_timers = {}
+        # Read-only connections; by default they see what a kibitzer sitting
+        # behind nobody would: played cards and dummy
+        self.max_spectators = max_spectators
+        self.spectators_see_hands = spectators_see_hands
+        self.spectator_feed = self.make_spectator_feed(spectator_delay, spectator_interval)
+        # Robots are made by robot_player(pool, move_time) and think on
+        # robot_pool, which a table given none creates when first needed
+        self.robot_pool = robot_pool
+        self.owns_robot_pool = robot_pool is None
+        self.robot_player = robot_player
+        self.robot_move_time = robot_move_time
+        self.robot_pause = robot_pause
 
         self.game = ContractBridge(self.clients)
+        # The latest (seq, BoardState), always read as a pair
+        self.published = (self.state_seq, self.game.state)
+        self.game_log = game_log
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_writer = None
 
         self.client_to_dummy = defaultdict(bool)
+        self.session_prefix = ""
 
     def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # A restarted server can take its port back straight away
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(self.max_clients)
+        # Room for a crowd of spectators arriving at once
+        self.server_socket.listen(128)
         print(f"[STARTED] Bridge server listening on {self.host}:{self.port}")
+        if self.snapshot_dir is not None:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = snapshot_path(self.snapshot_dir, f"table-{self.port}")
+            state = load_snapshot(path)
+            if state is not None:
+                self.restore_state(state)
+                print(f"[RESTORED] {len(self.clients)} seats waiting to resume from {path}")
+            self.snapshot_writer = SnapshotWriter(lambda: [(path, self)]).start()
+        self.metrics.gauge_callback("bridge_clients", lambda: [({}, len(self.clients))])
+        self.metrics.gauge_callback("bridge_outbound_queued_frames", lambda: queue_totals(self.client_to_queue))
+        self.metrics.gauge_callback("bridge_outbound_queue_max_frames", lambda: queue_maxima(self.client_to_queue))
 
         try:
             while True:
                 conn, addr = self.server_socket.accept()
-                with self.client_lock:
-                    self.clients.append(conn)
-                    self.client_to_name[conn] = str(addr)
-                    if self.admin_conn is None:
-                        self.admin_conn = conn
-                        msg = "[SERVER] You are the admin."
-                    else:
-                        msg = "[SERVER] You are a regular player."
-                    self.send_message(conn, msg)
+                self.metrics.inc("bridge_connections_total")
+                self.add_client(conn, str(addr), take_over=False)
 
                 # with self.client_lock:
                 #     if len(self.clients) >= self.max_clients:
@@ -48,58 +437,497 @@ class BridgeTable:
         except:
             self.shutdown()
 
-    def send_message(self, client, message):
-        data = message.encode()
-        length = len(data).to_bytes(4, byteorder='big')  # 4-byte length prefix
-        client.sendall(length + data)
+    def make_spectator_feed(self, delay, interval):
+        return SpectatorFeed(lambda conn, frame: self.queue_frame(conn, frame, STATE), delay, interval)
+
+    def send_message(self, client, message, kind=MESSAGE):
+        if isinstance(client, SEAT_STANDINS):
+            return
+        self.queue_frame(client, encode_frame(message), kind)
+
+    def queue_frame(self, client, frame, kind=MESSAGE):
+        queue = self.client_to_queue.get(client)
+        if queue is None or queue.closed:
+            raise ConnectionError("Client is disconnected")
+        if not queue.put(frame, kind):
+            self.metrics.inc("bridge_slow_client_drops_total")
+            print(f"[SLOW CLIENT] Dropping {self.client_to_name.get(client)}, outbound queue is full.")
+            try:
+                # Unblocks both the writer's sendall and the reader's recv
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            raise ConnectionError("Client outbound queue is full")
 
+    def take_resync(self, client):
+        queue = self.client_to_queue.get(client)
+        return queue is not None and queue.take_resync()
+
+    def write_frames(self, conn, queue):
+        try:
+            while True:
+                frames = queue.get_all()
+                if frames is None:
+                    break
+                start = time.perf_counter()
+                send_frames(conn, frames)
+                self.record_write(len(frames), sum(len(frame) for frame in frames), time.perf_counter() - start)
+        except OSError:
+            queue.discard()
+        try:
+            # Wakes the reader thread so handle_client cleans up
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def record_write(self, frames, size, seconds):
+        self.metrics.inc("bridge_frames_sent_total", frames)
+        self.metrics.inc("bridge_bytes_sent_total", size)
+        self.metrics.observe("bridge_socket_write_seconds", seconds)
+
+    def attach_client(self, conn):
+        # Takes client_lock, so never call it with the lock held. A connection
+        # that already has a queue keeps it.
+        queue = OutboundQueue(self.max_queued_frames, self.slow_client_policy)
+        writer = threading.Thread(target=self.write_frames, args=(conn, queue), daemon=True)
+        with self.client_lock:
+            if conn in self.client_to_queue:
+                return
+            self.client_to_queue[conn] = queue
+            self.client_to_writer[conn] = writer
+        writer.start()
+
+    def detach_client(self, conn):
+        queue = self.client_to_queue.pop(conn, None)
+        if queue is not None:
+            queue.close()
+        self.client_to_writer.pop(conn, None)
+
+    def add_client(self, conn, name, proto=PROTO_LEGACY, take_over=True):
+        # With take_over a newcomer may sit in a robot's seat. The threaded
+        # server can't tell players from spectators when they connect, so
+        # there they ask for a robot's seat with !sit.
+        self.attach_client(conn)
+        with self.client_lock:
+            self.client_to_name[conn] = name
+            self.client_to_proto[conn] = proto
+        error = self.sit_down(conn, take_over)
+        if error:
+            self.send_message(conn, f"[SERVER] {error}")
+
+    def sit_down(self, conn, take_over=True):
+        # Returns an error or None
+        replaced = None
+        with self.client_lock:
+            if conn in self.clients:
+                return "You already have a seat."
+            robots = [client for client in self.clients if isinstance(client, RobotSeat)]
+            if len(self.clients) >= self.max_clients and not (take_over and robots):
+                if robots:
+                    return "Robots hold the free seats. Use !sit to take one over or !watch to watch."
+                # Only a returning player can sit down
+                return "The table is full. Use !resume <token> to return to your seat or !watch to watch."
+            self.spectator_feed.remove(conn)
+            name = self.client_to_name[conn]
+            token = self.session_prefix + new_session_token()
+            if len(self.clients) < self.max_clients:
+                self.clients.append(conn)
+                self.client_to_token[conn] = token
+            else:
+                # A robot gives its seat, hand and all, up to a person
+                robot = robots[0]
+                replaced = self.client_to_name[robot]
+                self.client_to_token[robot] = token
+                self.rebind(robot, conn)
+                self.client_to_name[conn] = name
+            if self.admin_conn is None:
+                self.admin_conn = conn
+                msg = "[SERVER] You are the admin."
+            else:
+                msg = "[SERVER] You are a regular player."
+            self.send_message(conn, msg)
+            self.send_message(conn, f"[SESSION] {token}")
+        if replaced is not None:
+            self.broadcast(f"{name} takes over from {replaced}.", SERVER)
+        return None
+
+    def add_spectator(self, conn, proto=None):
+        # Returns an error or None. A player who asks to watch gives up their
+        # seat.
+        if conn in self.spectator_feed:
+            return "You are already watching."
+        if len(self.spectator_feed) >= self.max_spectators:
+            return "There is no room for more spectators."
+        self.attach_client(conn)
+        if conn in self.clients:
+            # The connection stays open, only the seat is given up
+            with self.client_lock:
+                self.vacate_seat(conn)
+                with self.game_lock:
+                    self.game.forget(conn)
+            self.send_card_state()
+        with self.client_lock:
+            if proto is not None:
+                self.client_to_proto[conn] = proto
+            proto = spectator_proto(self.client_to_proto.get(conn, PROTO_LEGACY))
+            self.send_message(conn, "[SERVER] You are watching. Use !leave to stop.")
+            self.spectator_feed.add(conn, proto)
+            if self.spectator_feed.delay <= 0 and len(self.clients) == 4:
+                self.queue_frame(conn, self.spectator_frames({proto}, *self.published)[proto], STATE)
+        return None
+
+    def spectator_frames(self, protos, seq, state):
+        # One framed snapshot per protocol, shared by every spectator
+        seats = self.snapshot_seats(None, state, self.spectators_see_hands)
+        auction = snapshot_auction(state)
+        frames = {}
+        for proto in protos:
+            encoder = encode_binary_snapshot if proto == PROTO_BINARY else encode_snapshot
+            frames[proto] = encode_frame(encoder(seq, SPECTATOR, seats, auction))
+        return frames
+
+    def seat_holder(self, token):
+        # The connection or ReservedSeat in the seat given out with token
+        for client in self.clients:
+            if self.client_to_token.get(client) == token:
+                return client
+        return None
+
+    def close_connection(self, conn):
+        # The writer shuts the socket down once its queue is closed
+        self.detach_client(conn)
+
+    def rebind(self, old, new):
+        # Moves everything held for the seat of old over to new
+        self.clients[self.clients.index(old)] = new
+        self.client_to_name[new] = self.client_to_name.pop(old)
+        self.client_to_token[new] = self.client_to_token.pop(old)
+        self.client_to_dummy[new] = self.client_to_dummy.pop(old, False)
+        if self.admin_conn is old:
+            self.admin_conn = new
+        with self.game_lock:
+            self.game.rebind(old, new)
+            # Updates not sent yet name old, so a snapshot goes with them
+            self.publish_update()
+
+    def resume_client(self, conn, token, proto=None, last_seq=None):
+        # Seats conn in the seat reserved for token and sends it what it
+        # missed since last_seq. Returns an error or None.
+        self.attach_client(conn)
+        with self.client_lock:
+            seat = self.seat_holder(token)
+            if seat is None:
+                return "There is no seat waiting for that session."
+            if seat is conn:
+                return "You are already in that seat."
+            if isinstance(seat, ReservedSeat):
+                timer = self.seat_timers.pop(seat, None)
+                if timer is not None:
+                    timer.cancel()
+            else:
+                # The player is back before their old connection was seen
+                # to drop, so it is dropped now
+                self.close_connection(seat)
+                self.client_to_proto.pop(seat, None)
+            if proto is not None:
+                self.client_to_proto[conn] = proto
+            # A spectator who resumes stops watching
+            self.spectator_feed.remove(conn)
+            if conn in self.clients:
+                # Gives up the seat it was given on connecting
+                self.clients.remove(conn)
+                self.client_to_token.pop(conn, None)
+                with self.game_lock:
+                    self.game.forget(conn)
+            self.rebind(seat, conn)
+            self.send_message(conn, "[SERVER] Welcome back!")
+            if conn is self.admin_conn:
+                self.send_message(conn, "[SERVER] You are the admin.")
+            self.send_catch_up(conn, last_seq)
+            name = self.client_to_name[conn]
+        # The rest of the table's state hasn't changed
+        self.broadcast(f"{name} is back.", SERVER)
+        return None
+
+    def missed_deltas(self, last_seq):
+        # The (seq, delta) sent after last_seq, or None when some of them are
+        # no longer held or one of the updates was a snapshot
+        missed = [(seq, delta) for seq, delta in self.recent_deltas if seq > last_seq]
+        if last_seq > self.state_seq or len(missed) != self.state_seq - last_seq:
+            return None
+        if any(delta is None for _, delta in missed):
+            return None
+        return missed
+
+    def send_catch_up(self, conn, last_seq):
+        # Called with client_lock held
+        proto = self.client_to_proto.get(conn, PROTO_LEGACY)
+        missed = None
+        with self.game_lock:
+            if last_seq is not None and proto != PROTO_LEGACY:
+                missed = self.missed_deltas(last_seq)
+            seq, state = self.published
+        if missed is None:
+            if len(self.clients) == 4:
+                self.send_message(conn, self.state_message(conn, seq, state), STATE)
+            return
+        encoder = encode_binary_delta if proto == PROTO_BINARY else encode_delta
+        for missed_seq, delta in missed:
+            self.send_message(conn, encoder(missed_seq, *delta), DELTA)
+        if self.take_resync(conn):
+            self.send_message(conn, self.state_message(conn, seq, state), STATE)
+
+    def schedule(self, delay, callback):
+        # Returns something with cancel()
+        timer = threading.Timer(delay, callback)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def reserve_seat(self, conn):
+        # Holds a dropped player's seat, hand and name for seat_timeout
+        # seconds so they can !resume it. False when there is nothing to hold.
+        with self.client_lock:
+            token = self.client_to_token.get(conn)
+            if conn not in self.clients or token is None or self.seat_timeout <= 0:
+                return False
+            placeholder = ReservedSeat(token)
+            self.detach_client(conn)
+            self.client_to_proto.pop(conn, None)
+            self.rebind(conn, placeholder)
+            self.seat_timers[placeholder] = self.schedule(self.seat_timeout, lambda: self.release_seat(placeholder))
+            name = self.client_to_name[placeholder]
+        self.broadcast(f"{name} lost their connection. Their seat is held for {self.seat_timeout:.0f} s.", SERVER)
+        return True
+
+    def release_seat(self, placeholder):
+        # The player didn't come back in time
+        with self.client_lock:
+            self.seat_timers.pop(placeholder, None)
+            if placeholder not in self.clients:
+                return
+            name = self.client_to_name[placeholder]
+        self.remove_client(placeholder)
+        self.broadcast(f"{name} didn't come back, their seat is free.", SERVER)
+        self.send_card_state()
+
+    def capture_state(self):
+        # Plain values for a snapshot; cheap enough to take during play
+        with self.client_lock:
+            return {
+                "seats": [{"name": self.client_to_name.get(client, ""),
+                           "token": self.client_to_token.get(client),
+                           "dummy": self.client_to_dummy.get(client, False),
+                           "robot": isinstance(client, RobotSeat)} for client in self.clients],
+                "admin": self.clients.index(self.admin_conn) if self.admin_conn in self.clients else None,
+                "state_seq": self.state_seq,
+                "game": self.game.get_state(),
+            }
+
+    def restore_state(self, state):
+        # Every seat in the snapshot waits for its player to !resume, apart
+        # from robots', which get new robots
+        with self.client_lock:
+            for seat in state["seats"]:
+                if seat.get("robot"):
+                    placeholder = self.make_robot()
+                else:
+                    placeholder = ReservedSeat(seat["token"])
+                    self.client_to_token[placeholder] = seat["token"]
+                self.clients.append(placeholder)
+                self.client_to_name[placeholder] = seat["name"]
+                self.client_to_dummy[placeholder] = seat["dummy"]
+            if state["admin"] is not None:
+                self.admin_conn = self.clients[state["admin"]]
+            # Updates after the snapshot was taken are lost, so no client's
+            # seq can be trusted and everyone resumes from a snapshot
+            self.state_seq = state["state_seq"] + 1
+            with self.game_lock:
+                self.game.set_state(state["game"])
+                self.published = (self.state_seq, self.game.state)
+            for placeholder in self.clients:
+                if isinstance(placeholder, ReservedSeat):
+                    self.seat_timers[placeholder] = self.schedule(self.seat_timeout,
+                                                                  lambda seat=placeholder: self.release_seat(seat))
+        self.prompt_robots()
+
+    def make_robot(self):
+        if self.robot_pool is None:
+            self.robot_pool = RobotPool()
+        return RobotSeat(self.robot_player(self.robot_pool, self.robot_move_time))
+
+    def add_robots(self):
+        # Fills every empty seat with a robot and returns how many sat down
+        with self.client_lock:
+            added = 0
+            while len(self.clients) < self.max_clients:
+                robot = self.make_robot()
+                self.clients.append(robot)
+                self.client_to_name[robot] = f"{robot.player.name} {len(self.clients)}"
+                added += 1
+            if added:
+                self.robot_pool.warm_up()
+        return added
+
+    def dismiss_robots(self):
+        # Robots leave once nobody is seated or waiting to resume a seat
+        with self.client_lock:
+            robots = [client for client in self.clients if isinstance(client, RobotSeat)]
+            if len(robots) != len(self.clients):
+                return
+        for robot in robots:
+            self.remove_client(robot)
+
+    def robot_turn(self):
+        # (robot, seat it plays for, whether it has a trick to take) when it
+        # is a robot's turn and it isn't already thinking, and the seq and
+        # BoardState that was decided from. Called with client_lock held.
+        if len(self.clients) != 4:
+            return None
+        seq, state = self.published
+        taking = False
+        if state.bidding:
+            seat = controller = state.auction_turn
+        elif state.contract is not None and not state.is_over:
+            seat = state.turn
+            if seat is None:
+                seat, taking = state.winner, True
+            controller = state.controller(seat)
+        else:
+            return None
+        robot = self.clients[controller]
+        if not isinstance(robot, RobotSeat) or robot.thinking:
+            return None
+        return robot, seat, taking, seq, state
+
+    def prompt_robots(self):
+        # Asks the robot whose turn it is for its move. It is made later, on
+        # a robot thread or after robot_pause, so this never blocks.
+        with self.client_lock:
+            turn = self.robot_turn()
+            if turn is None:
+                return
+            robot, seat, taking, seq, state = turn
+            robot.thinking = True
+            players = list(self.clients)
+        view = None if taking else SeatView(state, players, seat, players.index(robot))
+        if taking:
+            self.schedule(self.robot_pause, lambda: self.robot_moved(robot, seq, "@trick"))
+        else:
+            done = self.robot_callback(lambda move: self.robot_moved(robot, seq, robot_command(move)))
+            self.robot_pool.submit(robot.player, view, done)
+
+    def robot_callback(self, callback):
+        # Wraps what is done with a robot's move so it runs where the
+        # table's commands do; here that is the robot thread itself
+        return callback
+
+    def robot_moved(self, robot, seq, text):
+        with self.client_lock:
+            robot.thinking = False
+            current = robot in self.clients and self.state_seq == seq
+        if current:
+            self.handle_text(text, robot)
+            if self.state_seq == seq:
+                print(f"[ROBOT] {self.client_to_name.get(robot)}'s {text} was refused.")
+            return
+        # The table moved on while it thought; it may be its turn again
+        self.prompt_robots()
+
+    def remove_client(self, conn):
+        if self.spectator_feed.remove(conn):
+            with self.client_lock:
+                self.detach_client(conn)
+                self.client_to_proto.pop(conn, None)
+            return
+        with self.client_lock:
+            self.detach_client(conn)
+            self.client_to_proto.pop(conn, None)
+            self.vacate_seat(conn)
+            self.client_to_name.pop(conn, None)
+            # A released seat's placeholder goes the same way
+            with self.game_lock:
+                self.game.forget(conn)
+
+    def vacate_seat(self, conn):
+        # Called with client_lock held. Leaves the connection and its queue
+        # alone.
+        self.client_to_token.pop(conn, None)
+        if conn in self.clients:
+            self.clients.remove(conn)
+        if conn is self.admin_conn:
+            self.admin_conn = None
+            if len(self.clients) > 0:
+                for client in self.clients:
+                    if isinstance(client, SEAT_STANDINS):
+                        continue
+                    try:
+                        msg = "[PRIVATE] You are now the admin!"
+                        self.send_message(client, msg)
+                        self.admin_conn = client
+                        break
+                    except:
+                        pass
 
     def handle_client(self, conn, addr):
         print(f"[NEW CONNECTION] {addr} connected.")
+        reader = FrameReader(conn)
         with conn:
-            self.send_card_state()
+            if conn in self.clients:
+                # A returning player waiting to !resume changes nothing
+                self.send_card_state()
             while True:
                 try:
-                    length_bytes = conn.recv(4)
-                    if not length_bytes:
-                        raise ConnectionError("Did not receive length_bytes")
-                    length = int.from_bytes(length_bytes, byteorder='big')
-                    data = b""
-                    while len(data) < length:
-                        more = conn.recv(length - len(data))
-                        if not more:
-                            raise ConnectionError("Socket closed")
-                        data += more
-
-                    text = data.decode()
-                    if self.parse_for_admin_commands(text, conn): continue
-                    if self.parse_for_social_commands(text, conn): continue
-                    if self.parse_for_bridge_commands(text, conn): continue
-                    self.broadcast(text, conn)
-
+                    # Every frame that arrived in one recv is handled in turn
+                    for data in reader.read_frames():
+                        self.metrics.inc("bridge_frames_received_total")
+                        self.metrics.inc("bridge_bytes_received_total", len(data))
+                        self.handle_text(data.decode(), conn)
 
                     # self.broadcast(text, SERVER)
+                except FrameTooLarge as e:
+                    print(f"[BAD FRAME] {addr}: {e}")
+                    break
                 except (ConnectionResetError, ConnectionAbortedError, ConnectionError):
                     break
-        with self.client_lock:
-            if conn in self.clients:
-                self.clients.remove(conn)
-                self.client_to_name.pop(conn)
-            if conn is self.admin_conn:
-                if len(self.clients) > 0:
-                    for client in self.clients:
-                        try:
-                            msg = "[PRIVATE] You are now the admin!"
-                            self.send_message(client, msg)
-                            self.admin_conn = client
-                            break
-                        except:
-                            pass
-                else:
-                    self.admin_conn = None
+        if self.reserve_seat(conn):
+            print(f"[DISCONNECTED] {addr} disconnected, seat held.")
+            return
+        seated = conn in self.clients
+        self.remove_client(conn)
 
         print(f"[DISCONNECTED] {addr} disconnected.")
-        self.send_card_state()
+        if seated:
+            self.send_card_state()
+
+    def is_full(self):
+        # Robots give their seats up to people who ask to play
+        return (len(self.clients) >= self.max_clients
+                and not any(isinstance(client, RobotSeat) for client in self.clients))
+
+    def handle_text(self, text, conn):
+        if not self.metrics.enabled:
+            self.dispatch_text(text, conn)
+            return
+        start = time.perf_counter()
+        try:
+            self.dispatch_text(text, conn)
+        finally:
+            self.metrics.record_command(command_label(text), time.perf_counter() - start)
+
+    def dispatch_text(self, text, conn):
+        if self.parse_for_protocol_commands(text, conn): return
+        if conn in self.spectator_feed:
+            self.scold("Spectators can only watch!", conn)
+            return
+        if conn not in self.clients:
+            self.scold("You don't have a seat! Use !sit to sit down, !resume <token> to return to your seat"
+                       " or !watch to watch.", conn)
+            return
+        if self.parse_for_admin_commands(text, conn): return
+        if self.parse_for_social_commands(text, conn): return
+        if self.parse_for_bridge_commands(text, conn): return
+        self.broadcast(text, conn)
 
     def parse_for_admin_commands(self, text, conn):
         if text == "!shutdown":
@@ -110,15 +938,47 @@ class BridgeTable:
                 self.scold("You can't shutdown the server!", conn)
             return True
         elif text == "!deal":
-            if conn == self.admin_conn:
-
-                if self.game.deal():
+            if conn != self.admin_conn:
+                self.scold("You can't deal!", conn)
+            elif len(self.clients) != 4:
+                self.scold("All four seats must be filled before you deal!", conn)
+            else:
+                with self.game_lock:
+                    dealt = self.game.deal()
+                    state = self.game.state
+                    if dealt:
+                        self.publish_update()
+                if dealt:
+                    for client in self.client_to_dummy:
+                        self.client_to_dummy[client] = False
+                    self.game_log.deal(state.boards_dealt, state.dealer, [CardSet(mask) for mask in state.dealt])
                     self.broadcast("Admin is dealing cards.", SERVER)
+                    self.send_updates()
+                    dealer = state.dealer
+                    if dealer < len(self.clients):
+                        self.broadcast(f"{self.client_to_name[self.clients[dealer]]} deals and calls first.", SERVER)
+                else:
+                    self.scold("The cards can't be dealt until all four seats are filled!", conn)
+            return True
+        elif text == "!robot":
+            if conn != self.admin_conn:
+                self.scold("You can't add robots!", conn)
+            else:
+                added = self.add_robots()
+                if added:
+                    self.broadcast(f"{added} robot{'s' if added > 1 else ''} sat down.", SERVER)
                     self.send_card_state()
                 else:
-                    pass
+                    self.scold("There are no empty seats.", conn)
+            return True
+        elif text == "!metrics":
+            if conn != self.admin_conn:
+                self.scold("You can't read the metrics!", conn)
+            elif not self.metrics.enabled:
+                self.scold("Metrics are disabled on this server.", conn)
             else:
-                self.scold("You can't deal!", conn)
+                # A leading "#" would be taken for a state message
+                self.send_message(conn, "[METRICS]\n" + self.metrics.render())
             return True
         elif text.split()[0] == "!scold":
             if conn == self.admin_conn:
@@ -134,37 +994,54 @@ class BridgeTable:
             else:
                 self.scold("You can't scold people!", conn)
                 return True
-        elif text == "!resetdummy":
-            if conn == self.admin_conn:
-                for client in self.client_to_dummy:
-                    self.client_to_dummy[client] = False
-                self.broadcast("Admin reset dummy flags.", SERVER)
-            else:
-                self.scold("You can't scold people!", conn)
+        return False
+    def parse_for_protocol_commands(self, text, conn):
+        if text.split(" ")[0] == "!proto":
+            try:
+                proto = int(text.split()[1])
+            except (IndexError, ValueError):
+                self.scold("Usage: !proto <version>", conn)
                 return True
-        elif text.split()[0] == "!dummy":
-            if conn == self.admin_conn:
-                try:
-                    target_name = text.split()[1]
-                    for client, client_name in self.client_to_name.items():
-                        if target_name == client_name:
-                            self.client_to_dummy[client] = True
-                            self.broadcast(f"Admin set {client_name} dummy flag to True.", SERVER)
-                            self.send_card_state()
-                            break
-                    return True
-                except:
-                    pass
+            if proto not in SUPPORTED_PROTOCOLS:
+                proto = PROTO_LEGACY
+            self.client_to_proto[conn] = proto
+            if conn in self.spectator_feed:
+                self.spectator_feed.add(conn, spectator_proto(proto))
+            self.send_snapshot(conn)
+            return True
+        elif text == "!resync":
+            self.send_snapshot(conn)
+            return True
+        elif text == "!watch":
+            error = self.add_spectator(conn)
+            if error:
+                self.scold(error, conn)
+            return True
+        elif text == "!sit":
+            error = self.sit_down(conn)
+            if error:
+                self.scold(error, conn)
             else:
-                self.scold("You can't scold people!", conn)
-                return True
+                self.send_card_state()
+            return True
+        elif text.split(" ")[0] == "!resume":
+            try:
+                token, last_seq = parse_resume(text)
+                error = self.resume_client(conn, token, last_seq=last_seq)
+            except (IndexError, ValueError):
+                error = "Usage: !resume <token> [last seq]"
+            if error:
+                self.scold(error, conn)
+            return True
         return False
+
     def parse_for_social_commands(self, text, conn):
         try:
             if text.split()[0] == "!name":
                 self.broadcast(text, conn)
                 self.client_to_name[conn] = ' '.join(text.split()[1:])
-                self.send_card_state()
+                self.game_log.name(self.seat_of(conn), self.client_to_name[conn])
+                self.send_card_state(("name", self.seat_of(conn), self.client_to_name[conn]))
                 return True
             elif text.split()[0] == "!me":
                 self.broadcast(text[0:2], conn, me=True)
@@ -173,28 +1050,95 @@ class BridgeTable:
             pass
     def parse_for_bridge_commands(self, text, conn):
         if text[0] == "@":
-            if text == "@pass":
-                pass
-
+            if text[1:] in TEXT_TO_CALL:
+                self.make_call(conn, TEXT_TO_CALL[text[1:]])
             elif text == "@trick":
-                if self.game.take_trick(conn):
-                    self.broadcast(f"{self.client_to_name[conn]} took a trick!", SERVER)
-                    self.send_card_state()
+                with self.game_lock:
+                    winner = self.game.take_trick(conn)
+                    state = self.game.state
+                    if winner is not None:
+                        self.publish_update(("trick", winner))
+                if winner is not None:
+                    self.game_log.trick(winner)
+                    self.broadcast(f"{self.client_to_name[self.clients[winner]]} won the trick! "
+                                   f"{self.trick_counts(state)}", SERVER)
+                    self.send_updates()
+                    if state.is_over:
+                        self.broadcast(self.board_result(state), SERVER)
                 else:
                     self.scold("You can't take this trick!", conn)
             elif text[0:5] == "@card":
-                if self.game.play_card(conn, text.split("_")[-1]):
-                    self.broadcast(f"{self.client_to_name[conn]} played {text.split('_')[-1]}", SERVER)
-                    self.send_card_state()
+                card_code = text.split("_")[-1]
+                with self.game_lock:
+                    seat = self.game.play_card(conn, card_code)
+                    state = self.game.state
+                    if seat is not None:
+                        self.publish_update(("play", seat, card_code))
+                if seat is not None:
+                    self.game_log.play(seat, card_code)
+                    self.broadcast(f"{self.client_to_name[self.clients[seat]]} played {card_code}", SERVER)
+                    self.send_updates()
+                elif state.bidding:
+                    self.scold("The auction isn't over yet!", conn)
+                elif state.contract is not None and (state.turn is None
+                                                     or state.controller(state.turn) != self.seat_of(conn)):
+                    self.scold("It isn't your turn to play!", conn)
                 else:
                     self.scold("You can't play that card!", conn)
-            elif len(text) == 3 and text[1] in ["1","2","3","4","5","6","7"] and text[2] in ['s', 'c', 'd', 'h', 'n']:
-                self.broadcast(f"{self.client_to_name[conn]} bids '{text[1:]}'", SERVER)
             else:
                 self.broadcast(f"You ({self.client_to_name[conn]}) can't bid '{text[1:]}'", SERVER)
             return True
 
 
+    def make_call(self, conn, call):
+        state = self.game.state
+        if not state.bidding:
+            self.scold("There is no auction in progress!", conn)
+            return
+        seat = self.seat_of(conn)
+        if state.auction_turn != seat:
+            self.scold("It isn't your turn to bid!", conn)
+            return
+        with self.game_lock:
+            made = self.game.make_call(conn, call)
+            state = self.game.state
+            if made:
+                self.publish_update(("bid", seat, call))
+        if not made:
+            self.scold(f"You can't bid '{CALL_TEXTS[call]}'!", conn)
+            return
+        self.game_log.bid(seat, call)
+        self.broadcast(f"{self.client_to_name[conn]} bids '{CALL_TEXTS[call]}'", SERVER)
+        self.send_updates()
+        if not state.auction_over:
+            return
+        contract = state.contract
+        if contract is None:
+            self.broadcast("The board is passed out.", SERVER)
+            return
+        # The dummy's hand goes face up for everyone
+        declarer, dummy = self.clients[contract.declarer], self.clients[contract.dummy]
+        self.client_to_dummy[dummy] = True
+        self.broadcast(f"The contract is {contract.to_text()} by {self.client_to_name[declarer]}. "
+                       f"{self.client_to_name[dummy]} is dummy.", SERVER)
+        self.send_card_state(("dummy", contract.dummy, state.hand(dummy)))
+
+    def trick_counts(self, state):
+        names = [self.client_to_name[client] for client in self.clients]
+        tricks = state.tricks
+        return f"{names[0]} & {names[2]}: {tricks[0]}, {names[1]} & {names[3]}: {tricks[1]}"
+
+    def board_result(self, state):
+        contract = state.contract
+        needed = contract.level + 6
+        made = state.declarer_tricks
+        declarer = self.client_to_name[self.clients[contract.declarer]]
+        vulnerable = board_vulnerability(state.boards_dealt)[contract.declarer % 2]
+        score = score_contract(contract, made, vulnerable)
+        if made >= needed:
+            return f"{contract.to_text()} by {declarer} made with {made} tricks, scoring {score}."
+        return f"{contract.to_text()} by {declarer} went down {needed - made}, scoring {score}."
+
     def broadcast(self, text, sender_conn, me=False):
         name = self.client_to_name[sender_conn]
         msg_to_send = name + ": " + text
@@ -220,6 +1164,23 @@ class BridgeTable:
 
     def shutdown(self):
         print("[SHUTDOWN] Server is shutting down.")
+        self.spectator_feed.close()
+        self.game_log.close()
+        self.game_log.flush()
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.stop()
+        if self.owns_robot_pool and self.robot_pool is not None:
+            self.robot_pool.shutdown()
+        with self.client_lock:
+            for timer in self.seat_timers.values():
+                timer.cancel()
+            self.seat_timers.clear()
+            for queue in self.client_to_queue.values():
+                queue.close()
+            writers = list(self.client_to_writer.values())
+        # Give writers a moment to flush the final messages
+        for writer in writers:
+            writer.join(timeout=1)
         with self.client_lock:
             for client in self.clients:
                 try:
@@ -227,46 +1188,651 @@ class BridgeTable:
                 except:
                     pass
             self.clients.clear()
-        self.server_socket.close()
+            self.client_to_queue.clear()
+            self.client_to_writer.clear()
+        if self.server_socket is not None:
+            self.server_socket.close()
+
+    def seat_of(self, conn):
+        return self.clients.index(conn)
+
+    def legacy_state_text(self, client, state):
+        client_to_played_cards = state.played
+        player_hand_states = {}
+        player_played_cards = {}
+
+        for i, client_of_cards in enumerate(self.clients):
+            cards_owner_name = self.client_to_name[client_of_cards]
+            cards = state.hand(client_of_cards)
+            try:
+                player_played_cards[cards_owner_name] = client_to_played_cards[client_of_cards].to_code()
+            except (AttributeError, KeyError):
+                player_played_cards[cards_owner_name] = "None"
+
+            if self.client_to_dummy[client_of_cards] or client_of_cards == client:
+                player_hand_states[cards_owner_name] = [a.to_code() for a in cards]
+            else:
+                player_hand_states[cards_owner_name] = ["b" for a in cards]
+        return "@" + self.client_to_name[client] + "\n" + str(player_hand_states) + "\n" + str(player_played_cards)
 
-    def send_card_state(self):
-        #to each person, send their cards face up
-        #send dummy cards face up
-        # send other cards face down
-        # send current played cards
-        # just a dummy version right now
+    def snapshot_seats(self, client, state, all_hands=False):
+        # (name, hand, played) per seat as seen by client in state, hidden
+        # hands as their card count
+        seats = []
+        for client_of_cards in self.clients:
+            if all_hands or self.client_to_dummy[client_of_cards] or client_of_cards == client:
+                hand = state.hand(client_of_cards)
+            else:
+                hand = state.hands.get(client_of_cards, 0).bit_count()
+            played = state.played.get(client_of_cards)
+            seats.append((self.client_to_name[client_of_cards], hand, played.to_code() if played else None))
+        return seats
+
+    def snapshot_message(self, client, seq, state):
+        seats = self.snapshot_seats(client, state)
+        auction = snapshot_auction(state)
+        if self.client_to_proto.get(client) == PROTO_BINARY:
+            return encode_binary_snapshot(seq, self.seat_of(client), seats, auction)
+        return encode_snapshot(seq, self.seat_of(client), seats, auction)
+
+    def state_message(self, client, seq, state):
+        if self.client_to_proto.get(client, PROTO_LEGACY) == PROTO_LEGACY:
+            return self.legacy_state_text(client, state)
+        return self.snapshot_message(client, seq, state)
 
+    def send_snapshot(self, client):
         if len(self.clients) != 4:
             return
+        if client in self.spectator_feed:
+            proto = spectator_proto(self.client_to_proto.get(client, PROTO_LEGACY))
+            with self.client_lock:
+                self.queue_frame(client, self.spectator_frames({proto}, *self.published)[proto], STATE)
+            return
+        if client not in self.clients:
+            return
+        with self.client_lock:
+            message = self.state_message(client, *self.published)
+            try:
+                self.send_message(client, message, STATE)
+            except ConnectionError:
+                print(f"COULD NOT SEND STATE, {client}")
 
-        client_to_hand = self.game.get_hands()
-        client_to_played_cards = self.game.get_played_cards()
+    def publish_update(self, delta=None):
+        # Numbers an update for the BoardState just published. Called with
+        # game_lock held, in the same section as the move, so each seq goes
+        # with the board it describes; send_updates sends them in order.
+        self.state_seq += 1
+        self.published = (self.state_seq, self.game.state)
+        self.recent_deltas.append((self.state_seq, delta))
+        self.unsent_updates.append((self.state_seq, delta, self.game.state))
 
+    def send_card_state(self, delta=None):
+        # For a change that isn't a move on the game, like a name
+        if len(self.clients) != 4:
+            return
+        with self.game_lock:
+            self.publish_update(delta)
+        self.send_updates()
 
+    def send_updates(self):
+        # Legacy clients get a full snapshot on every change. Delta clients
+        # get the numbered deltas, or a snapshot when one of the updates has
+        # none. delta is (event, seat, arg) as understood by encode_delta.
+        # Each delta is encoded at most once per protocol and shared by every
+        # seat, and snapshots are encoded from the last BoardState published,
+        # so every seat sees the same board even if the next move is made
+        # meanwhile.
         with self.client_lock:
+            with self.game_lock:
+                updates = list(self.unsent_updates)
+                self.unsent_updates.clear()
+            if not updates or len(self.clients) != 4:
+                return
+            seq, _, state = updates[-1]
+            deltas = [(update_seq, delta) for update_seq, delta, _ in updates]
+            if any(delta is None for _, delta in deltas):
+                deltas = None
+            encoded_deltas = {}
+            queued_bytes = 0
             for client in self.clients:
-                client_name = self.client_to_name[client]
-                if client_name == "server":
+                if isinstance(client, SEAT_STANDINS):
                     continue
-                player_hand_states = {}
-                player_played_cards = {}
+                proto = self.client_to_proto.get(client, PROTO_LEGACY)
+                if proto == PROTO_LEGACY:
+                    messages, kind = [self.legacy_state_text(client, state)], STATE
+                elif deltas is not None:
+                    if proto not in encoded_deltas:
+                        encoder = encode_binary_delta if proto == PROTO_BINARY else encode_delta
+                        encoded_deltas[proto] = [encoder(delta_seq, *delta) for delta_seq, delta in deltas]
+                    messages, kind = encoded_deltas[proto], DELTA
+                else:
+                    messages, kind = [self.snapshot_message(client, seq, state)], STATE
+                try:
+                    for message in messages:
+                        queued_bytes += len(message)
+                        self.send_message(client, message, kind)
+                    if self.take_resync(client):
+                        # Deltas were dropped from its queue to make room
+                        self.send_message(client, self.snapshot_message(client, seq, state), STATE)
+                except ConnectionError:
+                    print(f"COULD NOT SEND STATE, {client}")
+            self.metrics.observe("bridge_state_update_bytes", queued_bytes)
+            if len(self.spectator_feed):
+                # Encoded here so it matches this update; sent by the feed
+                self.spectator_feed.publish(self.spectator_frames(self.spectator_feed.protos(), seq, state))
+        self.prompt_robots()
 
-                for i, client_of_cards in enumerate(self.clients):
-                    cards_owner_name = self.client_to_name[client_of_cards]
-                    cards = client_to_hand[client_of_cards]
-                    try:
-                        player_played_cards[cards_owner_name] = client_to_played_cards[client_of_cards].to_code()
-                    except (AttributeError, KeyError):
-                        player_played_cards[cards_owner_name] = "None"
-
-                    if self.client_to_dummy[client_of_cards] or client_of_cards == client:
-                        player_hand_states[cards_owner_name] = [a.to_code() for a in cards]
-                    else:
-                        player_hand_states[cards_owner_name] = ["b" for a in cards]
-                state_text = "@" + self.client_to_name[client] + "\n" + str(player_hand_states) + "\n" + str(player_played_cards)
-                self.send_message(client, state_text)
-        self.broadcast("Sent State", SERVER)
-
-def start_bridge_server():
-    server = BridgeTable()
-    server.start()
\ No newline at end of file
+class AsyncBridgeTable(BridgeTable):
+    # A table hosted inside an AsyncBridgeServer. Clients are asyncio
+    # StreamWriters whose outbound queues belong to the server, since a
+    # connection can move between tables.
+    def __init__(self, table_id, server):
+        super().__init__(max_clients=server.max_clients, metrics=server.metrics, game_log=server.open_log(table_id),
+                         max_spectators=server.max_spectators, spectator_delay=server.spectator_delay,
+                         spectator_interval=server.spectator_interval, spectators_see_hands=server.spectators_see_hands,
+                         robot_pool=server.robot_pool, robot_player=server.robot_player,
+                         robot_move_time=server.robot_move_time, robot_pause=server.robot_pause)
+        self.table_id = table_id
+        self.server = server
+        self.session_prefix = server.session_prefix
+
+    def attach_client(self, conn):
+        pass
+
+    def detach_client(self, conn):
+        pass
+
+    def make_spectator_feed(self, delay, interval):
+        return AsyncSpectatorFeed(lambda conn, frame: self.queue_frame(conn, frame, STATE), delay, interval)
+
+    def send_message(self, client, message, kind=MESSAGE):
+        if isinstance(client, SEAT_STANDINS):
+            return
+        self.server.send_message(client, message, kind)
+
+    def queue_frame(self, client, frame, kind=MESSAGE):
+        self.server.queue_frame(client, frame, kind)
+
+    def take_resync(self, client):
+        return self.server.take_resync(client)
+
+    def capture_state(self):
+        state = super().capture_state()
+        state["table_id"] = self.table_id
+        return state
+
+    def schedule(self, delay, callback):
+        # Runs on the event loop like the rest of the table
+        return asyncio.get_running_loop().call_later(delay, callback)
+
+    def robot_callback(self, callback):
+        loop = asyncio.get_running_loop()
+        return lambda move: loop.call_soon_threadsafe(callback, move)
+
+    def close_connection(self, conn):
+        self.server.close_client(conn)
+
+    def release_seat(self, placeholder):
+        super().release_seat(placeholder)
+        self.server.lobby.close_if_empty(self)
+
+    def shutdown(self):
+        print(f"[SHUTDOWN] Table {self.table_id} is shutting down.")
+        self.spectator_feed.close()
+        self.game_log.close()
+        with self.client_lock:
+            for client in self.clients:
+                self.server.close_client(client)
+            self.clients.clear()
+
+
+class BridgeLobby:
+    # Routes connections to tables. The lobby lock only guards the table
+    # directory; game traffic goes straight to the table, so work on one
+    # table never takes another table's client_lock.
+    def __init__(self, table_factory, send_message, max_tables=500, metrics=NULL_METRICS):
+        self.table_factory = table_factory
+        self.send_message = send_message
+        self.max_tables = max_tables
+        self.tables = {}
+        self.conn_to_table = {}
+        self.conn_to_name = {}
+        self.conn_to_proto = {}
+        self.metrics = metrics
+        self.lobby_lock = metrics.timed_lock(threading.Lock(), "lobby")
+
+    def add_client(self, conn, name):
+        with self.lobby_lock:
+            self.conn_to_name[conn] = name
+        self.send_message(conn, "[LOBBY] Welcome! Use !tables, !create <table> or !join <table>.")
+
+    def disconnect_client(self, conn):
+        # A dropped connection's seat is held for it to !resume; !leave
+        # gives the seat up
+        with self.lobby_lock:
+            table = self.conn_to_table.get(conn)
+        if table is not None and table.reserve_seat(conn):
+            with self.lobby_lock:
+                self.conn_to_table.pop(conn, None)
+        self.remove_client(conn)
+
+    def remove_client(self, conn):
+        self.leave_table(conn)
+        with self.lobby_lock:
+            self.conn_to_name.pop(conn, None)
+            self.conn_to_proto.pop(conn, None)
+
+    def handle_text(self, text, conn):
+        start = time.perf_counter()
+        if self.parse_for_lobby_commands(text, conn):
+            self.metrics.record_command(command_label(text), time.perf_counter() - start)
+            return
+        table = self.conn_to_table.get(conn)
+        if table is None:
+            self.scold("Join a table first! Try !tables.", conn)
+            return
+        table.handle_text(text, conn)
+
+    def parse_for_lobby_commands(self, text, conn):
+        try:
+            command = text.split()[0]
+        except IndexError:
+            return False
+        if command == "!tables":
+            self.send_message(conn, self.list_tables())
+            return True
+        elif command in ("!create", "!join"):
+            try:
+                table_id = text.split()[1]
+            except IndexError:
+                self.scold(f"Usage: {command} <table>", conn)
+                return True
+            error = self.join_table(conn, table_id, create=(command == "!create"))
+            if error:
+                self.scold(error, conn)
+            return True
+        elif command == "!proto":
+            try:
+                proto = int(text.split()[1])
+            except (IndexError, ValueError):
+                proto = PROTO_LEGACY
+            self.conn_to_proto[conn] = proto if proto in SUPPORTED_PROTOCOLS else PROTO_LEGACY
+            # Seated connections also let their table answer with a snapshot
+            return self.conn_to_table.get(conn) is None
+        elif command == "!watch":
+            try:
+                table_id = text.split()[1]
+            except IndexError:
+                self.scold("Usage: !watch <table>", conn)
+                return True
+            error = self.watch_table(conn, table_id)
+            if error:
+                self.scold(error, conn)
+            return True
+        elif command == "!leave":
+            if self.leave_table(conn):
+                self.send_message(conn, "[LOBBY] You left the table.")
+            return True
+        elif command == "!resume":
+            try:
+                token, last_seq = parse_resume(text)
+                error = self.resume_table(conn, token, last_seq)
+            except (IndexError, ValueError):
+                error = "Usage: !resume <token> [last seq]"
+            if error:
+                self.scold(error, conn)
+            return True
+        return False
+
+    def table_listing(self):
+        # (table id, seated, seats, watching) for every table
+        with self.lobby_lock:
+            tables = list(self.tables.items())
+        return [(table_id, len(table.clients), table.max_clients, len(table.spectator_feed))
+                for table_id, table in tables]
+
+    def list_tables(self):
+        return format_table_listing(self.table_listing())
+
+    def join_table(self, conn, table_id, create=False):
+        if self.conn_to_table.get(conn) is not None:
+            if self.conn_to_table[conn].table_id == table_id:
+                return "You are already at that table!"
+            self.leave_table(conn)
+        with self.lobby_lock:
+            table = self.tables.get(table_id)
+            if table is None:
+                if not create:
+                    return f"There is no table called {table_id}."
+                if len(self.tables) >= self.max_tables:
+                    return "The server can't host any more tables."
+                table = self.table_factory(table_id)
+                self.tables[table_id] = table
+            elif create:
+                return f"Table {table_id} already exists."
+            if table.is_full():
+                return f"Table {table_id} is full."
+            self.conn_to_table[conn] = table
+            name = self.conn_to_name[conn]
+            proto = self.conn_to_proto.get(conn, PROTO_LEGACY)
+            # Lock order is always lobby_lock -> client_lock
+            table.add_client(conn, name, proto)
+        table.send_card_state()
+        return None
+
+    def watch_table(self, conn, table_id):
+        if self.conn_to_table.get(conn) is not None:
+            self.leave_table(conn)
+        with self.lobby_lock:
+            table = self.tables.get(table_id)
+            if table is None:
+                return f"There is no table called {table_id}."
+            error = table.add_spectator(conn, self.conn_to_proto.get(conn, PROTO_LEGACY))
+            if error is None:
+                self.conn_to_table[conn] = table
+        return error
+
+    def add_table(self, table):
+        with self.lobby_lock:
+            self.tables[table.table_id] = table
+
+    def resume_table(self, conn, token, last_seq=None):
+        # Takes a connection back to the seat its session token reserves
+        with self.lobby_lock:
+            table = next((table for table in self.tables.values() if table.seat_holder(token) is not None), None)
+        if table is None:
+            return "There is no seat waiting for that session."
+        old = table.seat_holder(token)
+        if old is conn:
+            return "You are already in that seat."
+        if self.conn_to_table.get(conn) is not None:
+            self.leave_table(conn)
+        error = table.resume_client(conn, token, self.conn_to_proto.get(conn, PROTO_LEGACY), last_seq)
+        if error is None:
+            with self.lobby_lock:
+                self.conn_to_table[conn] = table
+                # A connection the player left behind is no longer seated
+                self.conn_to_table.pop(old, None)
+        return error
+
+    def leave_table(self, conn):
+        with self.lobby_lock:
+            table = self.conn_to_table.pop(conn, None)
+            if table is None:
+                return False
+            name = table.client_to_name.get(conn)
+            if name is not None:
+                self.conn_to_name[conn] = name
+            table.remove_client(conn)
+        self.close_if_empty(table)
+        table.send_card_state()
+        return True
+
+    def close_if_empty(self, table):
+        table.dismiss_robots()
+        with self.lobby_lock:
+            if len(table.clients) != 0 or self.tables.get(table.table_id) is not table:
+                return
+            del self.tables[table.table_id]
+            table.game_log.close()
+            # Spectators go back to the lobby
+            watchers = list(table.spectator_feed.spectators)
+            table.spectator_feed.close()
+            for conn in watchers:
+                self.conn_to_table.pop(conn, None)
+        for conn in watchers:
+            try:
+                self.send_message(conn, f"[LOBBY] Table {table.table_id} has closed.")
+            except ConnectionError:
+                pass
+
+    def scold(self, text, conn):
+        try:
+            self.send_message(conn, "^" + text)
+        except Exception:
+            print(f"COULD NOT SEND MESSAGE {text}, {conn}")
+
+
+def snapshot_auction(state):
+    # (dealer, calls) for the encoders, None before the first deal
+    return None if state.dealer is None else (state.dealer, state.calls)
+
+
+def format_table_listing(listing):
+    if not listing:
+        return "[LOBBY] No tables yet. Use !create <table>."
+    lines = [f"{table_id} ({seated}/{seats}" + (f", {watching} watching)" if watching else ")")
+             for table_id, seated, seats, watching in listing]
+    return "[LOBBY] Tables:\n" + "\n".join(lines)
+
+
+class AsyncBridgeServer:
+    # Hosts many tables behind one listening socket on a single event loop.
+    # Connections start in the lobby and pick a table with !join/!create.
+    def __init__(self, host='0.0.0.0', port=2410, max_clients=4, max_tables=500,
+                 max_queued_frames=256, slow_client_policy=COALESCE, metrics=NULL_METRICS, log_dir=None,
+                 snapshot_dir=None, max_spectators=500, spectator_delay=0.0, spectator_interval=0.05,
+                 spectators_see_hands=False, robot_pool=None, robot_player=MonteCarloPlayer,
+                 robot_move_time=ROBOT_MOVE_TIME, robot_pause=ROBOT_PAUSE):
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.max_spectators = max_spectators
+        self.spectator_delay = spectator_delay
+        self.spectator_interval = spectator_interval
+        self.spectators_see_hands = spectators_see_hands
+        # Every table's robots share one pool
+        self.robot_pool = robot_pool if robot_pool is not None else RobotPool()
+        self.owns_robot_pool = robot_pool is None
+        self.robot_player = robot_player
+        self.robot_move_time = robot_move_time
+        self.robot_pause = robot_pause
+        self.max_queued_frames = max_queued_frames
+        self.slow_client_policy = slow_client_policy
+        self.client_to_queue = {}
+        self.metrics = metrics
+        # One log file per table, all written by one background thread
+        self.log_dir = log_dir
+        self.log_writer = LogWriter() if log_dir is not None else None
+        # Put in front of session tokens, so a supervisor can tell which of
+        # its workers gave one out
+        self.session_prefix = ""
+        self.lobby = self.make_lobby(max_tables, metrics)
+        self.server = None
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_writer = None
+        metrics.gauge_callback("bridge_clients", lambda: [({}, len(self.client_to_queue))])
+        metrics.gauge_callback("bridge_outbound_queued_frames", lambda: queue_totals(self.client_to_queue))
+        metrics.gauge_callback("bridge_outbound_queue_max_frames", lambda: queue_maxima(self.client_to_queue))
+
+    def make_lobby(self, max_tables, metrics):
+        return BridgeLobby(self.create_table, self.send_message, max_tables, metrics)
+
+    def create_table(self, table_id):
+        return AsyncBridgeTable(table_id, self)
+
+    def owns_table(self, table_id):
+        return True
+
+    def restore_tables(self):
+        for name, path in list_snapshots(self.snapshot_dir, "table-").items():
+            state = load_snapshot(path)
+            if state is None or "table_id" not in state or not self.owns_table(state["table_id"]):
+                continue
+            table = self.create_table(state["table_id"])
+            table.restore_state(state)
+            self.lobby.add_table(table)
+            print(f"[RESTORED] Table {table.table_id}: {len(table.clients)} seats waiting to resume")
+
+    def snapshot_sources(self):
+        with self.lobby.lobby_lock:
+            tables = list(self.lobby.tables.values())
+        return [(snapshot_path(self.snapshot_dir, table_snapshot_name(table.table_id)), table) for table in tables]
+
+    def open_log(self, table_id):
+        if self.log_writer is None:
+            return NULL_LOG
+        return self.log_writer.open(session_path(self.log_dir, f"table-{table_id}"))
+
+    def send_message(self, client, message, kind=MESSAGE):
+        self.queue_frame(client, encode_frame(message), kind)
+
+    def queue_frame(self, client, frame, kind=MESSAGE):
+        queue = self.client_to_queue.get(client)
+        if queue is None or queue.closed:
+            raise ConnectionError("Client is disconnected")
+        if not queue.put(frame, kind):
+            self.metrics.inc("bridge_slow_client_drops_total")
+            print(f"[SLOW CLIENT] Dropping {client.get_extra_info('peername')}, outbound queue is full.")
+            client.transport.abort()
+            raise ConnectionError("Client outbound queue is full")
+
+    def take_resync(self, client):
+        queue = self.client_to_queue.get(client)
+        return queue is not None and queue.take_resync()
+
+    def close_client(self, client):
+        queue = self.client_to_queue.get(client)
+        if queue is not None:
+            queue.close()
+
+    async def write_frames(self, writer, queue):
+        try:
+            while True:
+                frames = await queue.get_all()
+                if frames is None:
+                    break
+                data = b"".join(frames)
+                start = time.perf_counter()
+                writer.write(data)
+                await writer.drain()
+                self.metrics.inc("bridge_frames_sent_total", len(frames))
+                self.metrics.inc("bridge_bytes_sent_total", len(data))
+                self.metrics.observe("bridge_socket_write_seconds", time.perf_counter() - start)
+        except ConnectionError:
+            queue.discard()
+        writer.close()
+
+    def open_client(self, writer):
+        # (queue, writer task) for a new connection
+        queue = AsyncOutboundQueue(self.max_queued_frames, self.slow_client_policy)
+        self.client_to_queue[writer] = queue
+        return queue, asyncio.create_task(self.write_frames(writer, queue))
+
+    async def drop_client(self, writer, queue, writer_task):
+        self.lobby.disconnect_client(writer)
+        self.client_to_queue.pop(writer, None)
+        queue.close()
+        await writer_task
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        print(f"[NEW CONNECTION] {addr} connected.")
+        self.metrics.inc("bridge_connections_total")
+        queue, writer_task = self.open_client(writer)
+        self.lobby.add_client(writer, str(addr))
+        try:
+            while True:
+                length_bytes = await reader.readexactly(4)
+                length = int.from_bytes(length_bytes, byteorder='big')
+                check_frame_length(length)
+                data = await reader.readexactly(length)
+                self.metrics.inc("bridge_frames_received_total")
+                self.metrics.inc("bridge_bytes_received_total", length)
+                self.lobby.handle_text(data.decode(), writer)
+        except FrameTooLarge as e:
+            print(f"[BAD FRAME] {addr}: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            await self.drop_client(writer, queue, writer_task)
+            print(f"[DISCONNECTED] {addr} disconnected.")
+
+    def start_snapshots(self):
+        if self.snapshot_dir is not None:
+            # Restored tables hold their seats with timers on this loop
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            self.restore_tables()
+            self.snapshot_writer = SnapshotWriter(self.snapshot_sources).start()
+
+    async def serve(self):
+        self.start_snapshots()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"[STARTED] Async bridge server listening on {self.host}:{self.port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("[SHUTDOWN] Server is shutting down.")
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.stop()
+        if self.owns_robot_pool:
+            self.robot_pool.shutdown()
+        if self.log_writer is not None:
+            for table in list(self.lobby.tables.values()):
+                table.game_log.close()
+            self.log_writer.close()
+
+def queue_totals(client_to_queue):
+    return [({}, sum(len(queue) for queue in list(client_to_queue.values())))]
+
+def queue_maxima(client_to_queue):
+    return [({}, max((len(queue) for queue in list(client_to_queue.values())), default=0))]
+
+def make_metrics(enabled, metrics_port):
+    # With a port the metrics are also served over HTTP, otherwise only to
+    # the admin through !metrics
+    if not enabled and metrics_port is None:
+        return NULL_METRICS
+    metrics = Metrics()
+    if metrics_port is not None:
+        metrics.serve_http(port=metrics_port)
+    return metrics
+
+def make_game_log(log_dir, name):
+    # Without a directory nothing is logged
+    if log_dir is None:
+        return NULL_LOG
+    return LogWriter().open(session_path(log_dir, name))
+
+def start_bridge_server(metrics=False, metrics_port=None, log_dir=None, snapshot_dir=None, host='0.0.0.0',
+                        port=2410):
+    server = BridgeTable(host, port, metrics=make_metrics(metrics, metrics_port),
+                         game_log=make_game_log(log_dir, "table"), snapshot_dir=snapshot_dir)
+    server.start()
+
+def start_async_bridge_server(metrics=False, metrics_port=None, log_dir=None, snapshot_dir=None, host='0.0.0.0',
+                              port=2410):
+    server = AsyncBridgeServer(host, port, metrics=make_metrics(metrics, metrics_port), log_dir=log_dir,
+                               snapshot_dir=snapshot_dir)
+    server.start()
+
+def main(argv=None):
+    # The fivepmbridge-server command. Only the standard library is needed,
+    # neither wxPython nor numpy is imported.
+    import argparse
+    parser = argparse.ArgumentParser(description="Run a bridge server.")
+    parser.add_argument("--lobby", action="store_true", help="run the asyncio server with a lobby of many tables")
+    parser.add_argument("--host", default='0.0.0.0')
+    parser.add_argument("--port", type=int, default=2410)
+    parser.add_argument("--metrics", action="store_true", help="collect metrics for the admin's !metrics")
+    parser.add_argument("--metrics-port", type=int, help="also serve the metrics over HTTP on this port")
+    parser.add_argument("--log-dir", help="log every table event to files in this directory")
+    parser.add_argument("--snapshot-dir", help="snapshot tables here and restore them on start")
+    parser.add_argument("--workers", type=int, help="run the lobby in this many worker processes behind a"
+                                                    " supervisor, 0 for one per core")
+    args = parser.parse_args(argv)
+
+    if args.workers is not None:
+        from fivepmbridge.bridge_supervisor import start_supervisor
+        start_supervisor(args.workers, args.metrics, args.metrics_port, args.log_dir, args.snapshot_dir,
+                         args.host, args.port)
+        return
+    start = start_async_bridge_server if args.lobby else start_bridge_server
+    start(args.metrics, args.metrics_port, args.log_dir, args.snapshot_dir, args.host, args.port)
+
+if __name__ == "__main__":
+    main()
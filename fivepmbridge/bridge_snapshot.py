@@ -0,0 +1,110 @@
+# Crash-safe table snapshots.
+#
+# A table's state is small (names, session tokens, dummy flags, the deal and
+# the calls and cards played since), so taking a snapshot is just copying a
+# handful of plain values while holding the table's lock. A SnapshotWriter
+# thread does that every interval for every table it is given, skips tables
+# whose state has not changed since the last write, and writes the rest as
+# JSON to a temporary file that is fsynced and renamed over the old snapshot.
+# A crash therefore leaves either the old snapshot or the new one, never a
+# partial file, and the game thread never waits on disk. Snapshots of tables
+# that are no longer listed are removed.
+
+import glob
+import json
+import os
+import re
+import threading
+import zlib
+
+SNAPSHOT_SUFFIX = ".json"
+
+
+def snapshot_path(snapshot_dir, name):
+    return os.path.join(snapshot_dir, name + SNAPSHOT_SUFFIX)
+
+
+def table_snapshot_name(table_id):
+    # Table ids are chosen by players, so only safe characters go in the
+    # file name and a checksum of the id keeps names distinct
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", table_id)[:64]
+    return f"table-{safe}-{zlib.crc32(table_id.encode()):08x}"
+
+
+def write_atomic(path, data):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def load_snapshot(path):
+    # None when there is no snapshot or it can't be read
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[SNAPSHOT] Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+
+def list_snapshots(snapshot_dir, prefix=""):
+    # name -> path for every snapshot in the directory
+    paths = glob.glob(os.path.join(glob.escape(snapshot_dir), glob.escape(prefix) + "*" + SNAPSHOT_SUFFIX))
+    return {os.path.basename(path)[:-len(SNAPSHOT_SUFFIX)]: path for path in sorted(paths)}
+
+
+def remove_snapshot(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SnapshotWriter:
+    # sources returns a list of (path, table) to snapshot; tables provide
+    # capture_state(), which must be cheap
+    def __init__(self, sources, interval=1.0):
+        self.sources = sources
+        self.interval = interval
+        self.last_written = {}
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write_all()
+
+    def write_all(self):
+        with self.lock:
+            sources = self.sources()
+            # Tables that have closed no longer need restoring
+            current = {path for path, _ in sources}
+            for path in [path for path in self.last_written if path not in current]:
+                remove_snapshot(path)
+                del self.last_written[path]
+            for path, table in sources:
+                state = table.capture_state()
+                if self.last_written.get(path) == state:
+                    continue
+                try:
+                    write_atomic(path, json.dumps(state, separators=(",", ":")).encode())
+                    self.last_written[path] = state
+                except OSError as e:
+                    print(f"[SNAPSHOT] Could not write {path}: {e}")
+
+    def stop(self):
+        # Writes one last round of snapshots
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.write_all()
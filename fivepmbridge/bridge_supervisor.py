@@ -0,0 +1,453 @@
+# Process-per-core sharding for the lobby server.
+#
+# One CPython process only runs game logic on one core, so a lobby of many
+# tables tops out at one core however big the host is. The supervisor starts
+# a worker process per core, each an AsyncBridgeServer with its own tables,
+# robots, logs and snapshots, and pins every table to one worker by a hash of
+# its id. Workers share nothing and game traffic never crosses processes.
+#
+# SO_REUSEPORT would spread connections over the workers, but the kernel
+# picks a worker before the client has named a table. So the supervisor
+# accepts every connection and answers lobby commands itself until the
+# client asks for a table (!create, !join, !watch) or a seat (!resume; session
+# tokens start with the number of the worker that gave them out). It then
+# passes the socket to that worker over a Unix socket, along with the command
+# and whatever the client has sent after it, and is out of the way from then
+# on. A worker hands a connection back the same way when its client asks for
+# a table on another worker.
+#
+# The same Unix sockets carry the control messages, one JSON packet each:
+# workers report their tables, the supervisor sends every worker the merged
+# listing for !tables and tells them when to shut down. A worker that dies is
+# started again, restoring its tables from snapshots when there are any.
+
+import asyncio
+import base64
+import json
+import os
+import signal
+import socket
+import zlib
+
+from fivepmbridge.bridge_framing import FrameReader, FrameTooLarge, encode_frame
+from fivepmbridge.bridge_protocol import PROTO_LEGACY, SUPPORTED_PROTOCOLS
+from fivepmbridge.bridge_robot import RobotPool
+from fivepmbridge.bridge_server import AsyncBridgeServer, BridgeLobby, format_table_listing, make_metrics
+
+# Reads drain everything a StreamReader can hold, so nothing is left behind
+# in it when a connection is handed on
+READ_SIZE = 1 << 20
+CONTROL_MESSAGE_SIZE = 1 << 18
+CONTROL_TIMEOUT = 1.0
+LISTING_INTERVAL = 0.25
+WORKER_CHECK_INTERVAL = 1.0
+SHUTDOWN_TIMEOUT = 5.0
+WELCOME = "[LOBBY] Welcome! Use !tables, !create <table> or !join <table>."
+
+
+def table_worker(table_id, workers):
+    return zlib.crc32(table_id.encode()) % workers
+
+
+def token_worker(token, workers):
+    # None for tokens no worker gave out
+    number, dot, _ = token.partition(".")
+    if not dot or not number.isdigit() or int(number) >= workers:
+        return None
+    return int(number)
+
+
+def command_worker(text, workers):
+    # The worker that has to handle a lobby command, or None when any of
+    # them can
+    words = text.split()
+    if len(words) < 2:
+        return None
+    if words[0] in ("!create", "!join", "!watch"):
+        return table_worker(words[1], workers)
+    if words[0] == "!resume":
+        return token_worker(words[1], workers)
+    return None
+
+
+def unread_frames(frames, reader):
+    # The bytes of frames not yet handled, followed by any partial frame
+    return b"".join(encode_frame(frame) for frame in frames) + reader.unread()
+
+
+def send_control(sock, message, fds=()):
+    data = json.dumps(message, separators=(",", ":")).encode()
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+def receive_control(sock):
+    # (message, fds); message is None once the other end has gone
+    data, fds, _, _ = socket.recv_fds(sock, CONTROL_MESSAGE_SIZE, 1)
+    return (json.loads(data) if data else None), fds
+
+
+def connection_message(op, name, proto, command, unread):
+    return {"op": op, "name": name, "proto": proto, "command": command,
+            "unread": base64.b64encode(unread).decode()}
+
+
+class WorkerLobby(BridgeLobby):
+    # One worker's part of the lobby. Commands for another worker's tables
+    # or seats leave the connection in handoffs for the worker to pass back,
+    # and !tables lists every worker's tables.
+    def __init__(self, index, workers, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = index
+        self.workers = workers
+        self.handoffs = {}
+        # The other workers' tables, as the supervisor last sent them
+        self.listing = []
+
+    def adopt_client(self, conn, name, proto):
+        with self.lobby_lock:
+            self.conn_to_name[conn] = name
+            self.conn_to_proto[conn] = proto
+
+    def parse_for_lobby_commands(self, text, conn):
+        worker = command_worker(text, self.workers)
+        if worker is None or worker == self.index:
+            return super().parse_for_lobby_commands(text, conn)
+        self.leave_table(conn)
+        self.handoffs[conn] = text
+        return True
+
+    def list_tables(self):
+        listing = [entry for entry in self.listing if table_worker(entry[0], self.workers) != self.index]
+        return format_table_listing(sorted(listing + self.table_listing()))
+
+
+class WorkerServer(AsyncBridgeServer):
+    # An AsyncBridgeServer without a listening socket; the supervisor passes
+    # it connections over control
+    def __init__(self, index, workers, control, **options):
+        self.index = index
+        self.workers = workers
+        self.control = control
+        super().__init__(**options)
+        self.session_prefix = f"{index}."
+        self.stopping = None
+        self.reported = None
+
+    def make_lobby(self, max_tables, metrics):
+        return WorkerLobby(self.index, self.workers, self.create_table, self.send_message, max_tables, metrics)
+
+    def owns_table(self, table_id):
+        return table_worker(table_id, self.workers) == self.index
+
+    def control_ready(self):
+        try:
+            message, fds = receive_control(self.control)
+        except OSError:
+            message, fds = None, []
+        if message is None:
+            # The supervisor has gone
+            self.stopping.set()
+        elif message["op"] == "adopt" and fds:
+            asyncio.create_task(self.adopt(socket.socket(fileno=fds.pop(0)), message))
+        elif message["op"] == "listing":
+            self.lobby.listing = [tuple(entry) for entry in message["tables"]]
+        elif message["op"] == "shutdown":
+            self.stopping.set()
+        for fd in fds:
+            os.close(fd)
+
+    async def report_tables(self):
+        while True:
+            listing = self.lobby.table_listing()
+            if listing != self.reported:
+                try:
+                    send_control(self.control, {"op": "tables", "tables": listing})
+                    self.reported = listing
+                except OSError as e:
+                    print(f"[WORKER {self.index}] Could not report tables: {e}")
+            await asyncio.sleep(LISTING_INTERVAL)
+
+    def handle_frames(self, writer, frames, reader):
+        # (command, unread bytes) once the connection has to be handed back
+        for i, data in enumerate(frames):
+            self.metrics.inc("bridge_frames_received_total")
+            self.metrics.inc("bridge_bytes_received_total", len(data))
+            self.lobby.handle_text(data.decode(), writer)
+            command = self.lobby.handoffs.pop(writer, None)
+            if command is not None:
+                return command, unread_frames(frames[i + 1:], reader)
+        return None
+
+    async def adopt(self, sock, message):
+        sock.setblocking(False)
+        reader, writer = await asyncio.open_connection(sock=sock)
+        addr = writer.get_extra_info('peername')
+        self.metrics.inc("bridge_connections_total")
+        queue, writer_task = self.open_client(writer)
+        self.lobby.adopt_client(writer, message["name"], message["proto"])
+        frames = FrameReader(None)
+        handoff = None
+        try:
+            received = [message["command"].encode()] + frames.feed(base64.b64decode(message["unread"]))
+            while True:
+                handoff = self.handle_frames(writer, received, frames)
+                if handoff is not None:
+                    break
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                received = frames.feed(data)
+        except FrameTooLarge as e:
+            print(f"[BAD FRAME] {addr}: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            if handoff is None:
+                await self.drop_client(writer, queue, writer_task)
+                print(f"[DISCONNECTED] {addr} disconnected.")
+            else:
+                await self.hand_back(writer, queue, writer_task, *handoff)
+
+    async def hand_back(self, writer, queue, writer_task, command, unread):
+        # Nothing more is read here; the supervisor gets the socket once
+        # everything queued for it has been written
+        writer.transport.pause_reading()
+        message = connection_message("return", self.lobby.conn_to_name.get(writer),
+                                     self.lobby.conn_to_proto.get(writer, PROTO_LEGACY), command, unread)
+        fd = os.dup(writer.get_extra_info('socket').fileno())
+        try:
+            self.lobby.remove_client(writer)
+            self.client_to_queue.pop(writer, None)
+            queue.close()
+            await writer_task
+            send_control(self.control, message, [fd])
+        except OSError as e:
+            print(f"[WORKER {self.index}] Could not hand a connection back: {e}")
+        finally:
+            os.close(fd)
+
+    async def serve(self):
+        self.stopping = asyncio.Event()
+        self.start_snapshots()
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.control, self.control_ready)
+        reporter = asyncio.create_task(self.report_tables())
+        print(f"[STARTED] Worker {self.index} of {self.workers} ready, pid {os.getpid()}")
+        await self.stopping.wait()
+        reporter.cancel()
+        loop.remove_reader(self.control)
+
+
+def run_worker(index, workers, control, metrics=False, metrics_port=None, **options):
+    # Robot processes are split between the workers rather than each worker
+    # starting one per core
+    robot_pool = RobotPool(max(1, ((os.cpu_count() or 2) - 1) // workers))
+    if metrics_port is not None:
+        metrics_port += index
+    server = WorkerServer(index, workers, control, metrics=make_metrics(metrics, metrics_port),
+                          robot_pool=robot_pool, **options)
+    server.owns_robot_pool = True
+    server.start()
+
+
+class Supervisor:
+    # Starts the workers, routes connections to them and restarts any that
+    # die. options are passed on to every WorkerServer.
+    def __init__(self, workers=None, host='0.0.0.0', port=2410, **options):
+        if not hasattr(socket, "send_fds"):
+            raise RuntimeError("Worker processes need Unix sockets that can pass connections")
+        # Only the supervisor needs multiprocessing
+        import multiprocessing
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.options = options
+        # Workers are forked from a clean server process rather than from
+        # the supervisor and its open connections
+        self.context = multiprocessing.get_context("forkserver")
+        self.processes = [None] * self.workers
+        self.controls = [None] * self.workers
+        self.worker_tables = [[] for _ in range(self.workers)]
+        self.listing = []
+        self.loop = None
+        self.stopping = None
+
+    def start_worker(self, index):
+        control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        control.settimeout(CONTROL_TIMEOUT)
+        worker_control.settimeout(CONTROL_TIMEOUT)
+        process = self.context.Process(target=run_worker, args=(index, self.workers, worker_control),
+                                       kwargs=self.options, name=f"bridge-worker-{index}")
+        process.start()
+        worker_control.close()
+        self.processes[index] = process
+        self.controls[index] = control
+        self.loop.add_reader(control, self.control_ready, index)
+
+    def stop_worker(self, index):
+        self.loop.remove_reader(self.controls[index])
+        self.controls[index].close()
+        self.controls[index] = None
+        self.worker_tables[index] = []
+        self.update_listing()
+
+    async def check_workers(self):
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    print(f"[WORKER {index}] Exited with code {process.exitcode}, restarting.")
+                    process.join()
+                    if self.controls[index] is not None:
+                        self.stop_worker(index)
+                    self.start_worker(index)
+
+    def control_ready(self, index):
+        try:
+            message, fds = receive_control(self.controls[index])
+        except OSError:
+            message, fds = None, []
+        if message is None:
+            # check_workers starts it again
+            self.stop_worker(index)
+        elif message["op"] == "tables":
+            self.worker_tables[index] = [tuple(entry) for entry in message["tables"]]
+            self.update_listing()
+        elif message["op"] == "return" and fds:
+            conn = socket.socket(fileno=fds.pop(0))
+            conn.setblocking(False)
+            self.loop.create_task(self.route(conn, message["name"], message["proto"], message["command"],
+                                             base64.b64decode(message["unread"])))
+        for fd in fds:
+            os.close(fd)
+
+    def update_listing(self):
+        listing = sorted(entry for tables in self.worker_tables for entry in tables)
+        if listing == self.listing:
+            return
+        self.listing = listing
+        for control in self.controls:
+            if control is not None:
+                try:
+                    send_control(control, {"op": "listing", "tables": listing})
+                except OSError:
+                    pass
+
+    def hand_off(self, worker, conn, name, proto, command, unread):
+        control = self.controls[worker]
+        if control is None:
+            return False
+        try:
+            send_control(control, connection_message("adopt", name, proto, command, unread), [conn.fileno()])
+        except OSError as e:
+            print(f"[WORKER {worker}] Could not hand over a connection: {e}")
+            return False
+        return True
+
+    async def send_message(self, conn, message):
+        await self.loop.sock_sendall(conn, encode_frame(message))
+
+    async def handle_lobby_text(self, conn, text, proto):
+        # Lobby commands that need no table; returns the connection's protocol
+        words = text.split()
+        command = words[0] if words else None
+        if command == "!tables":
+            await self.send_message(conn, format_table_listing(self.listing))
+        elif command == "!proto":
+            try:
+                proto = int(words[1])
+            except (IndexError, ValueError):
+                proto = PROTO_LEGACY
+            proto = proto if proto in SUPPORTED_PROTOCOLS else PROTO_LEGACY
+        elif command in ("!create", "!join", "!watch"):
+            await self.send_message(conn, f"^Usage: {command} <table>")
+        elif command == "!resume":
+            await self.send_message(conn, "^There is no seat waiting for that session." if len(words) > 1
+                                    else "^Usage: !resume <token> [last seq]")
+        elif command != "!leave":
+            await self.send_message(conn, "^Join a table first! Try !tables.")
+        return proto
+
+    async def route(self, conn, name, proto=PROTO_LEGACY, command=None, unread=b""):
+        # Answers the connection's lobby commands until one needs a worker
+        reader = FrameReader(None)
+        try:
+            received = reader.feed(unread)
+            if command is None:
+                await self.send_message(conn, WELCOME)
+            else:
+                received.insert(0, command.encode())
+            while True:
+                for i, data in enumerate(received):
+                    text = data.decode()
+                    worker = command_worker(text, self.workers)
+                    if worker is None:
+                        proto = await self.handle_lobby_text(conn, text, proto)
+                    elif self.hand_off(worker, conn, name, proto, text, unread_frames(received[i + 1:], reader)):
+                        return
+                    else:
+                        await self.send_message(conn, "^That table's server is restarting, try again shortly.")
+                data = await self.loop.sock_recv(conn, READ_SIZE)
+                if not data:
+                    return
+                received = reader.feed(data)
+        except FrameTooLarge as e:
+            print(f"[BAD FRAME] {name}: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            conn.close()
+
+    async def accept(self, listener):
+        while True:
+            conn, addr = await self.loop.sock_accept(listener)
+            conn.setblocking(False)
+            print(f"[NEW CONNECTION] {addr} connected.")
+            self.loop.create_task(self.route(conn, str(addr)))
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.loop.add_signal_handler(signal.SIGTERM, self.stopping.set)
+        for index in range(self.workers):
+            self.start_worker(index)
+        listener = socket.create_server((self.host, self.port), backlog=1024)
+        listener.setblocking(False)
+        print(f"[STARTED] Supervisor listening on {self.host}:{self.port} with {self.workers} workers")
+        tasks = [self.loop.create_task(self.accept(listener)), self.loop.create_task(self.check_workers())]
+        try:
+            await self.stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            listener.close()
+
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        print("[SHUTDOWN] Supervisor is shutting down.")
+        for control in self.controls:
+            if control is not None:
+                try:
+                    send_control(control, {"op": "shutdown"})
+                except OSError:
+                    pass
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(SHUTDOWN_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+def start_supervisor(workers=None, metrics=False, metrics_port=None, log_dir=None, snapshot_dir=None,
+                     host='0.0.0.0', port=2410):
+    # With a metrics port, worker n serves its metrics on metrics_port + n
+    Supervisor(workers, host, port, metrics=metrics, metrics_port=metrics_port, log_dir=log_dir,
+               snapshot_dir=snapshot_dir).start()
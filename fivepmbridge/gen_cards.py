@@ -1,4 +1,6 @@
 from PIL import Image, ImageDraw, ImageFont
+import argparse
+import json
 import os
 
 # Map Suit enum names to Unicode symbols
@@ -19,6 +21,24 @@ VALUE_STRINGS = {
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 CARD_DIR = os.path.join(THIS_DIR, 'cards')
+ATLAS_IMAGE = os.path.join(CARD_DIR, 'atlas.png')
+ATLAS_INDEX = os.path.join(CARD_DIR, 'atlas.json')
+
+# Sizes the GUI draws cards at, before rotation
+CARD_SIZE = (60, 90)
+COVERED_SIZE = (30, 90)
+# Clockwise rotations: 0 for the bottom hand, 90 for the left hand, 180 for
+# the top hand and 270 for the right hand
+ROTATIONS = {
+    0: None,
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
+SUIT_CODES = {'CLUBS': 'C', 'DIAMONDS': 'D', 'HEARTS': 'H', 'SPADES': 'S'}
+# Every sprite fits in a square cell once rotated
+ATLAS_CELL = 90
+ATLAS_COLUMNS = 24
 
 for v in range(1, 10):
     VALUE_STRINGS[v] = str(v+1)
@@ -126,10 +146,53 @@ def draw_card_back(full=True):
     img.save(output_path)
     print(f"Saved {output_path}")
 
-if __name__ == "__main__":
-    for suit in ['CLUBS', 'DIAMONDS', 'HEARTS', 'SPADES']:
+def atlas_sources():
+    # Atlas key (card code or "back", plus "_covered") and the PNG it is cut from
+    sources = []
+    for suit, code in SUIT_CODES.items():
         for value in range(1, 14):
-            draw_card(value, suit, full=True)
-            draw_card(value, suit, full=False)
-    draw_card_back(full=True)
-    draw_card_back(full=False)
\ No newline at end of file
+            sources.append((f"{code}{value}", f"{value}_of_{suit.lower()}.png"))
+            sources.append((f"{code}{value}_covered", f"{value}_of_{suit.lower()}_covered.png"))
+    sources.append(("back", "card_back.png"))
+    sources.append(("back_covered", "card_back_covered.png"))
+    return sources
+
+def build_atlas():
+    # Packs every face and back, scaled to display size, in all four
+    # rotations into one image. The index maps "<key>:<rotation>" to the
+    # sprite's [x, y, width, height].
+    sprites = []
+    for key, filename in atlas_sources():
+        size = COVERED_SIZE if key.endswith("_covered") else CARD_SIZE
+        with Image.open(os.path.join(CARD_DIR, filename)) as source:
+            img = source.convert('RGBA').resize(size, Image.LANCZOS)
+        for rotation, transpose in ROTATIONS.items():
+            sprites.append((f"{key}:{rotation}", img if transpose is None else img.transpose(transpose)))
+
+    rows = (len(sprites) + ATLAS_COLUMNS - 1) // ATLAS_COLUMNS
+    atlas = Image.new('RGBA', (ATLAS_COLUMNS * ATLAS_CELL, rows * ATLAS_CELL), (0, 0, 0, 0))
+    index = {}
+    for i, (key, img) in enumerate(sprites):
+        x = (i % ATLAS_COLUMNS) * ATLAS_CELL
+        y = (i // ATLAS_COLUMNS) * ATLAS_CELL
+        atlas.paste(img, (x, y))
+        index[key] = [x, y, img.width, img.height]
+
+    atlas.save(ATLAS_IMAGE)
+    with open(ATLAS_INDEX, 'w') as f:
+        json.dump({"image": os.path.basename(ATLAS_IMAGE), "sprites": index}, f, indent=1)
+    print(f"Saved {ATLAS_IMAGE} with {len(index)} sprites")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Draw the card images and pack them into the GUI atlas.")
+    parser.add_argument("--atlas-only", action="store_true", help="rebuild the atlas from the existing PNGs")
+    args = parser.parse_args()
+
+    if not args.atlas_only:
+        for suit in ['CLUBS', 'DIAMONDS', 'HEARTS', 'SPADES']:
+            for value in range(1, 14):
+                draw_card(value, suit, full=True)
+                draw_card(value, suit, full=False)
+        draw_card_back(full=True)
+        draw_card_back(full=False)
+    build_atlas()
\ No newline at end of file
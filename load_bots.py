@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+from fivepmbridge.bridge_bot import BridgeBot
+from fivepmbridge.bridge_client import BridgeClientCore
+from fivepmbridge.bridge_log import NULL_LOG, LogWriter, session_path
+from fivepmbridge.bridge_metrics import NULL_METRICS, Metrics
+from fivepmbridge.bridge_robot import RobotPool
+from fivepmbridge.bridge_server import BridgeTable, AsyncBridgeServer, ROBOT_MOVE_TIME
+
+
+def start_threaded(host, base_port, tables, metrics=NULL_METRICS, log_dir=None, log_writer=None,
+                   robot_move_time=ROBOT_MOVE_TIME):
+    # The tables stand in for one host's servers, so their robots share a pool
+    robot_pool = RobotPool()
+    servers = [BridgeTable(host, base_port + i, metrics=metrics,
+                           game_log=log_writer.open(session_path(log_dir, f"table-{base_port + i}"))
+                           if log_writer else NULL_LOG,
+                           robot_pool=robot_pool, robot_move_time=robot_move_time, robot_pause=0.0)
+               for i in range(tables)]
+    for server in servers:
+        threading.Thread(target=server.start, daemon=True).start()
+    return [(base_port + i, None) for i in range(tables)]
+
+
+def start_async(host, port, tables, metrics=NULL_METRICS, log_dir=None, robot_move_time=ROBOT_MOVE_TIME):
+    server = AsyncBridgeServer(host, port, metrics=metrics, log_dir=log_dir, robot_move_time=robot_move_time,
+                               robot_pause=0.0)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True).start()
+    return [(port, f"table{i}") for i in range(tables)], server.log_writer
+
+
+def start_supervisor(host, port, tables, workers, log_dir=None):
+    # The supervisor forks its workers, so it gets a process of its own
+    command = [sys.executable, "-m", "fivepmbridge.bridge_server", "--host", host, "--port", str(port),
+               "--workers", str(workers)]
+    if log_dir:
+        command += ["--log-dir", log_dir]
+    return [(port, f"table{i}") for i in range(tables)], subprocess.Popen(command)
+
+
+class Spectator(BridgeClientCore):
+    # Watches one table and counts the states it is sent
+    def __init__(self, host, port, table_id=None):
+        super().__init__(host, port)
+        self.table_id = table_id
+        self.states = 0
+
+    def connect(self):
+        if not super().connect():
+            return False
+        self.send_message("!watch" if self.table_id is None else f"!watch {self.table_id}")
+        return True
+
+    def on_state(self, names, hands, played_cards):
+        self.states += 1
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def wait_for_seats(bots, timeout):
+    # A bot is seated some time after it connects
+    deadline = time.perf_counter() + timeout
+    while any(bot.session_token is None for bot in bots) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+
+def run_tables(host, seats, boards, timeout, spectators=0, robots=0):
+    # seats is one (port, lobby table id or None) per table; robots take the
+    # last robots seats at every table
+    bots = []
+    watchers = []
+    start = time.perf_counter()
+    for table, (port, table_id) in enumerate(seats):
+        for seat in range(4 - robots):
+            join = None if table_id is None else ("join" if seat else "create", table_id)
+            bot = BridgeBot(host, port, boards=boards, seed=table * 4 + seat, join=join)
+            bots.append(bot)
+            bot.connect()
+            if seat == 0:
+                # The first bot at a table has to be the admin
+                time.sleep(0.05)
+                admin = bot
+        if robots:
+            # The robots fill the seats no bot took, once every bot has one
+            wait_for_seats(bots[-(4 - robots):], timeout)
+            admin.send_message("!robot")
+        if spectators:
+            # Once the robots have sat down, so no seat is left empty for a
+            # spectator to take. Robots only give theirs up to players who
+            # ask for one.
+            time.sleep(0.05)
+        for _ in range(spectators):
+            watcher = Spectator(host, port, table_id)
+            watcher.connect()
+            watchers.append(watcher)
+    for bot in bots:
+        bot.done.wait(max(0.0, timeout - (time.perf_counter() - start)))
+    elapsed = time.perf_counter() - start
+    for client in bots + watchers:
+        client.disconnect()
+    return bots, elapsed, watchers
+
+
+def report(bots, elapsed, tables, boards, watchers=()):
+    latencies = [latency for bot in bots for latency in bot.latencies]
+    actions = sum(bot.actions for bot in bots)
+    errors = sum(bot.errors for bot in bots)
+    unfinished = sum(not bot.done.is_set() for bot in bots)
+    finished_tables = min(bot.tricks_seen for bot in bots) // 13
+    print(f"{tables} tables x {boards} boards in {elapsed:.2f} s")
+    print(f"  throughput {actions / elapsed:10.1f} actions/s {tables * boards / elapsed:8.2f} boards/s")
+    print(f"  latency    p50 {percentile(latencies, 0.5) * 1000:7.2f} ms p99 {percentile(latencies, 0.99) * 1000:7.2f} ms"
+          f" ({len(latencies)} actions timed)")
+    print(f"  errors     {errors} ({unfinished} bots unfinished, slowest table finished {finished_tables} boards)")
+    if watchers:
+        states = [watcher.states for watcher in watchers]
+        print(f"  spectators {len(watchers)} received {sum(states)} states, {min(states)} to {max(states)} each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play bot tables against a local bridge server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=24300)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--boards", type=int, default=2)
+    parser.add_argument("--server", choices=["threaded", "async", "supervisor", "none"], default="threaded",
+                        help="server to start; none plays against one already running on --port")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--metrics", action="store_true", help="instrument the server and print its metrics")
+    parser.add_argument("--log-dir", help="write a game log per table to this directory")
+    parser.add_argument("--spectators", type=int, default=0, help="spectators watching each table")
+    parser.add_argument("--robots", type=int, choices=range(4), default=0, help="robot seats at each table")
+    parser.add_argument("--robot-move-time", type=float, default=ROBOT_MOVE_TIME,
+                        help="longest a robot thinks about a card, in seconds")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes for --server supervisor, 0 for one per core")
+    args = parser.parse_args()
+
+    metrics = Metrics() if args.metrics else NULL_METRICS
+    log_writer = None
+    supervisor = None
+    if args.server == "threaded":
+        log_writer = LogWriter() if args.log_dir else None
+        seats = start_threaded(args.host, args.port, args.tables, metrics, args.log_dir, log_writer,
+                               args.robot_move_time)
+    elif args.server == "async":
+        seats, log_writer = start_async(args.host, args.port, args.tables, metrics, args.log_dir,
+                                        args.robot_move_time)
+    elif args.server == "supervisor":
+        seats, supervisor = start_supervisor(args.host, args.port, args.tables, args.workers, args.log_dir)
+        time.sleep(1.5)
+    else:
+        seats = [(args.port, f"table{i}") for i in range(args.tables)]
+    time.sleep(0.5)
+    bots, elapsed, watchers = run_tables(args.host, seats, args.boards, args.timeout, args.spectators, args.robots)
+    report(bots, elapsed, args.tables, args.boards, watchers)
+    if supervisor is not None:
+        supervisor.terminate()
+        supervisor.wait()
+    if log_writer is not None:
+        log_writer.flush()
+    if metrics.enabled:
+        print(metrics.render())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import threading
+import time
+
+from fivepmbridge.bridge_server import BridgeTable, AsyncBridgeServer
+
+MARKER = "load-test"
+
+
+async def read_frame(reader):
+    length = int.from_bytes(await reader.readexactly(4), byteorder='big')
+    return (await reader.readexactly(length)).decode()
+
+
+def frame(text):
+    data = text.encode()
+    return len(data).to_bytes(4, byteorder='big') + data
+
+
+async def run_clients(host, ports, tables, messages, lobby=False):
+    # ports has one entry per table (threaded) or a single shared port (async)
+    connections = []
+    start = time.perf_counter()
+    for table in range(tables):
+        port = ports[table % len(ports)]
+        for seat in range(4):
+            reader, writer = await asyncio.open_connection(host, port)
+            if lobby:
+                await read_frame(reader)  # lobby welcome
+                writer.write(frame(f"!{'join' if seat else 'create'} table{table}"))
+            await read_frame(reader)  # admin / regular player greeting
+            connections.append((reader, writer))
+    connect_time = time.perf_counter() - start
+
+    # Every chat message is broadcast to the four players at its table
+    expected = messages * 4
+
+    async def drain(reader):
+        seen = 0
+        while seen < expected:
+            if MARKER in await read_frame(reader):
+                seen += 1
+
+    start = time.perf_counter()
+    readers = [asyncio.create_task(drain(reader)) for reader, _ in connections]
+    for i in range(messages):
+        for _, writer in connections:
+            writer.write(frame(f"{MARKER} {i}"))
+        await asyncio.gather(*(writer.drain() for _, writer in connections))
+    await asyncio.gather(*readers)
+    message_time = time.perf_counter() - start
+
+    for _, writer in connections:
+        writer.close()
+    return len(connections), connect_time, len(connections) * messages, message_time
+
+
+def start_threaded(host, base_port, tables):
+    servers = [BridgeTable(host, base_port + i) for i in range(tables)]
+    for server in servers:
+        threading.Thread(target=server.start, daemon=True).start()
+    return servers, [base_port + i for i in range(tables)]
+
+
+def start_async(host, port):
+    server = AsyncBridgeServer(host, port)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True).start()
+    return server, [port]
+
+
+def report(label, result):
+    connections, connect_time, sent, message_time = result
+    print(f"{label:>9}: {connections / connect_time:10.1f} conn/s"
+          f" {sent / message_time:10.1f} msg/s"
+          f" ({connections} connections, {sent} messages sent, {sent * 4} delivered)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare threaded and asyncio bridge servers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=24100)
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+
+    _, ports = start_threaded(args.host, args.port, args.tables)
+    time.sleep(0.5)
+    report("threaded", asyncio.run(run_clients(args.host, ports, args.tables, args.messages)))
+
+    _, ports = start_async(args.host, args.port + args.tables)
+    time.sleep(0.5)
+    report("asyncio", asyncio.run(run_clients(args.host, ports, args.tables, args.messages, lobby=True)))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,18 @@ setup(
     author='Thomas Nascenzi',
     author_email='thomasnascenzi@yahoo.com',
     include_package_data=True,
-    install_requires=[
-        "wxPython",
-        "numpy"
-    ],
+    # CardSet counts cards with int.bit_count
+    python_requires=">=3.10",
+    # The server needs only the standard library
+    install_requires=[],
+    extras_require={
+        "server": [],
+        "gui": ["wxPython"],
+        "analysis": ["numpy"],
+    },
+    entry_points={
+        "console_scripts": ["fivepmbridge-server=fivepmbridge.bridge_server:main"],
+        "gui_scripts": ["fivepmbridge-client=fivepmbridge.bridge_gui:main"],
+    },
     description='Nascenzi developed tool for playing bridge',
 )
@@ -1,3 +1,5 @@
 from fivepmbridge import start_bridge_server
 
-start_bridge_server()
\ No newline at end of file
+# Robots think in worker processes, which import this file again
+if __name__ == "__main__":
+    start_bridge_server()
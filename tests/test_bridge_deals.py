@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from fivepmbridge.bridge_game import Suit, SUIT_ORDER
+from fivepmbridge.bridge_deals import (SOUTH, NORTH, EAST, deal_batch, generate_deals, hcp_range, suit_length,
+                                       balanced, partnership_hcp)
+
+CONSTRAINTS = (hcp_range(NORTH, 15, 17), balanced(NORTH), suit_length(EAST, Suit.SPADES, 6),
+               partnership_hcp(SOUTH, 20))
+
+
+def test_every_seat_gets_thirteen_cards():
+    batch = deal_batch(200, seed=1)
+    assert (batch.lengths.sum(axis=2) == 13).all()
+    for i in range(len(batch)):
+        masks = batch.masks(i)
+        assert sum(masks) == (1 << 52) - 1 and [mask.bit_count() for mask in masks] == [13] * 4
+
+
+def test_generated_deals_meet_the_constraints():
+    deals = generate_deals(30, *CONSTRAINTS, seed=7, batch_size=20000)
+    assert len(deals) == 30
+    for i in range(len(deals)):
+        # Checked against bridge_game's own counts, not the batch arrays
+        hands = deals.hands(i)
+        assert 15 <= hands[NORTH].hcp() <= 17
+        shape = sorted((hands[NORTH].suit_length(suit) for suit in SUIT_ORDER), reverse=True)
+        assert shape in ([4, 3, 3, 3], [4, 4, 3, 2], [5, 3, 3, 2])
+        assert hands[EAST].suit_length(Suit.SPADES) >= 6
+        assert hands[NORTH].hcp() + hands[SOUTH].hcp() >= 20
+
+
+def test_a_seed_reproduces_the_same_deals():
+    first = generate_deals(10, *CONSTRAINTS, seed=7, batch_size=20000)
+    again = generate_deals(10, *CONSTRAINTS, seed=7, batch_size=20000)
+    other = generate_deals(10, *CONSTRAINTS, seed=8, batch_size=20000)
+    assert (first.owners == again.owners).all()
+    assert first.masks(0) == again.masks(0)
+    assert not (first.owners == other.owners).all()
@@ -0,0 +1,80 @@
+import socket
+import threading
+
+import pytest
+
+from fivepmbridge.bridge_framing import FrameTooLarge, FrameReader, encode_frame, send_frames
+
+MESSAGES = [b"", "hello", b"\xff" + bytes(range(200)), "é" * 3000, b"x" * 70000]
+PAYLOADS = [m if isinstance(m, bytes) else m.encode() for m in MESSAGES]
+STREAM = b"".join(encode_frame(m) for m in MESSAGES)
+
+
+def test_reader_fed_one_byte_at_a_time():
+    reader = FrameReader(None, buffer_size=16)
+    frames = []
+    for i in range(len(STREAM)):
+        frames += reader.feed(STREAM[i:i + 1])
+    assert frames == PAYLOADS
+    assert reader.unread() == b""
+
+
+@pytest.mark.parametrize("chunk", [3, 1000, len(STREAM)])
+def test_reader_fed_coalesced_chunks(chunk):
+    reader = FrameReader(None, buffer_size=64)
+    frames = []
+    for i in range(0, len(STREAM), chunk):
+        frames += reader.feed(STREAM[i:i + chunk])
+    assert frames == PAYLOADS
+
+
+def test_reader_keeps_a_partial_frame_unread():
+    reader = FrameReader(None)
+    partial = encode_frame("pending")[:6]
+    assert reader.feed(encode_frame("done") + partial) == [b"done"]
+    assert reader.unread() == partial
+
+
+def test_reader_reads_a_socket_a_byte_at_a_time():
+    left, right = socket.socketpair()
+    def trickle():
+        for i in range(len(STREAM)):
+            left.sendall(STREAM[i:i + 1])
+    sender = threading.Thread(target=trickle)
+    sender.start()
+    reader = FrameReader(right, buffer_size=16)
+    frames = []
+    while len(frames) < len(PAYLOADS):
+        frames += reader.read_frames()
+    sender.join(5)
+    assert frames == PAYLOADS
+    left.close()
+    right.close()
+
+
+def test_reader_reads_frames_sent_together():
+    left, right = socket.socketpair()
+    send_frames(left, [encode_frame(m) for m in MESSAGES[:3]])
+    left.close()
+    reader = FrameReader(right)
+    assert reader.read_frames() == PAYLOADS[:3]
+    with pytest.raises(ConnectionError):
+        reader.read_frames()
+    right.close()
+
+
+def test_oversized_length_prefix_is_rejected():
+    reader = FrameReader(None, max_frame_size=1024)
+    with pytest.raises(FrameTooLarge):
+        reader.feed((1025).to_bytes(4, byteorder='big'))
+
+
+def test_oversized_frame_from_a_socket_is_rejected_before_reading_it():
+    left, right = socket.socketpair()
+    left.sendall((2 ** 32 - 1).to_bytes(4, byteorder='big'))
+    reader = FrameReader(right)
+    with pytest.raises(FrameTooLarge):
+        reader.read_frames()
+    assert len(reader.buffer) == 65536
+    left.close()
+    right.close()
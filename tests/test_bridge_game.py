@@ -0,0 +1,100 @@
+import pytest
+
+from fivepmbridge.bridge_game import (PASS, DOUBLE, REDOUBLE, TEXT_TO_CALL, Auction, CardPlay, CardSet, Contract,
+                                      ContractBridge, Suit)
+
+
+def test_no_deal_until_four_players_are_seated():
+    players = ["north", "east"]
+    game = ContractBridge(players)
+    assert not game.deal()
+    assert game.state.boards_dealt == 0
+
+    players += ["south", "west"]
+    assert game.deal()
+    assert game.deal()
+    assert game.state.boards_dealt == 2
+    assert sorted(len(game.state.hand(player)) for player in players) == [13] * 4
+
+
+def calls(*texts):
+    return [TEXT_TO_CALL[text] for text in texts]
+
+
+def test_bid_must_outrank_the_last_one():
+    auction = Auction(dealer=0)
+    assert auction.make_call(0, TEXT_TO_CALL["1h"])
+    assert not auction.is_legal(TEXT_TO_CALL["1c"])
+    assert not auction.is_legal(TEXT_TO_CALL["1h"])
+    assert auction.is_legal(TEXT_TO_CALL["1s"])
+    # Out of turn
+    assert not auction.make_call(2, TEXT_TO_CALL["2h"])
+
+
+def test_only_the_opponents_double_and_only_the_bidders_redouble():
+    auction = Auction.from_calls(0, calls("1h", "p"))
+    # Partner of the bidder
+    assert not auction.is_legal(DOUBLE)
+    auction = Auction.from_calls(0, calls("1h"))
+    assert not auction.is_legal(REDOUBLE)
+    assert auction.make_call(1, DOUBLE)
+    assert not auction.is_legal(DOUBLE)
+    assert auction.make_call(2, PASS)
+    # The doubler's partner
+    assert not auction.is_legal(REDOUBLE)
+    assert auction.make_call(3, PASS)
+    assert auction.make_call(0, REDOUBLE)
+    with pytest.raises(ValueError):
+        Auction.from_calls(0, calls("1h", "x", "p", "xx"))
+
+
+def test_declarer_is_who_named_the_strain_first():
+    auction = Auction.from_calls(1, calls("1h", "1s", "4h", "p", "p", "p"))
+    contract = auction.contract()
+    assert (contract.level, contract.strain, contract.doubled) == (4, Suit.HEARTS, PASS)
+    # Seat 1 opened hearts, partner seat 3 raised
+    assert contract.declarer == 1
+    assert contract.dummy == 3
+
+
+def test_doubled_contract_ends_after_three_passes():
+    auction = Auction.from_calls(0, calls("1c", "x", "p", "p", "p"))
+    assert auction.is_over
+    assert auction.contract().doubled == DOUBLE
+    assert auction.legal_calls() == []
+
+
+def test_passed_out_board_has_no_contract():
+    auction = Auction.from_calls(2, calls("p", "p", "p"))
+    assert not auction.is_over
+    assert auction.make_call(1, PASS)
+    assert auction.is_over and auction.passed_out
+    assert auction.contract() is None
+
+
+def test_players_must_follow_suit_and_trumps_win():
+    hands = [CardSet(["H4", "D3"]), CardSet(["H5", "C2"]), CardSet(["S1", "C5"]), CardSet(["H13", "C4"])]
+    play = CardPlay(hands, Contract(1, Suit.SPADES, PASS, 0))
+    assert play.turn == 1
+    assert not play.play_card(2, "S1")
+    assert play.play_card(1, "H5")
+    # Void in hearts, so seat 2 may ruff
+    assert play.play_card(2, "S1")
+    assert not play.play_card(3, "C4")
+    assert play.play_card(3, "H13")
+    assert play.winner() is None
+    assert play.play_card(0, "H4")
+
+    assert play.winner() == 2
+    assert play.take_trick() == 2
+    assert play.tricks == [1, 0]
+    assert play.turn == 2
+
+
+def test_highest_card_of_the_led_suit_wins_without_trumps():
+    hands = [CardSet(["C13"]), CardSet(["D2"]), CardSet(["S13"]), CardSet(["D12"])]
+    play = CardPlay(hands, Contract(3, Suit.NO_TRUMP, PASS, 0))
+    for seat, card in ((1, "D2"), (2, "S13"), (3, "D12"), (0, "C13")):
+        assert play.play_card(seat, card)
+    assert play.take_trick() == 3
+    assert play.declarer_tricks == 0
@@ -0,0 +1,84 @@
+import random
+
+from fivepmbridge.bridge_game import TEXT_TO_CALL, Auction, CardPlay, CardSet, deal_masks
+from fivepmbridge.bridge_log import INDEX_SUFFIX, INDEX_ENTRY, LogWriter, GameLogReader
+
+
+def log_board(log, board):
+    # Logs a 1NT by seat 0, every seat playing its first legal card
+    masks = deal_masks(random.Random(board))
+    log.deal(board, 0, masks)
+    auction = Auction(0)
+    for seat, text in enumerate(["1n", "p", "p", "p"]):
+        auction.make_call(seat, TEXT_TO_CALL[text])
+        log.bid(seat, TEXT_TO_CALL[text])
+    play = CardPlay([CardSet(mask) for mask in masks], auction.contract())
+    while not play.is_over:
+        while play.turn is not None:
+            seat = play.turn
+            card = next(card for card in play.hands[seat] if play.can_play(seat, card))
+            play.play_card(seat, card)
+            log.play(seat, card)
+        log.trick(play.take_trick())
+    return play
+
+
+def write_log(path, boards):
+    writer = LogWriter()
+    log = writer.open(str(path))
+    log.name(0, "north")
+    plays = [log_board(log, board) for board in boards]
+    log.close()
+    writer.close()
+    return plays
+
+
+def test_replays_every_board_and_trick(tmp_path):
+    path = tmp_path / "table.fpblog"
+    plays = write_log(path, [1, 2])
+    with GameLogReader(str(path)) as reader:
+        assert reader.boards == [1, 2]
+        assert sorted(reader.index[2]) == list(range(14))
+        replay = reader.replay(2)
+        assert replay.card_play.tricks == plays[1].tricks
+        events = reader.trick_events(2, 5)
+        assert [event[0] for event in events] == ["play"] * 4 + ["trick"]
+        replay = reader.replay(1, before_trick=7)
+        assert sum(replay.card_play.tricks) == 6
+        assert [len(hand) for hand in replay.hands] == [7] * 4
+
+
+def test_truncated_index_is_rebuilt_from_the_log(tmp_path):
+    path = tmp_path / "table.fpblog"
+    write_log(path, [1, 2, 3])
+    with GameLogReader(str(path)) as reader:
+        full_index = reader.index
+    index_path = str(path) + INDEX_SUFFIX
+    with open(index_path, "rb") as f:
+        data = f.read()
+    # Keep the first board and a half-written entry
+    with open(index_path, "wb") as f:
+        f.write(data[:15 * INDEX_ENTRY.size + 5])
+    with GameLogReader(str(path)) as reader:
+        assert reader.boards == [1, 2, 3]
+        assert reader.index == full_index
+        assert sum(reader.replay(3).card_play.tricks) == 13
+
+
+def test_log_cut_short_mid_record_replays_up_to_the_cut(tmp_path):
+    path = tmp_path / "table.fpblog"
+    write_log(path, [1, 2])
+    with GameLogReader(str(path)) as reader:
+        cut = reader.index[2][9] + 3
+    with open(path, "r+b") as f:
+        f.truncate(cut)
+    with GameLogReader(str(path)) as reader:
+        assert reader.boards == [1, 2]
+        assert max(reader.index[2]) == 9
+        assert reader.trick_events(2, 9) == []
+        assert [event[0] for event in reader.trick_events(2, 8)] == ["play"] * 4 + ["trick"]
+        replay = reader.replay(2)
+        assert sum(replay.card_play.tricks) == 8
+        assert [len(hand) for hand in replay.hands] == [5] * 4
+        assert sum(reader.replay(1).card_play.tricks) == 13
+        assert list(reader.events())[-1][0] == "trick"
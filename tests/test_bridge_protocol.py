@@ -0,0 +1,95 @@
+import pytest
+
+from fivepmbridge.bridge_game import PASS, DOUBLE, REDOUBLE, FIRST_BID, CALL_COUNT, Auction
+from fivepmbridge.bridge_protocol import (encode_name, encode_snapshot, encode_delta, encode_binary_snapshot,
+                                          decode_message, decode_text, decode_binary, mask_to_codes,
+                                          encode_binary_delta, is_binary, TableState, APPLIED, STALE, GAP,
+                                          BINARY_VERSION, SPECTATOR)
+
+
+def test_long_name_is_cut_on_a_character_boundary():
+    data = encode_name("é" * 200)
+    assert data[0] == len(data) - 1 <= 255
+    assert data[1:].decode() == "é" * 127
+
+
+def longest_auction():
+    # Every bid passed round to a double, then to a redouble
+    calls = [PASS] * 3
+    for bid in range(FIRST_BID, CALL_COUNT):
+        calls += [bid, PASS, PASS, DOUBLE, PASS, PASS, REDOUBLE, PASS, PASS]
+    return bytes(calls + [PASS])
+
+
+def test_longest_auction_round_trips_in_binary():
+    calls = longest_auction()
+    assert len(calls) == 319 and Auction.from_calls(0, calls).is_over
+    data = encode_binary_snapshot(9, 0, [("north", 0, None)], (0, calls))
+    assert decode_binary(data)[4] == (0, calls)
+
+
+HAND = mask_to_codes(0b1000000000011_0000000010100_0100000000000_0000000000111)
+SEATS = [("north", HAND, "S13"), ("east", 12, None), ("south", 13, None), ("west", 0, "C2")]
+DECODED_SEATS = [("north", HAND, "S13"), ("east", ["b"] * 12, None),
+                 ("south", ["b"] * 13, None), ("west", [], "C2")]
+AUCTION = (1, bytes([PASS, FIRST_BID, DOUBLE, REDOUBLE]))
+
+DELTAS = [
+    ("play", 2, "H7", "H7"),
+    ("trick", 0, None, None),
+    ("dummy", 3, HAND, HAND),
+    ("name", 1, "east player", "east player"),
+    ("bid", 2, CALL_COUNT - 1, CALL_COUNT - 1),
+]
+
+
+@pytest.mark.parametrize("auction", [None, AUCTION])
+def test_text_snapshot_round_trips(auction):
+    text = encode_snapshot(41, 2, SEATS, auction)
+    assert decode_message(text) == ("snapshot", 41, 2, DECODED_SEATS, auction)
+
+
+@pytest.mark.parametrize("event, seat, arg, decoded", DELTAS)
+def test_text_delta_round_trips(event, seat, arg, decoded):
+    text = encode_delta(7, event, seat, arg)
+    assert decode_message(text) == ("delta", 7, event, seat, decoded)
+
+
+def test_text_bid_delta_rejects_unknown_call():
+    with pytest.raises(ValueError):
+        decode_text("#D 3 bid 0 8c")
+
+
+def test_table_state_applies_deltas_in_sequence():
+    state = TableState()
+    assert state.apply(encode_delta(5, "play", 0, "S13")) == GAP
+    assert state.apply(encode_snapshot(5, 0, SEATS, AUCTION)) == APPLIED
+    assert state.apply(encode_delta(6, "play", 1, "D4")) == APPLIED
+    assert state.hands[1] == ["b"] * 11 and state.played_cards[1] == "D4"
+    assert state.apply(encode_delta(6, "trick", 1)) == STALE
+    assert state.apply(encode_delta(8, "trick", 1)) == GAP
+    assert state.apply(encode_delta(7, "trick", 1)) == APPLIED
+    assert state.played_cards == [None] * 4
+
+
+@pytest.mark.parametrize("my_seat", [0, SPECTATOR])
+@pytest.mark.parametrize("auction", [None, AUCTION])
+def test_binary_snapshot_round_trips(my_seat, auction):
+    data = encode_binary_snapshot(2 ** 32 - 1, my_seat, SEATS, auction)
+    assert is_binary(data)
+    assert decode_message(data) == ("snapshot", 2 ** 32 - 1, my_seat, DECODED_SEATS, auction)
+
+
+@pytest.mark.parametrize("event, seat, arg, decoded", DELTAS)
+def test_binary_delta_round_trips(event, seat, arg, decoded):
+    data = encode_binary_delta(7, event, seat, arg)
+    assert decode_message(data) == ("delta", 7, event, seat, decoded)
+
+
+def test_binary_rejects_other_versions_and_truncation():
+    data = bytearray(encode_binary_snapshot(1, 0, SEATS, AUCTION))
+    with pytest.raises(ValueError):
+        decode_binary(bytes(data[:-1]))
+    data[1] = BINARY_VERSION - 1
+    with pytest.raises(ValueError, match="version"):
+        decode_binary(bytes(data))
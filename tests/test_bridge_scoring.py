@@ -0,0 +1,52 @@
+import pytest
+
+from fivepmbridge.bridge_game import PASS, DOUBLE, REDOUBLE, Contract, Suit
+from fivepmbridge.bridge_scoring import (board_vulnerability, contract_index, imps, matchpoints, score_boards,
+                                         score_contract)
+
+# The tables, IMPs and matchpoints need numpy
+pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("level, strain, doubled, vulnerable, tricks, score", [
+    (4, Suit.HEARTS, PASS, True, 10, 620),
+    (4, Suit.HEARTS, PASS, False, 10, 420),
+    (3, Suit.NO_TRUMP, PASS, False, 10, 430),
+    (1, Suit.CLUBS, DOUBLE, False, 3, -800),
+    (1, Suit.CLUBS, DOUBLE, True, 3, -1100),
+    (2, Suit.SPADES, DOUBLE, False, 8, 470),
+    (1, Suit.DIAMONDS, REDOUBLE, False, 7, 230),
+    (6, Suit.SPADES, PASS, True, 12, 1430),
+    (7, Suit.NO_TRUMP, PASS, False, 13, 1520),
+    (3, Suit.DIAMONDS, PASS, True, 7, -200),
+    (1, Suit.HEARTS, PASS, False, 7, 80),
+])
+def test_duplicate_scores(level, strain, doubled, vulnerable, tricks, score):
+    contract = Contract(level, strain, doubled, 0)
+    assert score_contract(contract, tricks, vulnerable) == score
+    # The tables agree with the single board scorer
+    assert score_boards(*[[value] for value in contract_index(contract, tricks, vulnerable)])[0] == score
+
+
+def test_passed_out_board_scores_nothing():
+    assert score_contract(None, 0, True) == 0
+
+
+def test_vulnerability_repeats_every_16_boards():
+    assert board_vulnerability(1) == (False, False)
+    assert board_vulnerability(4) == (True, True)
+    assert board_vulnerability(17) == board_vulnerability(1)
+
+
+@pytest.mark.parametrize("difference, expected", [
+    (0, 0), (10, 0), (20, 1), (-20, -1), (40, 1), (50, 2),
+    (3990, 23), (4000, 24), (-4000, -24), (9000, 24),
+])
+def test_imp_boundaries(difference, expected):
+    assert imps(difference) == expected
+
+
+def test_matchpoints_share_ties():
+    points, percentages = matchpoints([[420, 420, 170, 450]])
+    assert points.tolist() == [[3, 3, 0, 6]]
+    assert percentages.tolist() == [[50.0, 50.0, 0.0, 100.0]]
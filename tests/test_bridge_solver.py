@@ -0,0 +1,84 @@
+import random
+from functools import lru_cache
+
+import pytest
+
+from fivepmbridge.bridge_game import DECK, STRAINS, Suit
+from fivepmbridge.bridge_solver import DoubleDummySolver, solve_all
+
+
+def random_ending(seed, cards):
+    deck = list(range(52))
+    random.Random(seed).shuffle(deck)
+    return tuple(sum(1 << index for index in deck[seat * cards:(seat + 1) * cards]) for seat in range(4))
+
+
+def brute_force(hands, trump, leader):
+    # Plain minimax over every legal card, trick winners from Card.is_better
+    return tricks_from(hands, leader, trump)
+
+
+@lru_cache(maxsize=None)
+def tricks_from(hands, leader, trump):
+    if not hands[leader]:
+        return 0
+    return play_out(hands, leader, (), trump)
+
+
+def play_out(hands, leader, trick, trump):
+    seat = (leader + len(trick)) % 4
+    hand = hands[seat]
+    cards = [DECK[index] for index in range(52) if hand >> index & 1]
+    if trick:
+        lead_suit = trick[0].suit
+        if any(card.suit == lead_suit for card in cards):
+            cards = [card for card in cards if card.suit == lead_suit]
+    values = []
+    for card in cards:
+        after = list(hands)
+        after[seat] ^= 1 << card.index
+        after = tuple(after)
+        played = trick + (card,)
+        if len(played) < 4:
+            values.append(play_out(after, leader, played, trump))
+            continue
+        best = 0
+        for offset in range(1, 4):
+            if played[offset].is_better(played[best], played[0].suit, trump):
+                best = offset
+        winner = (leader + best) % 4
+        values.append((winner % 2 == 0) + tricks_from(after, winner, trump))
+    return max(values) if seat % 2 == 0 else min(values)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_solver_matches_brute_force_on_small_endings(seed):
+    # Four card endings take brute force longest, so there are fewer of them
+    cards = (2, 3, 2, 3, 4)[seed % 5]
+    hands = random_ending(seed, cards)
+    for trump in STRAINS:
+        solver = DoubleDummySolver(list(hands), trump)
+        for leader in range(4):
+            expected = brute_force(hands, trump, leader)
+            assert solver.solve(leader) == (expected, cards - expected), (trump, leader)
+
+
+def test_solve_all_covers_every_strain_and_leader():
+    hands = random_ending(7, 3)
+    results = solve_all(list(hands))
+    assert len(results) == 20
+    for (trump, leader), tricks in results.items():
+        assert tricks == brute_force(hands, trump, leader)
+
+
+def test_solving_a_position_part_way_through_a_trick():
+    hands = random_ending(11, 3)
+    solver = DoubleDummySolver(list(hands), Suit.SPADES)
+    # The best lead is worth what the whole deal is
+    leads = []
+    for index in range(52):
+        if hands[0] >> index & 1:
+            after = list(hands)
+            after[0] ^= 1 << index
+            leads.append(solver.solve_position(after, 0, [(0, index)]))
+    assert max(leads) == solver.solve(0)[0] == brute_force(hands, Suit.SPADES, 0)
@@ -0,0 +1,173 @@
+import socket
+import threading
+
+import pytest
+
+from fivepmbridge.bridge_framing import FrameReader
+from fivepmbridge.bridge_server import BridgeTable, OutboundQueue, MESSAGE, STATE, DELTA
+
+
+def read_until(sock, prefix):
+    reader = FrameReader(sock)
+    while True:
+        for data in reader.read_frames():
+            if data.decode().startswith(prefix):
+                return data.decode()
+
+
+def run_briefly(target, *args):
+    # A table that deadlocks never gets back from target
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+def test_seated_player_can_switch_to_watching():
+    table = BridgeTable()
+    server_side, client_side = socket.socketpair()
+    client_side.settimeout(5)
+    table.add_client(server_side, "north")
+    read_until(client_side, "[SESSION]")
+    assert table.clients == [server_side]
+
+    run_briefly(table.handle_text, "!watch", server_side)
+
+    assert table.clients == []
+    assert server_side in table.spectator_feed
+    # The connection is still open and still sent to
+    assert read_until(client_side, "[SERVER] You are watching")
+    table.remove_client(server_side)
+    client_side.close()
+
+
+def test_spectator_can_resume_their_seat():
+    table = BridgeTable()
+    pairs = [socket.socketpair() for _ in range(5)]
+    for server_side, client_side in pairs:
+        client_side.settimeout(5)
+    for i, (server_side, _) in enumerate(pairs[:4]):
+        table.add_client(server_side, f"player{i}")
+    token = read_until(pairs[0][1], "[SESSION]").split()[1]
+    assert table.reserve_seat(pairs[0][0])
+    # Back on a new connection, which watches until it resumes
+    conn, client_side = pairs[4]
+    table.add_client(conn, "player0")
+    run_briefly(table.handle_text, "!watch", conn)
+    assert conn in table.spectator_feed
+
+    run_briefly(table.handle_text, f"!resume {token}", conn)
+
+    assert table.clients[0] is conn
+    assert conn not in table.spectator_feed
+    assert read_until(client_side, "[SERVER] Welcome back!")
+    for server_side, client_side in pairs:
+        table.remove_client(server_side)
+        client_side.close()
+
+
+def test_robot_seat_goes_only_to_a_player_who_asks():
+    table = BridgeTable()
+    pairs = [socket.socketpair() for _ in range(4)]
+    for server_side, client_side in pairs:
+        client_side.settimeout(5)
+    for i, (server_side, _) in enumerate(pairs[:3]):
+        table.add_client(server_side, f"player{i}", take_over=False)
+    assert table.add_robots() == 1
+    conn, client_side = pairs[3]
+    table.add_client(conn, "newcomer", take_over=False)
+    assert conn not in table.clients
+    run_briefly(table.handle_text, "!watch", conn)
+    assert conn in table.spectator_feed
+
+    run_briefly(table.handle_text, "!sit", conn)
+
+    assert table.clients[3] is conn
+    assert conn not in table.spectator_feed
+    assert read_until(client_side, "[SESSION]")
+    for server_side, client_side in pairs:
+        table.remove_client(server_side)
+        client_side.close()
+    table.shutdown()
+
+
+def test_outbound_queue_needs_room_for_a_snapshot():
+    with pytest.raises(ValueError):
+        OutboundQueue(1)
+
+
+def test_full_outbound_queue_drops_deltas_but_never_chat():
+    queue = OutboundQueue(3)
+    queue.put(b"chat", MESSAGE)
+    queue.put(b"delta 1", DELTA)
+    queue.put(b"delta 2", DELTA)
+
+    assert queue.put(b"delta 3", DELTA)
+    assert queue.take_resync()
+    assert not queue.take_resync()
+    assert queue.put(b"snapshot", STATE)
+    assert queue.put(b"more chat", MESSAGE)
+    assert queue.take_all() == [b"chat", b"snapshot", b"more chat"]
+
+
+def test_outbound_queue_full_of_chat_disconnects():
+    queue = OutboundQueue(2)
+    queue.put(b"chat", MESSAGE)
+    queue.put(b"more chat", MESSAGE)
+
+    assert not queue.put(b"too much chat", MESSAGE)
+    assert queue.closed
+
+
+def test_admin_is_told_when_the_table_cannot_deal():
+    table = BridgeTable()
+    server_side, client_side = socket.socketpair()
+    client_side.settimeout(5)
+    table.add_client(server_side, "north")
+
+    run_briefly(table.handle_text, "!deal", server_side)
+
+    assert table.game.state.boards_dealt == 0
+    assert read_until(client_side, "^All four seats")
+    table.remove_client(server_side)
+    client_side.close()
+
+
+def test_released_seat_leaves_no_cards_behind():
+    table = BridgeTable(seat_timeout=60)
+    pairs = [socket.socketpair() for _ in range(5)]
+    for i, (server_side, _) in enumerate(pairs[:4]):
+        table.add_client(server_side, f"player{i}")
+    run_briefly(table.handle_text, "!deal", pairs[0][0])
+    assert table.reserve_seat(pairs[3][0])
+    placeholder = table.clients[3]
+
+    table.release_seat(placeholder)
+
+    assert placeholder not in table.game.get_hands()
+    table.add_client(pairs[4][0], "newcomer")
+    run_briefly(table.handle_text, "!deal", pairs[0][0])
+    assert table.game.state.boards_dealt == 2
+    for server_side, client_side in pairs:
+        table.remove_client(server_side)
+        client_side.close()
+    table.shutdown()
+
+
+def test_table_deals_again_after_a_player_switches_to_watching():
+    table = BridgeTable()
+    pairs = [socket.socketpair() for _ in range(5)]
+    for i, (server_side, _) in enumerate(pairs[:4]):
+        table.add_client(server_side, f"player{i}")
+    admin, watcher = pairs[0][0], pairs[3][0]
+    run_briefly(table.handle_text, "!deal", admin)
+
+    run_briefly(table.handle_text, "!watch", watcher)
+
+    assert watcher not in table.game.get_hands()
+    table.add_client(pairs[4][0], "newcomer")
+    run_briefly(table.handle_text, "!deal", admin)
+    assert table.game.state.boards_dealt == 2
+    for server_side, client_side in pairs:
+        table.remove_client(server_side)
+        client_side.close()